@@ -0,0 +1,121 @@
+# batching.py — Bounded-concurrency async fan-out with rate-limit-aware scheduling
+
+import time
+import random
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+# Retries of a rate-limited item when the client does not retry 429s itself
+DEFAULT_BATCH_RETRIES = 5
+
+# One finished item of a batch: the input, its result (or None) and the error (or None)
+BatchResult = namedtuple("BatchResult", ["item", "result", "error"])
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `per_minute` tokens per minute"""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0  # Tokens per second
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """Wait until `amount` tokens are available and take them"""
+        # A single request larger than the bucket would never fit, so cap it
+        amount = min(float(amount), self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """
+    Combined requests-per-minute and tokens-per-minute limiter.
+    back_off() pauses every caller, e.g. after the provider answers 429.
+    """
+
+    def __init__(self, requests_per_minute=30, tokens_per_minute=6000):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+
+    async def acquire(self, estimated_tokens=1):
+        # Honour a pending back-off before taking from the buckets
+        delay = self.blocked_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if self.requests is not None:
+            await self.requests.acquire(1)
+        if self.tokens is not None:
+            await self.tokens.acquire(estimated_tokens)
+
+    def back_off(self, seconds):
+        """Block new requests for the next `seconds` seconds"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+def rate_limit_delay(error, attempt, base_delay=1.0, max_delay=60.0):
+    """
+    Return how long to wait before retrying after `error`, or None if it is not a 429.
+    Uses the Retry-After header when the provider sends one, else jittered exponential backoff.
+    """
+    if getattr(error, "status_code", None) != 429:
+        return None
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return min(max_delay, float(headers.get("retry-after")))
+    except (TypeError, ValueError):
+        return min(max_delay, base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+async def run_batch(func, items, concurrency=4, limiter=None, estimate_tokens=None, max_retries=DEFAULT_BATCH_RETRIES):
+    """
+    Call the blocking `func(item)` for every item with at most `concurrency` calls in flight.
+    Yields a BatchResult for each item as soon as it completes (not in input order).
+    A 429 always backs the limiter off; the item itself is retried up to max_retries
+    times (pass 0 when func's client already retries 429s, so retries do not stack).
+    """
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(item):
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                if limiter is not None:
+                    await limiter.acquire(estimate_tokens(item) if estimate_tokens else 1)
+                try:
+                    result = await loop.run_in_executor(executor, func, item)
+                    return BatchResult(item, result, None)
+                except Exception as e:
+                    delay = rate_limit_delay(e, attempt)
+                    # Rate limited: slow every worker down, not just this one
+                    if delay is not None and limiter is not None:
+                        limiter.back_off(delay)
+                    if delay is None or attempt == max_retries:
+                        return BatchResult(item, None, e)
+                    await asyncio.sleep(delay)
+
+    tasks = [asyncio.ensure_future(run_one(item)) for item in items]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Consumer stopped early (or failed): drop whatever has not started yet
+        for task in tasks:
+            task.cancel()
+        executor.shutdown(wait=False)
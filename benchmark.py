@@ -0,0 +1,271 @@
+# benchmark.py — End-to-end benchmarks against the fake LLM backend, with baseline comparison
+#
+# Examples:
+#   python benchmark.py                                   # Run everything and print a table
+#   python benchmark.py --save-baseline benchmark_baseline.json
+#   python benchmark.py --compare benchmark_baseline.json --tolerance 0.25
+#   python benchmark.py --only format --sizes 10,1000,10000
+#
+# Timings depend on the machine, so no baseline is committed: save one on the machine that
+# runs --compare, from the last release (e.g. a checkout of its tag), and keep it out of git.
+
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Benchmarks never touch the real API or the on-disk caches
+os.environ["EDUCHAIN_BACKEND"] = "fake"
+os.environ["EDUCHAIN_CACHE_DB"] = ""
+os.environ["EDUCHAIN_BANK_DB"] = ":memory:"
+os.environ.setdefault("EDUCHAIN_FAKE_LATENCY_MS", "50")
+
+from llm_backend import FakeLLMClient  # noqa: E402 (environment must be set first)
+from mcp import McpServer  # noqa: E402
+from mcp_loadgen import percentile, run_load  # noqa: E402
+
+DEFAULT_SIZES = [10, 100, 1000, 10000]
+
+
+def summarize(latencies, elapsed, errors=0):
+    """Throughput and latency percentiles (milliseconds) for one benchmark"""
+    latencies = sorted(latencies)
+    return {
+        "count": len(latencies),
+        "errors": errors,
+        "ops_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p90_ms": percentile(latencies, 90) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def measure(func, inputs, concurrency=1):
+    """Call func(item) for every input on `concurrency` threads and summarize the timings"""
+    latencies, errors = [], []
+
+    def timed(item):
+        started = time.perf_counter()
+        try:
+            func(item)
+        except Exception as e:
+            errors.append(e)
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    if concurrency <= 1:
+        for item in inputs:
+            timed(item)
+    else:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(timed, inputs))
+    return summarize(latencies, time.perf_counter() - started, len(errors))
+
+
+def _topics(prefix, count):
+    # Unique topics so every call misses the response cache and runs the full pipeline
+    return [f"{prefix} topic {i}" for i in range(count)]
+
+
+def _sample_quiz(size):
+    reply = FakeLLMClient(latency_ms=0).plan([{"content": f"Generate {size} multiple-choice questions about Benchmarks."}])
+    return json.loads(reply["content"])
+
+
+def _sample_lesson_plan(size):
+    reply = FakeLLMClient(latency_ms=0).plan([{"content": "Create a 60 minutes lesson plan about Benchmarks."}])
+    plan = json.loads(reply["content"])
+    plan["sections"] = [plan["sections"][i % len(plan["sections"])] for i in range(size)]
+    return plan
+
+
+# ----------------------------------------------------------------------
+# Benchmark groups; each yields (name, stats) and is skipped if its imports fail
+# ----------------------------------------------------------------------
+
+def bench_generator(args):
+    from educhain_setup import EduChainGenerator
+    from llm_cache import ResponseCache
+    from question_bank import QuestionBank
+    from near_dup import NearDuplicateIndex
+
+    generator = EduChainGenerator(cache=ResponseCache(db_path=None), dedup_index=NearDuplicateIndex(),
+                                  bank=QuestionBank(":memory:"), backend="fake")
+    yield "generator.generate_mcq", measure(
+        lambda topic: generator.generate_mcq(topic, 5), _topics("mcq", args.requests), args.concurrency)
+    yield "generator.generate_mcq[cached]", measure(
+        lambda topic: generator.generate_mcq(topic, 5), ["mcq topic 0"] * args.requests, args.concurrency)
+    yield "generator.generate_mcq[sharded 30]", measure(
+        lambda topic: generator.generate_mcq(topic, 30), _topics("sharded", max(1, args.requests // 5)), 1)
+    yield "generator.generate_lesson_plan", measure(
+        generator.generate_lesson_plan, _topics("lesson", args.requests), args.concurrency)
+
+
+def bench_gradio_handlers(args):
+    import gradio_server
+
+    yield "gradio.generate_mcqs", measure(
+        lambda topic: gradio_server.generate_mcqs(topic, "5"), _topics("gradio mcq", args.requests), args.concurrency)
+    yield "gradio.generate_lesson_plan", measure(
+        lambda topic: gradio_server.generate_lesson_plan(topic, "60 mins"), _topics("gradio lesson", args.requests),
+        args.concurrency)
+
+
+def bench_formatting(args):
+    # The shared renderers behind gradio_server's format_mcqs_for_display / format_lesson_plan,
+    # imported from exporter so this group also runs without gradio installed
+    from exporter import export_html, iter_lesson_plan_markdown
+
+    for size in args.sizes:
+        quiz, plan = _sample_quiz(size), _sample_lesson_plan(size)
+        repeats = max(1, min(50, 20000 // size))
+        yield f"format_mcqs_html[{size}]", measure(
+            lambda _: "".join(export_html(quiz["questions"], quiz["topic"])), range(repeats))
+        yield f"format_lesson_plan[{size}]", measure(
+            lambda _: "".join(iter_lesson_plan_markdown(plan)), range(repeats))
+
+
+def _serve_in_thread(server, port, workers):
+    # Run an McpServer on its own event loop; returns a function that stops it
+    loop = asyncio.new_event_loop()
+    stop_event = asyncio.Event()
+    thread = threading.Thread(
+        target=loop.run_until_complete,
+        args=(server.serve(host="127.0.0.1", port=port, max_workers=workers, stop_event=stop_event),),
+        daemon=True,
+    )
+    thread.start()
+    time.sleep(0.5)  # Give the listener time to bind
+
+    def stop():
+        loop.call_soon_threadsafe(stop_event.set)
+        thread.join(timeout=5)
+    return stop
+
+
+def _rpc_load(port, name, arguments, args):
+    params = {"name": name, "arguments": arguments}
+    stats = asyncio.run(run_load("127.0.0.1", port, "tools/call", params, args.requests * 10, args.concurrency))
+    return {
+        "count": stats["requests"],
+        "errors": stats["errors"],
+        "ops_per_sec": stats["requests_per_sec"],
+        "p50_ms": stats["p50_ms"],
+        "p90_ms": None,
+        "p99_ms": stats["p99_ms"],
+    }
+
+
+def bench_mcp(args):
+    # Transport and dispatch overhead with a tool that does no work
+    server = McpServer(name="Benchmark Server", version="1.0")
+
+    @server.tool(name="echo", parameters={"value": {"type": "integer", "default": 0}})
+    def echo(value):
+        return {"value": value}
+
+    stop = _serve_in_thread(server, args.port, args.concurrency)
+    try:
+        yield "mcp.dispatch[echo]", _rpc_load(args.port, "echo", {"value": 1}, args)
+    finally:
+        stop()
+
+    # The real generate_mcqs tool on the fake backend (repeated arguments, so mostly cache hits)
+    from mcp_server import EduChainMcpServer
+    educhain = EduChainMcpServer(backend="fake")
+    stop = _serve_in_thread(educhain.server, args.port + 1, args.concurrency)
+    try:
+        yield "mcp.dispatch[generate_mcqs]", _rpc_load(args.port + 1, "generate_mcqs", {"topic": "Benchmarks"}, args)
+    finally:
+        stop()
+
+
+GROUPS = {
+    "generator": bench_generator,
+    "gradio": bench_gradio_handlers,
+    "format": bench_formatting,
+    "mcp": bench_mcp,
+}
+
+
+def run_benchmarks(args):
+    """Run the selected groups; returns {benchmark name: stats}"""
+    results = {}
+    for group, bench in GROUPS.items():
+        if args.only and not any(name in group for name in args.only):
+            continue
+        try:
+            for name, stats in bench(args):
+                results[name] = stats
+                _print_row(name, stats)
+        except ImportError as e:
+            print(f"Skipping {group} benchmarks: {e}")
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Return a list of regression messages: p50 slower or throughput lower by more than tolerance"""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        if base.get("p50_ms") and stats["p50_ms"] > base["p50_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p50 {stats['p50_ms']:.2f} ms vs baseline {base['p50_ms']:.2f} ms")
+        if base.get("ops_per_sec") and stats["ops_per_sec"] < base["ops_per_sec"] / (1 + tolerance):
+            regressions.append(f"{name}: {stats['ops_per_sec']:.1f} ops/s vs baseline {base['ops_per_sec']:.1f} ops/s")
+    return regressions
+
+
+def _print_row(name, stats):
+    p90 = f"{stats['p90_ms']:9.2f}" if stats.get("p90_ms") is not None else f"{'-':>9}"
+    print(f"{name:<40} {stats['ops_per_sec']:10.1f} {stats['p50_ms']:9.2f} {p90} {stats['p99_ms']:9.2f}"
+          f"  ({stats['count']} ops, {stats['errors']} errors)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end EduChain benchmarks on the fake LLM backend")
+    parser.add_argument("--only", default="", help="Comma-separated groups: " + ", ".join(GROUPS))
+    parser.add_argument("--requests", type=int, default=50, help="Generation calls per benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="Parallel callers")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Quiz sizes for formatting")
+    parser.add_argument("--port", type=int, default=6100, help="First port for the in-process MCP servers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="PATH", help="Write the results as the new baseline")
+    parser.add_argument("--compare", metavar="PATH", help="Compare against a stored baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    args = parser.parse_args()
+    args.only = [name for name in args.only.split(",") if name]
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    random.seed(args.seed)
+
+    print(f"{'benchmark':<40} {'ops/s':>10} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9}")
+    results = run_benchmarks(args)
+
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Baseline saved to {args.save_baseline}")
+
+    if args.compare:
+        if not os.path.exists(args.compare):
+            print(f"× No baseline at {args.compare}; create one with --save-baseline {args.compare}")
+            sys.exit(2)
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n× {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for message in regressions:
+                print(f"  - {message}")
+            sys.exit(1)
+        print(f"\n✓ No regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    main()
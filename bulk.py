@@ -0,0 +1,283 @@
+# bulk.py — Resumable, parallel generation for whole syllabi: sharded JSONL output with a checkpoint manifest
+#
+# Examples:
+#   python educhain_setup.py --topics syllabus.txt --out-dir output --workers 8
+#   cat topics.txt | python educhain_setup.py --topics - --kinds mcq --num-questions 10
+
+import os
+import sys
+import json
+import time
+import asyncio
+import tempfile
+
+from batching import RateLimiter, run_batch
+from question_bank import normalize_topic
+from prompts import mcq_prompt, lesson_plan_prompt, request_tokens
+
+KINDS = ("mcq", "lesson_plan")
+MANIFEST_NAME = "manifest.json"
+DEFAULT_RECORDS_PER_SHARD = int(os.getenv("EDUCHAIN_BULK_SHARD_RECORDS", "100"))
+
+
+def read_topics(source):
+    """
+    Read one topic per line from a path, or from stdin when source is "-".
+    Blank lines and lines starting with # are skipped; repeats (after normalization) are dropped.
+    """
+    handle = sys.stdin if source == "-" else open(source, encoding="utf-8")
+    try:
+        topics, seen = [], set()
+        for line in handle:
+            topic = line.strip()
+            key = normalize_topic(topic)
+            if not topic or topic.startswith("#") or not key or key in seen:
+                continue
+            seen.add(key)
+            topics.append(topic)
+        return topics
+    finally:
+        if handle is not sys.stdin:
+            handle.close()
+
+
+def atomic_write(path, text):
+    """Write text to path so readers see either the old file or the complete new one"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class BulkRun:
+    """
+    Output directory of one bulk run. Each finished topic is appended to the open JSONL
+    shard (records-NNNNN.jsonl) and fsynced before it counts as done. Once a shard has
+    records_per_shard topics it is closed and the manifest is rewritten atomically to
+    list the shard and its topics. A run killed in between resumes from the manifest
+    plus the records already in the unlisted open shard, so finished topics are never
+    redone; a torn last line (killed mid-write) is dropped and that topic redone.
+    """
+
+    def __init__(self, out_dir, records_per_shard=DEFAULT_RECORDS_PER_SHARD):
+        self.out_dir = out_dir
+        self.records_per_shard = records_per_shard
+        self.manifest_path = os.path.join(out_dir, MANIFEST_NAME)
+        os.makedirs(out_dir, exist_ok=True)
+        self.manifest = {"shards": [], "done": {}, "failed": {}}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, encoding="utf-8") as f:
+                self.manifest.update(json.load(f))
+        self._shard = None  # Open file of the shard being appended to
+        self._shard_records = 0
+        self._pending = []  # Records in the open shard, listed in the manifest when it is closed
+        self._recover()
+
+    def _shard_name(self):
+        return f"records-{len(self.manifest['shards']):05d}.jsonl"
+
+    def _recover(self):
+        # Records appended after the last checkpoint live in the next, unlisted shard
+        path = os.path.join(self.out_dir, self._shard_name())
+        if not os.path.exists(path):
+            return
+        records = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break  # Torn last line; that topic is generated again
+        if not records:
+            os.remove(path)
+            return
+        atomic_write(path, "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        self._checkpoint(records)
+
+    def is_done(self, topic):
+        return normalize_topic(topic) in self.manifest["done"]
+
+    def add(self, record):
+        """Append one finished topic to the open shard and fsync it; a full shard is checkpointed"""
+        if self._shard is None:
+            self._shard = open(os.path.join(self.out_dir, self._shard_name()), "a", encoding="utf-8")
+            self._shard_records = 0
+        self._shard.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._shard.flush()
+        os.fsync(self._shard.fileno())
+        self._shard_records += 1
+        self._pending.append(record)
+        if self._shard_records >= self.records_per_shard:
+            self.flush()
+
+    def fail(self, topic, error):
+        """Remember a failed topic and why (it is retried on the next run) and checkpoint"""
+        self.manifest["failed"][topic] = {"type": type(error).__name__, "error": str(error)}
+        self._save_manifest()
+
+    def flush(self):
+        """Close the open shard and checkpoint its records in the manifest"""
+        if self._shard is None:
+            return
+        self._shard.close()
+        self._shard = None
+        self._checkpoint(self._pending)
+        self._pending = []
+
+    def _checkpoint(self, records):
+        self.manifest["shards"].append({"file": self._shard_name(), "records": len(records)})
+        for record in records:
+            self.manifest["done"][normalize_topic(record["topic"])] = self.manifest["shards"][-1]["file"]
+            self.manifest["failed"].pop(record["topic"], None)
+        self._save_manifest()
+
+    def _save_manifest(self):
+        atomic_write(self.manifest_path, json.dumps(self.manifest, ensure_ascii=False, indent=1))
+
+
+class Progress:
+    """Throughput and ETA printed at most every `interval` seconds (on one line when attached to a terminal)"""
+
+    def __init__(self, total, interval=2.0, stream=sys.stderr):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = self.failed = 0
+        self.started = time.monotonic()
+        self._printed = 0.0
+
+    def update(self, ok):
+        if ok:
+            self.done += 1
+        else:
+            self.failed += 1
+        now = time.monotonic()
+        if now - self._printed >= self.interval or self.done + self.failed == self.total:
+            self._printed = now
+            self.report(final=self.done + self.failed == self.total)
+
+    def report(self, final=False):
+        elapsed = time.monotonic() - self.started
+        finished = self.done + self.failed
+        rate = finished / elapsed if elapsed else 0.0
+        eta = (self.total - finished) / rate if rate else float("inf")
+        line = (f"{finished}/{self.total} topics ({self.failed} failed) | {rate * 60:.1f} topics/min"
+                f" | elapsed {_duration(elapsed)} | ETA {_duration(eta)}")
+        if self.stream.isatty() and not final:
+            self.stream.write("\r" + line.ljust(100))
+        else:
+            self.stream.write(line + "\n")
+        self.stream.flush()
+
+
+def _duration(seconds):
+    if seconds == float("inf"):
+        return "--:--"
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes:02d}:{seconds:02d}"
+
+
+def summarize_failures(failed, examples=3):
+    """Group the manifest's failed topics by error type: one line per type, most frequent first"""
+    groups = {}
+    for topic, failure in failed.items():
+        if not isinstance(failure, dict):
+            failure = {"type": "Error", "error": str(failure)}  # Manifests from before errors were typed
+        groups.setdefault(failure["type"], []).append((topic, failure["error"]))
+    lines = []
+    for kind, topics in sorted(groups.items(), key=lambda item: -len(item[1])):
+        shown = "; ".join(f"{topic}: {error}" for topic, error in topics[:examples])
+        more = f" (+{len(topics) - examples} more)" if len(topics) > examples else ""
+        lines.append(f"{kind} ×{len(topics)} — {shown}{more}")
+    return lines
+
+
+async def generate_bulk(generator, topics, out_dir, kinds=KINDS, num_questions=5, workers=8,
+                        requests_per_minute=0, tokens_per_minute=0, records_per_shard=DEFAULT_RECORDS_PER_SHARD):
+    """
+    Generate `kinds` for every topic not already finished in out_dir, with `workers`
+    topics in flight. Returns the BulkRun (its manifest holds the done and failed topics).
+    """
+    run = BulkRun(out_dir, records_per_shard)
+    pending = [topic for topic in topics if not run.is_done(topic)]
+    print(f"{len(topics) - len(pending)} of {len(topics)} topics already done in {out_dir}; {len(pending)} to go")
+    if not pending:
+        return run
+
+    def generate(topic):
+        # Upstream errors propagate to run_batch and are recorded with the topic.
+        # Banked fallback quizzes and empty results are failures too, so the topic is retried next run
+        record = {"topic": topic}
+        if "mcq" in kinds:
+            record["mcqs"] = mcqs = generator.generate_mcq(topic, num_questions, raise_errors=True)
+            if not isinstance(mcqs, dict) or not mcqs.get("questions"):
+                raise ValueError("quiz has no questions")
+            if mcqs.get("from_bank_fallback"):
+                raise RuntimeError("quiz came from the bank fallback")
+        if "lesson_plan" in kinds:
+            record["lesson_plan"] = plan = generator.generate_lesson_plan(topic, raise_errors=True)
+            if not isinstance(plan, dict) or not plan.get("sections"):
+                raise ValueError("lesson plan has no sections")
+        return record
+
+    # Without limits the worker pool alone bounds the load; the resilience layer still handles 429s
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute) if requests_per_minute or tokens_per_minute else None
+    def estimate(topic):
+        # Counted prompt tokens plus the max_tokens budget of every request made for the topic
+        return (("mcq" in kinds) * request_tokens(mcq_prompt(topic, num_questions))
+                + ("lesson_plan" in kinds) * request_tokens(lesson_plan_prompt(topic)))
+
+    progress = Progress(len(pending))
+    try:
+        async for topic, record, error in run_batch(generate, pending, concurrency=workers, limiter=limiter,
+                                                   estimate_tokens=estimate, max_retries=generator.batch_retries()):
+            if error is None:
+                run.add(record)
+            else:
+                run.fail(topic, error)
+            progress.update(error is None)
+    finally:
+        # Also on Ctrl-C: keep everything that finished so the next run skips it
+        run.flush()
+    return run
+
+
+def main(args):
+    """CLI entry point used by educhain_setup.py --topics"""
+    from educhain_setup import EduChainGenerator
+
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = set(kinds) - set(KINDS)
+    if unknown or not kinds:
+        sys.exit(f"Unknown --kinds {', '.join(sorted(unknown)) or '(none)'}; choose from {', '.join(KINDS)}")
+    topics = read_topics(args.topics)
+    generator = EduChainGenerator()
+    try:
+        run = asyncio.run(generate_bulk(
+            generator, topics, args.out_dir, kinds=kinds, num_questions=args.num_questions, workers=args.workers,
+            requests_per_minute=args.requests_per_minute, tokens_per_minute=args.tokens_per_minute,
+            records_per_shard=args.records_per_shard,
+        ))
+    except KeyboardInterrupt:
+        print("\nInterrupted; finished topics are saved and will be skipped on the next run")
+        sys.exit(130)
+    failed = run.manifest["failed"]
+    print(f"✓ {len(run.manifest['done'])} topics in {len(run.manifest['shards'])} shard(s) under {args.out_dir}")
+    semantic = generator.topic_index.stats()
+    if semantic["similar_hits"]:
+        print(f"  {semantic['similar_hits']} of {semantic['lookups']} topic lookups reused a similar topic "
+              f"({semantic['similar_hit_rate']:.0%}, mean similarity {semantic['avg_similarity']:.2f})")
+    if failed:
+        print(f"× {len(failed)} topic(s) failed; run the same command again to retry them")
+        for line in summarize_failures(failed):
+            print(f"  {line}")
+        sys.exit(1)
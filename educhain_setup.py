@@ -1,82 +1,244 @@
-import os
 import json
-from groq import Groq
+import argparse
 from dotenv import load_dotenv
 
-# Load environment variables from .env file (used to securely load API keys)
+# Load environment variables from .env file (used to securely load API keys). This runs before
+# the project imports below, because their EDUCHAIN_* defaults are read when they are imported
 load_dotenv()
 
+from llm_cache import cached_completion, get_default_cache
+from llm_backend import create_client
+from model_router import DEFAULT_MODEL, ModelRouter
+from resilience import ResilientClient
+from batching import DEFAULT_BATCH_RETRIES, RateLimiter, run_batch
+from sharding import DEFAULT_SHARD_SIZE, DEFAULT_MAX_WORKERS, generate_sharded, iter_sharded_questions, shard_guidance
+from near_dup import get_default_index, remove_near_duplicates
+from question_bank import get_default_bank, serve_from_bank, fallback_quiz
+from schema import repair_mcqs, complete_lesson_plan
+from metrics import handler, span
+from prompts import mcq_prompt, lesson_plan_prompt, request_tokens
+from lesson_plans import DEFAULT_OUTLINE_FIRST, regenerate_section
+from semantic_topics import get_default_topic_index, lesson_plan_scope, semantic_topic
+from lesson_plans import generate_lesson_plan as outlined_lesson_plan
+import bulk
+from bulk import DEFAULT_RECORDS_PER_SHARD
+
 class EduChainGenerator:
-    def __init__(self, api_key=None):
-        # Initialize the Groq client using either the provided API key or the one in the .env file
-        self.client = Groq(api_key=api_key or os.getenv("GROQ_API_KEY"))
+    def __init__(self, api_key=None, cache=None, dedup_index=None, bank=None, backend=None, topic_index=None):
+        # Initialize the LLM client (Groq by default, or the offline fake backend via backend/EDUCHAIN_BACKEND)
+        # using either the provided API key or the one in the .env file
+        self.client = create_client(api_key=api_key, backend=backend)
+
+        # Shared response cache so repeated topics skip the LLM round trip
+        self.cache = cache or get_default_cache()
+
+        # Near-duplicate index over every generated question, so repeated topics get new questions
+        self.dedup_index = dedup_index or get_default_index()
+
+        # Persistent bank of every generated question, used by from_bank=True
+        self.bank = bank or get_default_bank()
+
+        # Differently worded topics ("Intro to Python", "Python basics") map onto one already generated
+        self.topic_index = topic_index or get_default_topic_index()
         
-        # Specify the model to be used (note: second line overrides the first)
-        self.model = "mixtral-8x7b-32768" 
-        self.model = "llama3-70b-8192"  # This is the effective model used
-
-    def generate_mcq(self, topic, num_questions=5):
-        # Create a prompt to generate multiple-choice questions in a specified JSON format
-        prompt = f"""Generate {num_questions} high-quality multiple-choice questions about {topic}.
-        Return as JSON with this exact structure:
-        {{
-            "topic": "string",
-            "questions": [
-                {{
-                    "question": "string",
-                    "options": ["A", "B", "C", "D"],
-                    "correct_answer": "A",
-                    "explanation": "string"
-                }}
-            ]
-        }}
-        Include questions that test different levels of understanding.
+        # "auto" lets the model router pick the fast or the strong model per request (EDUCHAIN_MODEL pins one);
+        # questions are banked under the model that actually answered
+        self.model = DEFAULT_MODEL
+
+    @handler("generator.generate_mcq")
+    def generate_mcq(self, topic, num_questions=5, fresh=False, from_bank=False, raise_errors=False):
+        # Generate multiple-choice questions for a single topic
+        # from_bank=True builds the quiz from stored questions, calling the LLM only for the shortfall
+        # raise_errors=True raises the upstream error instead of printing it and falling back to the bank
+        try:
+            return self._mcq_pipeline(topic, num_questions, fresh=fresh, from_bank=from_bank, fallback=not raise_errors)
+        except Exception as e:
+            if raise_errors:
+                raise
+            print(f"Error generating content: {e}")
+            return None
+
+    def _mcq_pipeline(self, topic, num_questions, fresh=False, from_bank=False, fallback=True):
+        # generate_mcq without the error handling, shared with generate_mcq_batch; errors propagate
+        topic = semantic_topic(self.topic_index, topic, "mcq:bank" if from_bank else f"mcq:{num_questions}", fresh)
+        if from_bank:
+            return serve_from_bank(self.bank, topic, num_questions, self._mcq_shard_generator(topic, fresh))
+        try:
+            return self._generate_mcq(topic, num_questions, fresh=fresh)
+        except Exception:
+            # Upstream failed (or its circuit breaker is open): serve stored questions if there are any
+            mcqs = fallback_quiz(self.bank, topic, num_questions) if fallback else None
+            if mcqs is None:
+                raise
+            return mcqs
+
+    def _generate_mcq(self, topic, num_questions, fresh=False):
+        # Large quizzes are split into shards that are generated concurrently
+        if num_questions > DEFAULT_SHARD_SIZE:
+            return generate_sharded(self._mcq_shard_generator(topic, fresh), topic, num_questions)
+        prompt = self._mcq_prompt(topic, num_questions)
+        content, served = self._generate_served(prompt, fresh=fresh)
+        # Fix what can be fixed locally, then drop invalid questions and near-duplicates of earlier ones
+        mcqs, _ = repair_mcqs(content, topic)
+        mcqs, duplicates = self._remove_duplicates(mcqs, prompt, fresh)
+        # Keep every generated question, with its source so the dedup index can be rebuilt after a restart
+        self.bank.add_quiz(mcqs, model=served, topic=topic, source=self._dedup_source(prompt))
+        shortfall = num_questions - len(mcqs["questions"])
+        if shortfall > 0:
+            # Regenerate only the missing questions, telling the model which ones to avoid
+            avoid = [q["question"] for q in mcqs["questions"] + duplicates
+                     if isinstance(q, dict) and isinstance(q.get("question"), str)]
+            mcqs["questions"] += list(iter_sharded_questions(self._mcq_shard_generator(topic, fresh),
+                                                             shortfall, avoid=avoid))
+        # Nothing usable at all: hand back the raw reply as before
+        return mcqs if mcqs["questions"] else content
+
+    def generate_mcq_sharded(self, topic, num_questions, fresh=False, shard_size=DEFAULT_SHARD_SIZE,
+                             max_workers=DEFAULT_MAX_WORKERS):
         """
-        return self._generate_content(prompt)
-
-    def generate_lesson_plan(self, topic):
-        # Create a prompt to generate a comprehensive lesson plan in a specified JSON format
-        prompt = f"""Generate a comprehensive lesson plan about {topic}.
-        Return as JSON with this exact structure:
-        {{
-            "topic": "string",
-            "duration": "string",
-            "objectives": ["string"],
-            "sections": [
-                {{
-                    "title": "string",
-                    "content": "string",
-                    "duration": "string",
-                    "activities": ["string"]
-                }}
-            ],
-            "assessment": "string",
-            "resources": ["string"]
-        }}
-        Include hands-on activities where appropriate.
+        Generate a large quiz as concurrent shards of shard_size questions.
+        Duplicates across shards are dropped and failed or short shards are topped up.
         """
-        return self._generate_content(prompt)
+        try:
+            return generate_sharded(self._mcq_shard_generator(topic, fresh), topic, num_questions,
+                                    shard_size=shard_size, max_workers=max_workers)
+        except Exception as e:
+            print(f"Error generating content: {e}")
+            return None
 
-    def _generate_content(self, prompt):
-        # Internal method to send a chat prompt to the Groq model and handle JSON response
+    def _mcq_shard_generator(self, topic, fresh=False):
+        # Shard callback for sharding.py; invalid questions and near-duplicates are dropped so they get topped up.
+        # Each shard banks its own questions, since only it knows which model answered
+        def generate_shard(shard, avoid):
+            prompt = self._mcq_prompt(topic, shard["count"], guidance=shard_guidance(shard, avoid))
+            try:
+                content, served = self._request_served(prompt, fresh=fresh)
+            except json.JSONDecodeError as e:
+                content, served = e.content, e.content.model  # Often still holds a salvageable JSON object
+            mcqs, _ = repair_mcqs(content, topic)
+            mcqs = self._remove_duplicates(mcqs, prompt, fresh)[0]
+            self.bank.add_quiz(mcqs, model=served, topic=topic, source=self._dedup_source(prompt))
+            return mcqs
+        return generate_shard
+
+    def _remove_duplicates(self, mcqs, prompt, fresh=False):
+        # Questions are tagged with the prompt's cache key, so a cached quiz is not rejected against itself
+        return remove_near_duplicates(mcqs, self.dedup_index, self._dedup_source(prompt), fresh=fresh)
+
+    def _dedup_source(self, prompt):
+        return self.cache.make_key(self.model, prompt, 0.7, {"type": "json_object"})
+
+    @handler("generator.generate_lesson_plan")
+    def generate_lesson_plan(self, topic, fresh=False, outline_first=DEFAULT_OUTLINE_FIRST, raise_errors=False):
+        # Generate a lesson plan for a single topic; raise_errors=True raises instead of printing the error
         try:
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
-                model=self.model,
-                temperature=0.7,
-                response_format={"type": "json_object"}  # Ensure JSON response
-            )
-            content = response.choices[0].message.content
-            return json.loads(content)  # Parse and return JSON content
-        except json.JSONDecodeError:
-            # If the response is not valid JSON, return raw content with a warning
-            print("Failed to parse JSON response, returning raw content")
-            return {"content": content}
+            return self._lesson_plan_pipeline(topic, fresh=fresh, outline_first=outline_first)
         except Exception as e:
-            # Catch all other errors and return None
+            if raise_errors:
+                raise
             print(f"Error generating content: {e}")
             return None
 
+    def _lesson_plan_pipeline(self, topic, fresh=False, outline_first=DEFAULT_OUTLINE_FIRST):
+        # generate_lesson_plan without the error handling, shared with generate_lesson_plan_batch
+        topic = semantic_topic(self.topic_index, topic, lesson_plan_scope(outline_first=outline_first), fresh)
+        if outline_first:
+            # Short outline first, then the sections concurrently (each cached on its own)
+            return outlined_lesson_plan(lambda prompt: self._request_content(prompt, fresh=fresh), topic)
+        content = self._generate_content(self._lesson_plan_prompt(topic), fresh=fresh)
+        # Repair locally and re-request only the missing fields or broken sections
+        return complete_lesson_plan(content, topic, lambda prompt: self._request_content(prompt, fresh=fresh))
+
+    @handler("generator.regenerate_lesson_section")
+    def regenerate_lesson_section(self, plan, index, guidance=None):
+        # Replace one section of a finished plan (0-based index) with a new variant, keeping the rest
+        return regenerate_section(plan, index, lambda prompt: self._request_content(prompt, fresh=True),
+                                  guidance=guidance)
+
+    async def generate_mcq_batch(self, topics, num_questions=5, fresh=False, concurrency=4,
+                                 requests_per_minute=30, tokens_per_minute=6000):
+        """
+        Generate MCQs for many topics concurrently, each through the same pipeline as
+        generate_mcq (sharding, near-duplicate filtering, top-ups, bank fallback).
+        Yields (topic, result, error) tuples as each topic completes.
+        """
+        @handler("generator.generate_mcq_batch")
+        def generate(topic):
+            return self._mcq_pipeline(topic, num_questions, fresh=fresh)
+
+        # Token estimate per topic: counted prompt tokens plus the max_tokens budget of its main request
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        async for item in run_batch(generate, topics, concurrency=concurrency, limiter=limiter,
+                                    estimate_tokens=lambda topic: request_tokens(mcq_prompt(topic, num_questions)),
+                                    max_retries=self.batch_retries()):
+            yield item
+
+    async def generate_lesson_plan_batch(self, topics, fresh=False, concurrency=4,
+                                         requests_per_minute=30, tokens_per_minute=6000):
+        """
+        Generate lesson plans for many topics concurrently, each through the same
+        pipeline as generate_lesson_plan. Yields (topic, result, error) tuples as
+        each topic completes.
+        """
+        @handler("generator.generate_lesson_plan_batch")
+        def generate(topic):
+            return self._lesson_plan_pipeline(topic, fresh=fresh)
+
+        # Token estimate per topic: counted prompt tokens plus the max_tokens budget of a whole plan
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        async for item in run_batch(generate, topics, concurrency=concurrency, limiter=limiter,
+                                    estimate_tokens=lambda topic: request_tokens(lesson_plan_prompt(topic)),
+                                    max_retries=self.batch_retries()):
+            yield item
+
+    def batch_retries(self):
+        # 429s are retried in one layer only: the resilient client's, or run_batch's for a bare client
+        return 0 if isinstance(self.client, (ResilientClient, ModelRouter)) else DEFAULT_BATCH_RETRIES
+
+    def _mcq_prompt(self, topic, num_questions, guidance=None):
+        # Compact registry template; shards add their own focus (and questions to avoid)
+        return mcq_prompt(topic, num_questions, guidance)
+
+    def _lesson_plan_prompt(self, topic):
+        return lesson_plan_prompt(topic)
+
+    def _request_content(self, prompt, fresh=False):
+        # Send a chat prompt to the Groq model and parse the JSON response; errors propagate
+        # Pass fresh=True to skip the cache lookup and ask the model for a new variant
+        return self._request_served(prompt, fresh=fresh)[0]
+
+    def _request_served(self, prompt, fresh=False):
+        # Like _request_content, but returns (parsed JSON, model that answered) for the question bank
+        content = cached_completion(
+            self.client,
+            prompt,
+            model=self.model,
+            temperature=0.7,
+            response_format={"type": "json_object"},  # Ensure JSON response
+            cache=self.cache,
+            bypass=fresh
+        )
+        try:
+            with span("parse"):
+                return json.loads(content), content.model  # Parse and return JSON content
+        except json.JSONDecodeError as e:
+            e.content = content  # Keep the raw reply for callers that want it
+            raise
+
+    def _generate_content(self, prompt, fresh=False):
+        # Like _request_content, but a reply that is not valid JSON is returned as {"content": raw};
+        # other errors propagate to the public methods, which report them
+        return self._generate_served(prompt, fresh=fresh)[0]
+
+    def _generate_served(self, prompt, fresh=False):
+        # Like _generate_content, but returns (content, model that answered)
+        try:
+            return self._request_served(prompt, fresh=fresh)
+        except json.JSONDecodeError as e:
+            # If the response is not valid JSON, return raw content with a warning
+            print("Failed to parse JSON response, returning raw content")
+            return {"content": e.content}, e.content.model
+
 def save_to_file(filename, data):
     """Helper function to save data to JSON file"""
     try:
@@ -88,7 +250,27 @@ def save_to_file(filename, data):
         print(f"Error saving to {filename}: {e}")
         return False
 
+def parse_args(argv=None):
+    # Without --topics the script keeps its original single-topic demo
+    parser = argparse.ArgumentParser(description="Generate MCQs and lesson plans with EduChain")
+    parser.add_argument("--topics", metavar="FILE", help="Bulk mode: file with one topic per line, or - for stdin")
+    parser.add_argument("--out-dir", default="educhain_output", help="Bulk output directory (JSONL shards + manifest)")
+    parser.add_argument("--kinds", default="mcq,lesson_plan", help="What to generate per topic: mcq, lesson_plan")
+    parser.add_argument("--num-questions", type=int, default=5, help="Questions per topic")
+    parser.add_argument("--workers", type=int, default=8, help="Topics processed in parallel")
+    parser.add_argument("--records-per-shard", type=int, default=DEFAULT_RECORDS_PER_SHARD,
+                        help="Topics per JSONL shard (also how often progress is checkpointed)")
+    parser.add_argument("--requests-per-minute", type=int, default=0, help="Provider request limit (0 = none)")
+    parser.add_argument("--tokens-per-minute", type=int, default=0, help="Provider token limit (0 = none)")
+    return parser.parse_args(argv)
+
 def main():
+    args = parse_args()
+    if args.topics:
+        # Whole-syllabus mode: parallel, resumable, sharded JSONL output
+        bulk.main(args)
+        return
+
     # Create an instance of the EduChainGenerator
     generator = EduChainGenerator()
     
@@ -0,0 +1,353 @@
+# exporter.py — Streaming export of quizzes, question banks and lesson plans as HTML, Markdown, CSV and Moodle GIFT
+#
+# Examples:
+#   python exporter.py --format gift --out exam.gift                 # The whole question bank
+#   python exporter.py --format html --topic "Python basics" --out quiz.html
+#   python exporter.py --format markdown --input lesson_plan.json    # To stdout
+#   python exporter.py --serve 8800                                  # GET /export?format=csv&topic=...
+
+import io
+import os
+import csv
+import sys
+import json
+import argparse
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# Every exporter is a generator of text chunks, so output is written (or sent) as it is
+# produced and memory does not grow with the number of questions
+
+# ----------------------------------------------------------------------
+# HTML
+# ----------------------------------------------------------------------
+
+# Styles shared by every question, emitted once per document instead of inline on each element
+QUIZ_CSS = """<style>
+.edu-quiz { font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; color: #ffffff; background-color: #0e1117; padding: 20px; border-radius: 8px; }
+.edu-quiz h2 { color: #6cb4ff; padding-bottom: 8px; border-bottom: 1px solid #444; }
+.edu-q { margin-bottom: 30px; padding: 15px; border-radius: 4px; border: 1px solid #333; background-color: #161b22; }
+.edu-q h3 { color: #6cb4ff; margin-top: 0; }
+.edu-options { margin-left: 10px; }
+.edu-option { padding: 8px 0; display: flex; align-items: center; cursor: pointer; color: #ffffff; }
+.edu-option input { margin-right: 10px; }
+.edu-option label { flex: 1; cursor: pointer; }
+.edu-answer { display: none; margin-top: 15px; padding: 12px; background: #1f2937; border-radius: 4px; color: #d1d5db; }
+.edu-answer p { margin: 0 0 8px 0; }
+.edu-answer p:last-child { margin: 0; }
+.edu-answer strong.edu-correct { color: #22c55e; }
+.edu-reveal { margin-top: 10px; background: #374151; color: #ffffff; border: 1px solid #4b5563; padding: 6px 12px; border-radius: 4px; cursor: pointer; }
+.edu-plan section { margin-bottom: 20px; }
+</style>
+"""
+
+# Templates are formatted with already-escaped values; .format is bound once here
+_HTML_QUIZ_HEADER = "<div class='edu-quiz'>\n<h2>📝 Quiz: {topic}</h2>\n".format
+_HTML_TOPIC_HEADING = "<h2>📝 {topic}</h2>\n".format
+_HTML_QUESTION_START = "<div class='edu-q'>\n<h3>Q{i}. {question}</h3>\n<div class='edu-options'>\n".format
+_HTML_OPTION = ("<div class='edu-option' onclick='this.querySelector(\"input\").checked = true'>"
+                "<input type='radio' name='q{i}' id='q{i}o{j}'><label for='q{i}o{j}'>{option}</label></div>\n").format
+_HTML_QUESTION_END = (
+    "</div>\n<div id='answer-{i}' class='edu-answer'>"
+    "<p><strong class='edu-correct'>✅ Correct Answer:</strong> {answer}</p>"
+    "<p><strong>💡 Explanation:</strong> {explanation}</p></div>\n"
+    "<button class='edu-reveal' onclick='document.getElementById(\"answer-{i}\").style.display = \"block\"; "
+    "this.style.display = \"none\"'>Show Answer</button>\n</div>\n"
+).format
+HTML_QUIZ_FOOTER = "</div>\n"
+
+
+def _text(value):
+    # Escaped text for HTML; model output is never trusted as markup
+    return escape(str(value if value is not None else ""))
+
+
+def html_quiz_header(topic, css=True):
+    """Opening of a quiz container (with the shared stylesheet unless css=False)"""
+    return (QUIZ_CSS if css else "") + _HTML_QUIZ_HEADER(topic=_text(topic))
+
+
+def html_question(i, question):
+    """One question with its options and the hidden answer, numbered i"""
+    parts = [_HTML_QUESTION_START(i=i, question=_text(question.get("question")))]
+    parts.extend(_HTML_OPTION(i=i, j=j, option=_text(option)) for j, option in enumerate(question.get("options") or []))
+    parts.append(_HTML_QUESTION_END(i=i, answer=_text(question.get("correct_answer")),
+                                    explanation=_text(question.get("explanation"))))
+    return "".join(parts)
+
+
+def export_html(questions, title="Question Bank"):
+    """Yield an HTML quiz; a heading is added whenever the questions' "topic" changes"""
+    yield html_quiz_header(title)
+    topic = None
+    for i, question in enumerate(questions, 1):
+        if question.get("topic") and question["topic"] != topic and question["topic"] != title:
+            topic = question["topic"]
+            yield _HTML_TOPIC_HEADING(topic=_text(topic))
+        yield html_question(i, question)
+    yield HTML_QUIZ_FOOTER
+
+
+def export_lesson_plans_html(plans):
+    """Yield HTML for a sequence of lesson plans"""
+    yield QUIZ_CSS + "<div class='edu-quiz edu-plan'>\n"
+    for plan in plans:
+        yield f"<h2>📚 Lesson Plan: {_text(plan.get('topic'))}</h2>\n<p><strong>Duration:</strong> {_text(plan.get('duration'))}</p>\n"
+        yield "<h3>🎯 Learning Objectives</h3>\n<ul>\n"
+        yield "".join(f"<li>{_text(objective)}</li>\n" for objective in plan.get("objectives") or [])
+        yield "</ul>\n"
+        for section in plan.get("sections") or []:
+            parts = [f"<section><h3>{_text(section.get('title'))} ({_text(section.get('duration'))})</h3>\n",
+                     f"<p>{_text(section.get('content'))}</p>\n"]
+            if section.get("activities"):
+                parts.append("<ul>\n" + "".join(f"<li>{_text(a)}</li>\n" for a in section["activities"]) + "</ul>\n")
+            parts.append("</section>\n")
+            yield "".join(parts)
+        yield f"<h3>📝 Assessment</h3>\n<p>{_text(plan.get('assessment'))}</p>\n"
+    yield "</div>\n"
+
+
+# ----------------------------------------------------------------------
+# Markdown
+# ----------------------------------------------------------------------
+
+def iter_lesson_plan_markdown(plan):
+    """Yield one lesson plan as Markdown (the text gradio_server.format_lesson_plan displays)"""
+    yield f"# 📚 Lesson Plan: {plan['topic']}\n**Duration:** {plan['duration']}\n\n"
+    yield "## 🎯 Learning Objectives:\n" + "".join(f"- {objective}\n" for objective in plan["objectives"])
+    yield "\n## 📖 Lesson Structure:\n"
+    for section in plan["sections"]:
+        parts = [f"\n### {section['title']} ({section['duration']})\n", f"{section['content']}\n"]
+        if "activities" in section:
+            parts.append("\n#### 🔹 Activities:\n")
+            parts.extend(f"- {activity}\n" for activity in section["activities"])
+        yield "".join(parts)
+    yield f"\n## 📝 Assessment:\n{plan['assessment']}\n"
+
+
+def export_lesson_plans_markdown(plans):
+    """Yield Markdown for a sequence of lesson plans, separated by rules"""
+    for n, plan in enumerate(plans):
+        if n:
+            yield "\n---\n\n"
+        yield from iter_lesson_plan_markdown(plan)
+
+
+def _md_line(value):
+    # Keep each field on one line so it cannot break the list structure, and escape inline HTML
+    return escape(" ".join(str(value if value is not None else "").split()), quote=False)
+
+
+def export_markdown(questions, title="Question Bank"):
+    """Yield a Markdown quiz with the answers in collapsed <details> blocks"""
+    yield f"# 📝 Quiz: {_md_line(title)}\n"
+    topic = None
+    for i, question in enumerate(questions, 1):
+        if question.get("topic") and question["topic"] != topic and question["topic"] != title:
+            topic = question["topic"]
+            yield f"\n## {_md_line(topic)}\n"
+        options = "".join(f"- {chr(65 + j) if j < 26 else j + 1}. {_md_line(option)}\n"
+                          for j, option in enumerate(question.get("options") or []))
+        yield (f"\n### Q{i}. {_md_line(question.get('question'))}\n\n{options}\n"
+               f"<details><summary>Show answer</summary>\n\n"
+               f"**✅ Correct Answer:** {_md_line(question.get('correct_answer'))}\n\n"
+               f"**💡 Explanation:** {_md_line(question.get('explanation'))}\n\n</details>\n")
+
+
+# ----------------------------------------------------------------------
+# CSV
+# ----------------------------------------------------------------------
+
+CSV_COLUMNS = ["topic", "difficulty", "question", "options", "correct_answer", "explanation"]
+LESSON_PLAN_CSV_COLUMNS = ["topic", "duration", "section", "section_duration", "content", "activities"]
+
+
+def _csv_rows(rows, columns):
+    # One reusable buffer, drained after every row
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()  # Header only, if there were no rows
+
+
+def export_csv(questions, title=""):
+    """Yield CSV with one row per question; options are one cell, one option per line"""
+    return _csv_rows(([question.get("topic") or title, question.get("difficulty") or "", question.get("question"),
+                       "\n".join(map(str, question.get("options") or [])), question.get("correct_answer"),
+                       question.get("explanation") or ""] for question in questions), CSV_COLUMNS)
+
+
+def export_lesson_plans_csv(plans):
+    """Yield CSV with one row per lesson-plan section"""
+    return _csv_rows(([plan.get("topic"), plan.get("duration"), section.get("title"), section.get("duration"),
+                       section.get("content"), "\n".join(map(str, section.get("activities") or []))]
+                      for plan in plans for section in plan.get("sections") or []), LESSON_PLAN_CSV_COLUMNS)
+
+
+# ----------------------------------------------------------------------
+# Moodle GIFT
+# ----------------------------------------------------------------------
+
+_GIFT_SPECIAL = str.maketrans({c: "\\" + c for c in "~=#{}:\\"})
+
+
+def _gift(value):
+    # GIFT control characters are backslash-escaped; newlines would end the question
+    return " ".join(str(value if value is not None else "").split()).translate(_GIFT_SPECIAL)
+
+
+def export_gift(questions, title="Question Bank"):
+    """Yield Moodle GIFT; each topic becomes a $CATEGORY and each question keeps its explanation as feedback"""
+    topic = None
+    for i, question in enumerate(questions, 1):
+        question_topic = question.get("topic") or title
+        if question_topic != topic:
+            topic = question_topic
+            yield f"$CATEGORY: $course$/EduChain/{_gift(topic).replace('/', '-')}\n\n"
+        answer = question.get("correct_answer")
+        choices = " ".join(("=" if option == answer else "~") + _gift(option) for option in question.get("options") or [])
+        feedback = f" #### {_gift(question['explanation'])}" if question.get("explanation") else ""
+        yield f"::Q{i}:: {_gift(question.get('question'))} {{{choices}{feedback}}}\n\n"
+
+
+# Format name -> (question exporter, lesson-plan exporter or None, content type, file extension)
+FORMATS = {
+    "html": (export_html, export_lesson_plans_html, "text/html; charset=utf-8", ".html"),
+    "markdown": (export_markdown, export_lesson_plans_markdown, "text/markdown; charset=utf-8", ".md"),
+    "csv": (export_csv, export_lesson_plans_csv, "text/csv; charset=utf-8", ".csv"),
+    "gift": (export_gift, None, "text/plain; charset=utf-8", ".gift"),
+}
+
+
+def export_questions(questions, fmt, title="Question Bank"):
+    """Yield `questions` (an iterable of question dicts) in the given format"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected one of {', '.join(FORMATS)})")
+    return FORMATS[fmt][0](questions, title)
+
+
+def export_lesson_plans(plans, fmt):
+    """Yield `plans` (an iterable of lesson-plan dicts) in the given format"""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format '{fmt}' (expected one of {', '.join(FORMATS)})")
+    if FORMATS[fmt][1] is None:
+        raise ValueError(f"Lesson plans cannot be exported as {fmt}")
+    return FORMATS[fmt][1](plans)
+
+
+def write_export(chunks, destination):
+    """Write chunks to a path or an open text file as they are produced; returns characters written"""
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, "w", encoding="utf-8", newline="") as f:
+            return write_export(chunks, f)
+    written = 0
+    for chunk in chunks:
+        destination.write(chunk)
+        written += len(chunk)
+    return written
+
+
+# ----------------------------------------------------------------------
+# Inputs and HTTP
+# ----------------------------------------------------------------------
+
+def iter_documents(path):
+    """Yield the JSON documents in a .json file (one document or a list) or a .jsonl file (one per line)"""
+    with open(path, encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        data = json.load(f)
+    yield from data if isinstance(data, list) else [data]
+
+
+def iter_quiz_questions(quizzes):
+    """Flatten {"topic", "questions"} documents into question dicts carrying their topic"""
+    for quiz in quizzes:
+        for question in quiz.get("questions") or []:
+            if isinstance(question, dict):
+                yield dict(question, topic=question.get("topic") or quiz.get("topic"))
+
+
+class _ExportRequestHandler(BaseHTTPRequestHandler):
+    bank = None  # Set by serve_exports()
+    protocol_version = "HTTP/1.1"  # Chunked transfer encoding does not exist in HTTP/1.0
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        fmt = query.get("format", "html")
+        if url.path != "/export" or fmt not in FORMATS:
+            self.send_error(404, f"use /export?format={'|'.join(FORMATS)}&topic=...")
+            return
+        topic = query.get("topic")
+        questions = self.bank.iter_questions(topic=topic, difficulty=query.get("difficulty"))
+        self.send_response(200)
+        self.send_header("Content-Type", FORMATS[fmt][2])
+        self.send_header("Content-Disposition", f"attachment; filename=educhain{FORMATS[fmt][3]}")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        # Chunked encoding: each exporter chunk goes out as soon as it is rendered
+        for chunk in export_questions(questions, fmt, title=topic or "Question Bank"):
+            data = chunk.encode("utf-8")
+            if data:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.write(b"0\r\n\r\n")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_exports(bank, port=8800, host="0.0.0.0"):
+    """Serve GET /export?format=...&topic=...&difficulty=... from the question bank (blocks)"""
+    handler = type("ExportRequestHandler", (_ExportRequestHandler,), {"bank": bank})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"📦 Exports on http://{host}:{port}/export?format={'|'.join(FORMATS)}")
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export quizzes, the question bank or lesson plans")
+    parser.add_argument("--format", choices=list(FORMATS), default="html")
+    parser.add_argument("--input", help="Quiz or lesson-plan .json/.jsonl file (default: the question bank)")
+    parser.add_argument("--topic", help="Only export this topic from the question bank")
+    parser.add_argument("--difficulty", choices=["easy", "medium", "hard"])
+    parser.add_argument("--title", default="Question Bank")
+    parser.add_argument("--out", help="Output file (default: stdout)")
+    parser.add_argument("--serve", type=int, metavar="PORT", help="Serve exports over HTTP instead")
+    args = parser.parse_args()
+
+    if args.serve:
+        from question_bank import get_default_bank
+        serve_exports(get_default_bank(), args.serve)
+        return
+    if args.input:
+        documents = iter_documents(args.input)
+        first = next(documents, None)
+        if first is None:
+            sys.exit(f"No documents in {args.input}")
+        documents = (doc for part in ([first], documents) for doc in part)
+        if "sections" in first:
+            chunks = export_lesson_plans(documents, args.format)
+        else:
+            chunks = export_questions(iter_quiz_questions(documents), args.format, title=first.get("topic") or args.title)
+    else:
+        from question_bank import get_default_bank
+        chunks = export_questions(get_default_bank().iter_questions(topic=args.topic, difficulty=args.difficulty), args.format,
+                                  title=args.topic or args.title)
+
+    written = write_export(chunks, args.out or sys.stdout)
+    if args.out:
+        print(f"✓ Exported {written} characters to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
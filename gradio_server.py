@@ -1,139 +1,374 @@
 # Import necessary libraries
 import gradio as gr  # For building the web interface
-from groq import Groq  # For connecting to the Groq API (LLM service)
 from dotenv import load_dotenv  # For loading environment variables from a .env file
+
+# Load environment variables (e.g., GROQ_API_KEY) before the project imports read their EDUCHAIN_* defaults
+load_dotenv()
+
+from llm_backend import create_client  # For connecting to the Groq API (or the offline fake backend)
 import os
+import copy
 import json
+import re
+import atexit
+import shutil
+import asyncio
+import tempfile
+from llm_cache import cached_completion, cached_completion_stream, get_default_cache  # Shared response cache
+from singleflight import SingleFlight  # Coalesces concurrent identical requests
+from json_stream import QuestionStreamParser  # Incremental parsing of streamed quizzes
+from sharding import DEFAULT_SHARD_SIZE, generate_sharded, iter_sharded_questions, shard_guidance  # Large quizzes
+from question_bank import get_default_bank, iter_bank_questions, serve_from_bank, fallback_quiz, normalize_topic  # Stored questions
+from schema import repair_mcqs, repair_question, complete_lesson_plan  # Validation and partial repair
+from exporter import FORMATS, export_questions, write_export  # Streaming bulk export
+from exporter import html_quiz_header, html_question, HTML_QUIZ_FOOTER, iter_lesson_plan_markdown  # Shared renderers
+from jobs import JobQueue, QueueFull, PRIORITY_SHORT, PRIORITY_NORMAL, PRIORITY_LONG  # Background generation jobs
+from lesson_plans import DEFAULT_OUTLINE_FIRST, iter_lesson_plan, regenerate_section  # Outline-first lesson plans
+from semantic_topics import get_default_topic_index, lesson_plan_scope, semantic_topic  # Similar-topic cache hits
+from prompts import mcq_prompt, lesson_plan_prompt, ab_report  # Prompt template registry
+from model_router import DEFAULT_MODEL  # Latency-adaptive model routing
+from metrics import metrics, handler, timed, start_metrics_server, DEFAULT_METRICS_PORT  # Instrumentation
 
-# Load environment variables (e.g., GROQ_API_KEY)
-load_dotenv()
+# Initialize the LLM client using the API key (EDUCHAIN_BACKEND=fake runs offline)
+client = create_client()
+
+# "auto" lets the model router pick the fast or the strong model per request (EDUCHAIN_MODEL pins one);
+# questions are banked under the model that actually answered (each completion's .model)
+MODEL = DEFAULT_MODEL
+
+# Shared response cache so repeated topics skip the LLM round trip
+cache = get_default_cache()
+
+# In-flight deduplication: a class clicking "Generate Quiz" on the same topic shares one call
+inflight = SingleFlight()
 
-# Initialize the Groq client using the API key
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Persistent bank of every generated question, for "Serve from bank" quizzes
+bank = get_default_bank()
 
-# Define the LLM model to be used
-MODEL = "llama3-70b-8192"
+# Differently worded topics ("Intro to Python", "Python basics") map onto one already generated
+topic_index = get_default_topic_index()
+
+# Generation runs as background jobs: a bounded, per-user fair queue in front of the LLM
+jobs = JobQueue()
+
+# Number of clicks each button may follow at once; they only wait on jobs, so this can be high
+CONCURRENCY_LIMIT = int(os.getenv("EDUCHAIN_CONCURRENCY", "1000"))
+
+# Seconds between checks on a job's progress
+JOB_POLL_INTERVAL = float(os.getenv("EDUCHAIN_JOB_POLL", "0.25"))
 
 # Function to convert MCQ JSON data to formatted HTML for display in Gradio
+@timed("format")
 def format_mcqs_for_display(json_data):
     """Convert MCQ JSON to interactive HTML format"""
-
-    # Create the quiz container
-    html_output = f"""
-    <div style='font-family: Arial, sans-serif; max-width: 800px; margin: 0 auto; color: #ffffff; background-color: #0e1117; padding: 20px; border-radius: 8px;'>
-        <h2 style='color: #6cb4ff; padding-bottom: 8px; border-bottom: 1px solid #444;'>📝 Quiz: {json_data['topic']}</h2>
-    """
-
-    # Loop through each question
+    parts = [html_quiz_header(json_data['topic'])]
     for i, question in enumerate(json_data["questions"], 1):
-        html_output += f"""
-        <div style='margin-bottom: 30px; padding: 15px; border-radius: 4px; border: 1px solid #333; background-color: #161b22;'>
-            <h3 style='color: #6cb4ff; margin-top: 0;'>Q{i}. {question['question']}</h3>
-            <div style='margin-left: 10px;'>
-        """
-
-        # Add each option as a radio button
-        for j, opt in enumerate(question["options"]):
-            html_output += f"""
-            <div style='padding: 8px 0; display: flex; align-items: center; cursor: pointer; color: #ffffff;'
-                 onclick='this.querySelector("input").checked = true'>
-                <input type='radio' name='q{i}' id='q{i}o{j}' style='margin-right: 10px;'>
-                <label for='q{i}o{j}' style='flex: 1; cursor: pointer;'>{opt}</label>
-            </div>
-            """
-
-        # Add answer reveal section
-        html_output += f"""
-            </div>
-            <div id='answer-{i}' style='display: none; margin-top: 15px; padding: 12px; background: #1f2937; border-radius: 4px; color: #d1d5db;'>
-                <p style='margin: 0 0 8px 0;'><strong style='color: #22c55e;'>✅ Correct Answer:</strong> {question['correct_answer']}</p>
-                <p style='margin: 0;'><strong>💡 Explanation:</strong> {question['explanation']}</p>
-            </div>
-            <button onclick='document.getElementById(\"answer-{i}\").style.display = \"block\"; this.style.display = \"none\"' 
-                    style='margin-top: 10px; background: #374151; color: #ffffff; border: 1px solid #4b5563; padding: 6px 12px; border-radius: 4px; cursor: pointer;'>
-                Show Answer
-            </button>
-        </div>
-        """
-
-    html_output += "</div>"
-    return html_output
+        parts.append(html_question(i, question))
+    parts.append(HTML_QUIZ_FOOTER)
+    return "".join(parts)
+
+# Generator version of format_mcqs_for_display for streamed quizzes
+def format_mcqs_stream(topic, questions):
+    """Yield the quiz HTML again each time a new question arrives from `questions`"""
+    header = html_quiz_header(topic)
+    rendered = []
+    for i, question in enumerate(questions, 1):
+        rendered.append(html_question(i, question))
+        # Gradio replaces the whole output on each yield, so send the quiz so far
+        yield header + "".join(rendered) + HTML_QUIZ_FOOTER
 
 # Function to convert lesson plan JSON data to markdown
+@timed("format")
 def format_lesson_plan(json_data):
     """Convert lesson plan JSON to structured markdown"""
-    
-    output = f"# 📚 Lesson Plan: {json_data['topic']}\n"
-    output += f"**Duration:** {json_data['duration']}\n\n"
-
-    # Add learning objectives
-    output += "## 🎯 Learning Objectives:\n"
-    for obj in json_data["objectives"]:
-        output += f"- {obj}\n"
-
-    # Add structured sections
-    output += "\n## 📖 Lesson Structure:\n"
-    for section in json_data["sections"]:
-        output += f"\n### {section['title']} ({section['duration']})\n"
-        output += f"{section['content']}\n"
-        if "activities" in section:
-            output += "\n#### 🔹 Activities:\n"
-            for activity in section["activities"]:
-                output += f"- {activity}\n"
-
-    # Add assessment method
-    output += f"\n## 📝 Assessment:\n{json_data['assessment']}\n"
-    return output
+    return "".join(iter_lesson_plan_markdown(json_data))
+
+# Function to build the MCQ prompt shared by the regular, streaming and sharded handlers
+def _mcq_prompt(topic, num_questions, guidance=None):
+    # Compact registry template; shards add their own focus (and questions to avoid)
+    return mcq_prompt(topic, num_questions, guidance)
+
+# Function returning the key the CLI and MCP server's near-duplicate index files a prompt's questions under
+def _dedup_source(prompt):
+    return cache.make_key(MODEL, prompt, 0.7, {"type": "json_object"})
+
+# Function returning the per-shard generator used for large quizzes; each shard banks its own questions
+def _mcq_shard_generator(topic, fresh=False):
+    def generate_shard(shard, avoid):
+        prompt = _mcq_prompt(topic, shard["count"], shard_guidance(shard, avoid))
+        content = cached_completion(
+            client,
+            prompt,
+            model=MODEL,
+            temperature=0.7,
+            response_format={"type": "json_object"},
+            cache=cache,
+            bypass=fresh
+        )
+        # Invalid questions are dropped here and topped up by the sharding rounds
+        json_data = repair_mcqs(content, topic)[0]
+        bank.add_quiz(json_data, model=content.model, topic=topic, source=_dedup_source(prompt))
+        return json_data
+    return generate_shard
+
+# Function to fill a quiz up to num_questions after invalid questions were dropped
+def _top_up(topic, num_questions, questions, fresh=False):
+    shortfall = int(num_questions) - len(questions)
+    if shortfall <= 0:
+        return []
+    avoid = [question["question"] for question in questions]
+    return list(iter_sharded_questions(_mcq_shard_generator(topic, fresh), shortfall, avoid=avoid))
 
 # Function to generate MCQs using the Groq LLM
-def generate_mcqs(topic: str, num_questions: int = 5):
-    # Define prompt for the LLM
-    prompt = f"""Generate {num_questions} multiple-choice questions about {topic}.
-    For each question:
-    - Provide 4 clear options (A-D)
-    - Mark the correct answer
-    - Add a 1-sentence explanation
-    Return JSON with this structure:
-    {{"topic": "string", "questions": [{{"question": "string", "options": ["A", ...], "correct_answer": "string", "explanation": "string"}}]}}"""
-
-    # Send request to Groq API
-    response = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
+def generate_mcqs(topic: str, num_questions: int = 5, fresh: bool = False):
+    # Concurrent requests with the same key share the whole pipeline (completion, repair, top-up,
+    # banking) and get the same rendered quiz. The prompt is built from the key's topic, so every
+    # caller sees the spelling it asked for; differently cased topics already arrive as one from semantic_topic
+    topic = " ".join(topic.split())
+    key = ("mcq", topic, int(num_questions), MODEL, 0.7, bool(fresh))
+    return inflight.do(key, _generate_mcqs, topic, int(num_questions), fresh)
+
+def _generate_mcqs(topic, num_questions, fresh=False):
+    # Large quizzes are split into shards that are generated concurrently and merged (each shard banks its questions)
+    if num_questions > DEFAULT_SHARD_SIZE:
+        return format_mcqs_for_display(generate_sharded(_mcq_shard_generator(topic, fresh), topic, num_questions))
+
+    # Send request to Groq API (served from the cache unless a fresh variant is requested)
+    prompt = _mcq_prompt(topic, num_questions)
+    content = cached_completion(
+        client,
+        prompt,
         model=MODEL,
         temperature=0.7,
-        response_format={"type": "json_object"}
+        response_format={"type": "json_object"},
+        cache=cache,
+        bypass=fresh
     )
 
-    # Convert model response to JSON and format it for display
-    json_data = json.loads(response.choices[0].message.content)
+    # Repair the response locally, re-request only the questions that could not be fixed, and format it
+    json_data, _ = repair_mcqs(content, topic)
+    bank.add_quiz(json_data, model=content.model, topic=topic, source=_dedup_source(prompt))  # Keep every generated question
+    json_data["questions"] += _top_up(topic, num_questions, json_data["questions"], fresh)
     return format_mcqs_for_display(json_data)
 
+# Function to build a quiz from the question bank, generating only the missing questions
+def generate_mcqs_from_bank(topic: str, num_questions: int = 5, fresh: bool = False):
+    json_data = serve_from_bank(bank, topic, int(num_questions), _mcq_shard_generator(topic, fresh))
+    return format_mcqs_for_display(json_data)
+
+# Function to generate MCQs with streaming, rendering each question as soon as it is complete
+def generate_mcqs_stream(topic: str, num_questions: int = 5, fresh: bool = False):
+    # Large quizzes stream shard by shard, as each shard completes
+    if int(num_questions) > DEFAULT_SHARD_SIZE:
+        questions = iter_sharded_questions(_mcq_shard_generator(topic, fresh), int(num_questions))
+        yield from format_mcqs_stream(topic, questions)
+        return
+
+    parser = QuestionStreamParser()
+    prompt = _mcq_prompt(topic, num_questions)
+    chunks = cached_completion_stream(
+        client,
+        prompt,
+        model=MODEL,
+        temperature=0.7,
+        cache=cache,
+        bypass=fresh
+    )
+
+    def questions():
+        valid = []
+        for chunk in chunks:
+            for question in parser.feed(chunk):
+                question = repair_question(question)
+                if question is not None:
+                    valid.append(question)
+                    bank.add_questions(topic, [question], model=chunk.model,  # Keep every generated question
+                                       source=_dedup_source(prompt))
+                    yield question
+        # Questions that were malformed (or never written) are requested again at the end
+        yield from _top_up(topic, num_questions, valid, fresh)
+
+    # The topic is only known once the model has written it, so fall back to the user's input
+    yield from format_mcqs_stream(topic, questions())
+
+# Quiz button handler: serve from the bank, stream questions progressively or render the whole quiz at once
+@handler("gradio.generate_quiz")
+def generate_quiz(topic: str, num_questions: int = 5, fresh: bool = False, stream: bool = False,
+                  from_bank: bool = False):
+    topic = semantic_topic(topic_index, topic, "mcq:bank" if from_bank else f"mcq:{int(num_questions)}", fresh)
+    if from_bank and stream:
+        # Stored questions appear at once, generated ones as their shards complete
+        questions = iter_bank_questions(bank, topic, int(num_questions), _mcq_shard_generator(topic, fresh))
+        yield from format_mcqs_stream(topic, questions)
+    elif from_bank:
+        yield generate_mcqs_from_bank(topic, num_questions, fresh)
+    else:
+        try:
+            if stream:
+                yield from generate_mcqs_stream(topic, num_questions, fresh)
+            else:
+                yield generate_mcqs(topic, num_questions, fresh)
+        except Exception as e:
+            # Upstream failed (or its circuit breaker is open): fall back to stored questions if there are any
+            json_data = fallback_quiz(bank, topic, int(num_questions))
+            if json_data is None:
+                raise gr.Error(f"Quiz generation is unavailable right now: {e}")
+            yield format_mcqs_for_display(json_data)
+
 # Function to generate a lesson plan using the Groq LLM
-def generate_lesson_plan(topic: str, duration: str = "60 minutes"):
-    # Define prompt for the LLM
-    prompt = f"""Create a {duration} lesson plan about {topic}.
-    Include:
-    - 3-5 learning objectives
-    - 3-5 sections with titles/durations
-    - Key content points for each section
-    - Suggested activities
-    - Assessment method
-    Return JSON with this structure:
-    {{"topic": "string", "duration": "string", "objectives": ["string"], 
-    "sections": [{{"title": "string", "content": "string", "duration": "string", 
-    "activities": ["string"]}}], "assessment": "string"}}"""
-
-    # Send request to Groq API
-    response = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
+@handler("gradio.generate_lesson_plan")
+def generate_lesson_plan(topic: str, duration: str = "60 minutes", fresh: bool = False):
+    topic = " ".join(semantic_topic(topic_index, topic, lesson_plan_scope(duration), fresh).split())
+    # Concurrent requests with the same key share the whole pipeline, repair requests included;
+    # each caller gets its own copy of the plan, since regenerating a section edits it in place
+    key = ("lesson_plan", topic, duration, MODEL, 0.5, bool(fresh))
+    markdown, json_data = inflight.do(key, _generate_lesson_plan, topic, duration, fresh)
+    return markdown, copy.deepcopy(json_data)
+
+def _generate_lesson_plan(topic, duration, fresh=False):
+    # Send request to Groq API (served from the cache unless a fresh variant is requested)
+    content = cached_completion(
+        client,
+        lesson_plan_prompt(topic, duration),
         model=MODEL,
         temperature=0.5,
-        response_format={"type": "json_object"}
+        response_format={"type": "json_object"},
+        cache=cache,
+        bypass=fresh
     )
 
-    # Convert model response to JSON and format it for display
-    json_data = json.loads(response.choices[0].message.content)
-    return format_lesson_plan(json_data)
+    # Repair the response locally (re-requesting only broken parts) and format it for display
+    json_data = complete_lesson_plan(content, topic, _lesson_request_json(fresh))
+    return format_lesson_plan(json_data), json_data
+
+# Function returning request_json for lesson plan prompts (outline, sections and patches)
+def _lesson_request_json(fresh=False):
+    def request_json(prompt):
+        return json.loads(cached_completion(client, prompt, model=MODEL, temperature=0.5,
+                                            response_format={"type": "json_object"}, cache=cache, bypass=fresh))
+    return request_json
+
+# Function to generate a lesson plan outline-first, showing each section as soon as it is written
+@handler("gradio.generate_lesson_plan_outlined")
+def generate_lesson_plan_outlined(topic: str, duration: str = "60 minutes", fresh: bool = False):
+    topic = semantic_topic(topic_index, topic, lesson_plan_scope(duration, outline_first=True), fresh)
+    for json_data in iter_lesson_plan(_lesson_request_json(fresh), topic, duration):
+        yield format_lesson_plan(json_data), json_data
+
+# Function to regenerate one section (numbered from 1) of the displayed plan, keeping the others
+@handler("gradio.regenerate_lesson_section")
+def regenerate_lesson_section(json_data, section_number: int = 1, guidance: str = ""):
+    if not json_data or any(section.get("pending") for section in json_data.get("sections", [])):
+        raise gr.Error("Create a lesson plan (and let it finish) before regenerating a section")
+    try:
+        regenerate_section(json_data, int(section_number) - 1, _lesson_request_json(fresh=True),
+                           guidance=guidance.strip() or None)
+    except IndexError as e:
+        raise gr.Error(str(e))
+    return format_lesson_plan(json_data), json_data
+
+# Fair-share key for the job queue: the logged-in user, else the browser session
+def _job_user(request):
+    if request is None:
+        return "anonymous"
+    return getattr(request, "username", None) or request.session_hash or request.client.host
+
+# Function to submit a job, converting load shedding into a "try later" message for the user
+def _submit(request, func, *args, priority):
+    try:
+        return jobs.submit(_job_user(request), func, *args, priority=priority)
+    except QueueFull as e:
+        raise gr.Error(str(e))
+
+# Async generator that pushes a job's queue position, partial output and result to the browser
+async def _follow(job, waiting_message):
+    shown_status, shown_version = None, -1
+    try:
+        while not job.done:
+            if job.status == "queued":
+                status = waiting_message(jobs.position(job), jobs.estimated_wait(job))
+                if status != shown_status:
+                    shown_status = status
+                    yield status
+            elif job.version != shown_version and job.partial is not None:
+                shown_version = job.version
+                yield job.partial  # Streamed quizzes update as questions arrive
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+    finally:
+        # The browser went away (Gradio cancels this generator): a job that has not started is dropped
+        if not job.done:
+            jobs.cancel(job)
+    if job.error is not None:
+        raise job.error if isinstance(job.error, gr.Error) else gr.Error(str(job.error))
+    if job.version != shown_version:
+        yield job.result
+
+def _queued_markdown(ahead, wait):
+    place = "next in line" if not ahead else f"{ahead} request{'s' if ahead > 1 else ''} ahead"
+    return f"⏳ Queued ({place}), about {wait:.0f}s until generation starts…"
+
+def _queued_html(ahead, wait):
+    return f"<p>{_queued_markdown(ahead, wait)}</p>"
+
+# Quiz button handler: queue the generation as a job and follow it
+async def submit_quiz(topic: str, num_questions: int = 5, fresh: bool = False, stream: bool = False,
+                      from_bank: bool = False, request: gr.Request = None):
+    # Short quizzes (and bank lookups) go ahead of large quizzes and lesson plans
+    priority = PRIORITY_SHORT if from_bank or int(num_questions) <= DEFAULT_SHARD_SIZE else PRIORITY_NORMAL
+    job = _submit(request, generate_quiz, topic, num_questions, fresh, stream, from_bank, priority=priority)
+    async for output in _follow(job, _queued_html):
+        yield output
+
+# Lesson plan outputs are (markdown, plan); while queued only the markdown changes
+def _queued_lesson(ahead, wait):
+    return _queued_markdown(ahead, wait), gr.update()
+
+# Lesson plan button handler: queue the generation as a low-priority job and follow it
+async def submit_lesson_plan(topic: str, duration: str = "60 minutes", fresh: bool = False,
+                             outline_first: bool = DEFAULT_OUTLINE_FIRST, request: gr.Request = None):
+    func = generate_lesson_plan_outlined if outline_first else generate_lesson_plan
+    job = _submit(request, func, topic, duration, fresh, priority=PRIORITY_LONG)
+    async for output in _follow(job, _queued_lesson):
+        yield output
+
+# Section button handler: a single section is a short job
+async def submit_regenerate_section(json_data, section_number: int = 1, guidance: str = "",
+                                    request: gr.Request = None):
+    job = _submit(request, regenerate_lesson_section, json_data, section_number, guidance, priority=PRIORITY_SHORT)
+    async for output in _follow(job, _queued_lesson):
+        yield output
+
+# Export files live in one temporary directory, removed on exit; each topic and format reuses its file
+EXPORT_DIR = tempfile.mkdtemp(prefix="educhain_exports_")
+atexit.register(shutil.rmtree, EXPORT_DIR, ignore_errors=True)
+
+# Function to export the question bank (or one topic of it) to a downloadable file
+def export_bank(topic: str = "", fmt: str = "html"):
+    topic = topic.strip() or None
+    questions = bank.iter_questions(topic=topic)
+    name = re.sub(r"\W+", "_", normalize_topic(topic)).strip("_") if topic else "bank"
+    path = os.path.join(EXPORT_DIR, f"educhain_{name or 'topic'}{FORMATS[fmt][3]}")
+    # Written next to the target and renamed, so a concurrent download never sees half a file
+    with tempfile.NamedTemporaryFile("w", dir=EXPORT_DIR, suffix=".part", delete=False,
+                                     encoding="utf-8", newline="") as f:
+        write_export(export_questions(questions, fmt, title=topic or "Question Bank"), f)
+    os.replace(f.name, path)
+    return path
+
+# Function to report cache, request-coalescing, question bank, job queue and upstream resilience counters
+def get_server_stats():
+    stats = {"cache": cache.stats(), "coalescing": inflight.stats(), "bank": bank.stats(), "jobs": jobs.stats(),
+             "semantic_topics": topic_index.stats(), "prompts": ab_report()}
+    if hasattr(client, "stats"):
+        stats["upstream"] = client.stats()  # Retries, breakers, per-model latency and recent routing decisions
+    return stats
+
+# Cache, coalescing, bank, job queue and upstream counters are exported on /metrics next to the request timings
+for _name, _stats in (("cache", cache.stats), ("coalescing", inflight.stats), ("bank", bank.stats),
+                      ("jobs", jobs.stats), ("semantic_topics", topic_index.stats), ("prompts", ab_report)):
+    metrics.register_stats(_name, _stats)
+if hasattr(client, "stats"):
+    metrics.register_stats("upstream", client.stats)
 
 # Build Gradio interface
 with gr.Blocks(theme=gr.themes.Soft()) as app:
@@ -144,10 +379,13 @@ with gr.Blocks(theme=gr.themes.Soft()) as app:
         with gr.Row():
             topic_mcq = gr.Textbox(label="Topic", placeholder="e.g., Quantum Mechanics")  # Input: topic
             num_questions = gr.Dropdown(
-                choices=[str(i) for i in range(1, 16)],
+                choices=[str(i) for i in range(1, 16)] + ["20", "30", "50", "100"],
                 value="5",
                 label="Number of Questions"
             )  # Dropdown to choose number of questions
+            fresh_mcq = gr.Checkbox(label="Fresh variant", value=False)  # Skip the cache for a new quiz
+            stream_mcq = gr.Checkbox(label="Stream questions", value=False)  # Show questions as they arrive
+            bank_mcq = gr.Checkbox(label="Serve from bank", value=False)  # Reuse stored questions first
         mcq_btn = gr.Button("Generate Quiz", variant="primary")  # Button to generate quiz
         mcq_output = gr.HTML(label="Generated Quiz")  # HTML output for MCQ display
 
@@ -156,21 +394,53 @@ with gr.Blocks(theme=gr.themes.Soft()) as app:
         with gr.Row():
             topic_lesson = gr.Textbox(label="Topic", placeholder="e.g., Thermodynamics")  # Input: topic
             duration = gr.Dropdown(["30 mins", "60 mins", "90 mins", "2 hours"], value="60 mins", label="Duration")  # Duration dropdown
+            fresh_lesson = gr.Checkbox(label="Fresh variant", value=False)  # Skip the cache for a new plan
+            outline_lesson = gr.Checkbox(label="Outline first", value=DEFAULT_OUTLINE_FIRST)  # Stream sections as they finish
         lesson_btn = gr.Button("Create Plan", variant="primary")  # Button to generate lesson plan
         lesson_output = gr.Markdown(label="Lesson Plan")  # Output lesson plan in markdown
+        lesson_state = gr.State()  # The displayed plan as JSON, for regenerating one section
+        with gr.Row():
+            section_number = gr.Number(label="Section", value=1, precision=0, minimum=1)  # Section to replace
+            section_guidance = gr.Textbox(label="Guidance (optional)", placeholder="e.g., More hands-on")  # Steers the new version
+            section_btn = gr.Button("Regenerate Section")  # Button to rewrite one section in place
+
+    # Tab 3: Export the question bank
+    with gr.Tab("📦 Export"):
+        with gr.Row():
+            topic_export = gr.Textbox(label="Topic", placeholder="Leave empty to export the whole bank")  # Input: topic
+            format_export = gr.Dropdown(list(FORMATS), value="html", label="Format")  # HTML, Markdown, CSV or GIFT
+        export_btn = gr.Button("Export", variant="primary")  # Button to write the export file
+        export_output = gr.File(label="Export File")  # Download link for the exported file
+
+    # Tab 4: Server statistics (cache hits and coalesced requests)
+    with gr.Tab("📊 Stats"):
+        stats_btn = gr.Button("Refresh")  # Button to reload the counters
+        stats_output = gr.JSON(label="Server Stats")  # Counters as JSON
 
     # Button click event handlers
     mcq_btn.click(
-        generate_mcqs,
-        inputs=[topic_mcq, num_questions],
-        outputs=mcq_output
+        submit_quiz,
+        inputs=[topic_mcq, num_questions, fresh_mcq, stream_mcq, bank_mcq],
+        outputs=mcq_output,
+        concurrency_limit=CONCURRENCY_LIMIT
     )
     lesson_btn.click(
-        generate_lesson_plan,
-        inputs=[topic_lesson, duration],
-        outputs=lesson_output
+        submit_lesson_plan,
+        inputs=[topic_lesson, duration, fresh_lesson, outline_lesson],
+        outputs=[lesson_output, lesson_state],
+        concurrency_limit=CONCURRENCY_LIMIT
+    )
+    section_btn.click(
+        submit_regenerate_section,
+        inputs=[lesson_state, section_number, section_guidance],
+        outputs=[lesson_output, lesson_state],
+        concurrency_limit=CONCURRENCY_LIMIT
     )
+    export_btn.click(export_bank, inputs=[topic_export, format_export], outputs=export_output)
+    stats_btn.click(get_server_stats, outputs=stats_output)
 
-# Run the app on port 7860
+# Run the app on port 7860 (metrics on EDUCHAIN_METRICS_PORT, default 9464)
 if __name__ == "__main__":
+    # Gradio has no route for plain-text metrics, so /metrics and /profile get their own port
+    start_metrics_server(DEFAULT_METRICS_PORT)
     app.launch(server_port=7860)
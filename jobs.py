@@ -0,0 +1,266 @@
+# jobs.py — Bounded background job queue with per-user fair scheduling, priorities and load shedding
+
+import os
+import time
+import uuid
+import inspect
+import threading
+from collections import deque
+from typing import Dict, Any
+
+from metrics import metrics
+
+# Defaults, overridable through the .env file
+DEFAULT_JOB_WORKERS = int(os.getenv("EDUCHAIN_JOB_WORKERS", "16"))  # Jobs running at once (upstream calls in flight)
+DEFAULT_MAX_QUEUED = int(os.getenv("EDUCHAIN_MAX_QUEUED", "200"))  # Waiting jobs before new ones are shed
+DEFAULT_PER_USER_QUEUED = int(os.getenv("EDUCHAIN_PER_USER_QUEUED", "3"))  # Waiting jobs per user
+DEFAULT_RESULT_TTL = float(os.getenv("EDUCHAIN_JOB_RESULT_TTL", "600"))  # Seconds finished jobs stay pollable
+
+# Priority classes: lower runs first. A waiting job gains one class every AGING_SECONDS,
+# so long lesson plans are delayed under load but never starved
+PRIORITY_SHORT = 0  # Small quizzes and bank lookups
+PRIORITY_NORMAL = 1  # Large quizzes
+PRIORITY_LONG = 2  # Lesson plans
+AGING_SECONDS = 20.0
+
+# Fraction of DEFAULT_MAX_QUEUED at which each class starts being shed (long jobs go first)
+SHED_AT = {PRIORITY_SHORT: 1.0, PRIORITY_NORMAL: 0.9, PRIORITY_LONG: 0.75}
+
+
+class QueueFull(RuntimeError):
+    """Raised by submit() when the job is shed; retry_after is a rough wait in seconds"""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class JobCancelled(RuntimeError):
+    """Set as the error of a job cancelled while it was still queued"""
+
+
+class Job:
+    """One submitted call and its outcome. Generator functions publish each yielded value as `partial`"""
+
+    def __init__(self, user, priority, func, args, kwargs):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.priority = priority
+        self.func, self.args, self.kwargs = func, args, kwargs
+        self.status = "queued"  # queued -> running -> done | failed, or queued -> cancelled
+        self.partial = None
+        self.version = 0  # Bumped on every partial/final update, so pollers can tell what changed
+        self.result = None
+        self.error = None
+        self.created = time.monotonic()
+        self.started = self.finished = None
+        self._done = threading.Event()
+
+    def effective_priority(self, now):
+        return self.priority - int((now - self.created) / AGING_SECONDS)
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """Block until the job finishes; returns its result or raises its error"""
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"Job {self.id} is still {self.status}")
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class JobQueue:
+    """
+    Runs submitted jobs on `workers` threads. Waiting jobs are kept per user; the next
+    job is taken from the best priority class, and within it from the user with the
+    fewest running jobs who was served longest ago, so one user's burst of requests
+    cannot starve everyone else. New jobs are shed with QueueFull once the queue is
+    deep (lower-priority classes earlier) or the user already has enough waiting.
+    """
+
+    def __init__(self, workers=DEFAULT_JOB_WORKERS, max_queued=DEFAULT_MAX_QUEUED,
+                 per_user_queued=DEFAULT_PER_USER_QUEUED, result_ttl=DEFAULT_RESULT_TTL):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.per_user_queued = per_user_queued
+        self.result_ttl = result_ttl
+
+        self._cond = threading.Condition()
+        self._waiting = {}  # user -> deque of queued jobs
+        self._queued = 0
+        self._running = {}  # user -> running job count
+        self._last_served = {}  # user -> monotonic time their last job started
+        self._jobs = {}  # job id -> Job, until result_ttl after it finished
+        self._service_times = deque(maxlen=100)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "shed": 0, "cancelled": 0}
+
+        for i in range(workers):
+            threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True).start()
+
+    # ------------------------------------------------------------------
+    # Submitting and polling
+    # ------------------------------------------------------------------
+
+    def submit(self, user, func, *args, priority=PRIORITY_NORMAL, **kwargs) -> Job:
+        """Queue func(*args, **kwargs) for user; raises QueueFull if the job is shed"""
+        with self._cond:
+            self._purge()
+            waiting = self._waiting.get(user)
+            if waiting and len(waiting) >= self.per_user_queued:
+                self._counters["shed"] += 1
+                raise QueueFull(f"You already have {len(waiting)} requests waiting; "
+                                f"please wait for them to finish", self._estimate_wait(len(waiting)))
+            if self._queued >= self.max_queued * SHED_AT.get(priority, 1.0):
+                self._counters["shed"] += 1
+                wait = self._estimate_wait(self._queued)
+                raise QueueFull(f"The server is busy ({self._queued} requests waiting); "
+                                f"please try again in about {wait:.0f} seconds", wait)
+            job = Job(user, priority, func, args, kwargs)
+            self._waiting.setdefault(user, deque()).append(job)
+            self._jobs[job.id] = job
+            self._queued += 1
+            self._counters["submitted"] += 1
+            self._cond.notify()
+            return job
+
+    def get(self, job_id):
+        """Return the Job with this id, or None if it is unknown or expired"""
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job):
+        """Drop a job that is still queued (e.g. its browser went away); returns False once it has started"""
+        with self._cond:
+            if job.status != "queued":
+                return False
+            waiting = self._waiting[job.user]
+            waiting.remove(job)
+            if not waiting:
+                del self._waiting[job.user]
+            self._queued -= 1
+            self._counters["cancelled"] += 1
+            job.status, job.error = "cancelled", JobCancelled(f"Job {job.id} was cancelled")
+            job.finished = time.monotonic()
+            job.version += 1
+            job.func = job.args = job.kwargs = None
+        job._done.set()
+        return True
+
+    def position(self, job):
+        """
+        Number of waiting jobs that will start before this queued job (0 once it is running),
+        found by replaying _next_job's choices on a copy of the queue, assuming no job
+        finishes meanwhile; waiting jobs keep aging, so it is still an estimate
+        """
+        with self._cond:
+            if job.status != "queued":
+                return 0
+            now = time.monotonic()
+            waiting = {user: list(jobs) for user, jobs in self._waiting.items()}
+            running = dict(self._running)
+            last_served = dict(self._last_served)
+            ahead = 0
+            while True:
+                user = min(waiting, key=lambda u: self._schedule_key(waiting[u][0], u, running, last_served, now))
+                if waiting[user][0] is job:
+                    return ahead
+                waiting[user].pop(0)
+                if not waiting[user]:
+                    del waiting[user]
+                running[user] = running.get(user, 0) + 1
+                last_served[user] = now + ahead * 1e-6  # Later picks count as served later
+                ahead += 1
+
+    def estimated_wait(self, job):
+        """Rough seconds until this queued job starts"""
+        return self._estimate_wait(self.position(job) + 1) if job.status == "queued" else 0.0
+
+    def _estimate_wait(self, jobs_ahead):
+        # Jobs ahead are served `workers` at a time at the recent average service time
+        average = sum(self._service_times) / len(self._service_times) if self._service_times else 5.0
+        return max(1.0, jobs_ahead / max(1, self.workers) * average)
+
+    # ------------------------------------------------------------------
+    # Scheduling
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _schedule_key(job, user, running, last_served, now):
+        # Best priority class first, then the user with the fewest running jobs, then the least recently served
+        return job.effective_priority(now), running.get(user, 0), last_served.get(user, 0.0)
+
+    def _next_job(self):
+        # Caller holds the lock: the user whose first waiting job has the smallest _schedule_key
+        now = time.monotonic()
+        best_user, best_key = None, None
+        for user, jobs in self._waiting.items():
+            key = self._schedule_key(jobs[0], user, self._running, self._last_served, now)
+            if best_key is None or key < best_key:
+                best_user, best_key = user, key
+        jobs = self._waiting[best_user]
+        job = jobs.popleft()
+        if not jobs:
+            del self._waiting[best_user]
+        self._queued -= 1
+        self._running[best_user] = self._running.get(best_user, 0) + 1
+        self._last_served[best_user] = now
+        return job
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queued:
+                    self._cond.wait()
+                job = self._next_job()
+                job.status, job.started = "running", time.monotonic()
+            metrics.observe("educhain_job_wait_seconds", job.started - job.created,
+                            help="Time jobs spend queued before a worker picks them up", priority=str(job.priority))
+            self._run(job)
+
+    def _run(self, job):
+        try:
+            result = job.func(*job.args, **job.kwargs)
+            if inspect.isgenerator(result):
+                # Streaming handlers: publish every yielded value, the last one is the result
+                for value in result:
+                    with self._cond:
+                        job.partial, job.result = value, value
+                        job.version += 1
+                result = job.result
+            job.result, job.status = result, "done"
+        except Exception as e:
+            job.error, job.status = e, "failed"
+        finally:
+            with self._cond:
+                job.finished = time.monotonic()
+                job.version += 1
+                self._service_times.append(job.finished - job.started)
+                self._running[job.user] -= 1
+                if not self._running[job.user]:
+                    del self._running[job.user]
+                self._counters["completed" if job.error is None else "failed"] += 1
+            job.func = job.args = job.kwargs = None  # Let the inputs be collected
+            job._done.set()
+
+    def _purge(self):
+        # Caller holds the lock; forget finished jobs nobody polled within result_ttl
+        now = time.monotonic()
+        expired = [job_id for job_id, job in self._jobs.items() if job.finished and now - job.finished > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+        if len(self._last_served) > 10 * max(1, len(self._waiting) + len(self._running)):
+            self._last_served = {user: served for user, served in self._last_served.items()
+                                 if now - served < self.result_ttl}
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth, running jobs, waiting users and job counters"""
+        with self._cond:
+            stats = dict(self._counters)
+            stats.update(queued=self._queued, running=sum(self._running.values()),
+                         waiting_users=len(self._waiting), workers=self.workers, max_queued=self.max_queued)
+            stats["avg_service_seconds"] = (sum(self._service_times) / len(self._service_times)
+                                            if self._service_times else 0.0)
+        return stats
@@ -0,0 +1,77 @@
+# json_stream.py — Incremental parser that pulls quiz questions out of a token stream
+
+import re
+import json
+
+# Start of the questions array, and the quiz topic if it appears before it
+_QUESTIONS_START = re.compile(r'"questions"\s*:\s*\[')
+_TOPIC_FIELD = re.compile(r'"topic"\s*:\s*"((?:[^"\\]|\\.)*)"')
+
+
+class QuestionStreamParser:
+    """
+    Feed completion text chunk by chunk; every question object is returned
+    as soon as its closing brace arrives, without waiting for the full document.
+    Text before the JSON (e.g. a short preamble) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.topic = None
+        self.finished = False  # True once the closing ']' of the array has been seen
+
+        # Scanner state
+        self._pos = 0  # Next character of buffer to scan
+        self._in_array = False
+        self._depth = 0  # Brace depth inside the questions array
+        self._object_start = None
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, chunk):
+        """Consume a chunk of text and return the list of questions completed by it"""
+        self.buffer += chunk
+        completed = []
+
+        if not self._in_array:
+            match = _QUESTIONS_START.search(self.buffer, self._pos)
+            if match is None:
+                return completed
+            # Pick up the topic if the model wrote it before the questions
+            topic_match = _TOPIC_FIELD.search(self.buffer, 0, match.start())
+            if topic_match:
+                self.topic = json.loads(f'"{topic_match.group(1)}"')
+            self._in_array = True
+            self._pos = match.end()
+
+        buffer = self.buffer
+        i = self._pos
+        while i < len(buffer) and not self.finished:
+            char = buffer[i]
+            if self._in_string:
+                # Skip string contents so braces inside text are not counted
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == "{":
+                if self._depth == 0:
+                    self._object_start = i
+                self._depth += 1
+            elif char == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        completed.append(json.loads(buffer[self._object_start:i + 1]))
+                    except json.JSONDecodeError:
+                        pass  # Skip a malformed question rather than the whole quiz
+                    self._object_start = None
+            elif char == "]" and self._depth == 0:
+                self.finished = True
+            i += 1
+        self._pos = i
+        return completed
@@ -0,0 +1,99 @@
+# lesson_plans.py — Outline-first lesson plans: a short outline, then every section generated concurrently
+
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from prompts import lesson_outline_prompt, lesson_section_prompt
+from schema import repair_outline, repair_section, complete_lesson_plan
+
+# Defaults, overridable through the .env file
+DEFAULT_SECTION_WORKERS = int(os.getenv("EDUCHAIN_SECTION_WORKERS", "4"))  # Sections generated at the same time
+DEFAULT_OUTLINE_FIRST = os.getenv("EDUCHAIN_OUTLINE_FIRST", "0").lower() in ("1", "true", "yes")
+
+# Shown in place of a section's content until it has been written
+PENDING_CONTENT = "⏳ *Writing this section…*"
+
+# Added to the prompt when a section reply could not be repaired, so the retry is not served from the cache
+RETRY_GUIDANCE = "Reply with one JSON object that has title, content, duration and activities."
+
+
+def generate_outline(request_json, topic, duration="60 minutes", level=None):
+    """Request and repair the outline; raises ValueError if it has no usable sections"""
+    outline = repair_outline(request_json(lesson_outline_prompt(topic, duration, level)), topic, duration)
+    if not outline["sections"]:
+        raise ValueError(f"The outline for '{topic}' has no sections")
+    return outline
+
+
+def generate_section(request_json, outline, index, level=None, guidance=None):
+    """Request section `index` of an outline; raises ValueError if the reply cannot be repaired"""
+    entry = outline["sections"][index]
+    section = repair_section(request_json(lesson_section_prompt(outline, index, level, guidance)),
+                             entry["title"], entry.get("duration"))
+    if section is None:
+        raise ValueError(f"Section {index + 1} ({entry['title']}) could not be repaired")
+    return section
+
+
+def iter_lesson_plan(request_json, topic, duration="60 minutes", level=None, max_workers=DEFAULT_SECTION_WORKERS):
+    """
+    Generate a lesson plan outline-first, yielding the plan once the outline is in and
+    again as each section finishes. Until then a section holds PENDING_CONTENT and is
+    marked "pending"; the intermediate plans are one dict updated in place. Every section
+    is its own request (cached on its own) and one that fails twice is left out. The
+    last value yielded is the completed plan, repaired like any other lesson plan.
+    request_json(prompt) returns the parsed reply (or raises).
+    """
+    outline = generate_outline(request_json, topic, duration, level)
+    plan = dict(outline, sections=[dict(entry, content=PENDING_CONTENT, pending=True) for entry in outline["sections"]])
+    plan.setdefault("objectives", [])
+    plan.setdefault("assessment", "")
+    yield plan
+
+    def generate(index):
+        try:
+            return generate_section(request_json, outline, index, level)
+        except ValueError:
+            return generate_section(request_json, outline, index, level, RETRY_GUIDANCE)
+
+    failed = set()
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        # Each section runs in a copy of the caller's context, so metrics stay attributed to its handler
+        futures = {pool.submit(contextvars.copy_context().run, generate, index): index
+                   for index in range(len(outline["sections"]))}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                plan["sections"][index] = future.result()
+            except Exception as e:
+                print(f"Section {index + 1} of the lesson plan failed: {e}")
+                failed.add(index)
+                continue
+            yield plan
+
+    plan["sections"] = [section for index, section in enumerate(plan["sections"]) if index not in failed]
+    yield complete_lesson_plan(plan, topic, request_json)
+
+
+def generate_lesson_plan(request_json, topic, duration="60 minutes", level=None, max_workers=DEFAULT_SECTION_WORKERS):
+    """Generate an outline-first lesson plan and return only the completed plan"""
+    plan = None
+    for plan in iter_lesson_plan(request_json, topic, duration, level, max_workers):
+        pass
+    return plan
+
+
+def regenerate_section(plan, index, request_json, level=None, guidance=None):
+    """
+    Replace section `index` of a finished plan with a new version, in place, and return
+    the plan. The other sections are the outline the new one is written against. Pass a
+    request_json that bypasses the cache unless guidance already makes the prompt new.
+    """
+    sections = plan["sections"]
+    if not 0 <= index < len(sections):
+        raise IndexError(f"The lesson plan has no section {index + 1} (it has {len(sections)})")
+    outline = dict(plan, sections=[{"title": section["title"], "duration": section.get("duration") or ""}
+                                   for section in sections])
+    sections[index] = generate_section(request_json, outline, index, level, guidance)
+    return plan
@@ -0,0 +1,391 @@
+# llm_backend.py — Pluggable LLM backend: the Groq client, or a deterministic local fake for offline benchmarking
+#
+# Examples:
+#   EDUCHAIN_BACKEND=fake python gradio_server.py
+#   python llm_backend.py --port 8900 --latency-ms 400 --rate-limit-rate 0.05
+#   GROQ_BASE_URL=http://localhost:8900 python mcp_server.py
+
+import os
+import re
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+import threading
+from types import SimpleNamespace
+
+# Which backend create_client() builds: "groq" (default) or "fake"
+DEFAULT_BACKEND = os.getenv("EDUCHAIN_BACKEND", "groq")
+
+# Words mixed into fake questions so they do not look like near-duplicates of each other
+_FAKE_TERMS = (
+    "variables loops functions recursion classes inheritance modules exceptions iterators generators "
+    "decorators closures lists dictionaries sets tuples strings files testing debugging performance "
+    "memory scope typing packaging concurrency networking databases security algorithms sorting "
+    "searching graphs trees hashing caching logging profiling parsing serialization streams"
+).split()
+_FAKE_TEMPLATES = [
+    "Which statement best describes how {topic} handles {a} and {b}?",
+    "What is the main purpose of {a} when working with {topic}?",
+    "In {topic}, what happens to {a} after {b} are introduced?",
+    "Which of these is a common mistake with {a} in {topic}?",
+    "How do {a} and {b} interact in a typical {topic} project?",
+    "Why would a developer choose {a} over {b} in {topic}?",
+    "What is the correct way to combine {a} with {b} in {topic}?",
+    "Which tool or technique helps diagnose problems with {a} in {topic}?",
+]
+
+
+class FakeRateLimitError(Exception):
+    """Raised by the fake backend instead of a 429; shaped like groq.RateLimitError"""
+
+    def __init__(self, retry_after=1.0):
+        super().__init__("Rate limit exceeded (fake backend)")
+        self.status_code = 429
+        self.response = SimpleNamespace(headers={"retry-after": str(retry_after)})
+
+
+def _estimate_tokens(text):
+    # Roughly four characters per token, which is close enough for throughput simulation
+    return max(1, len(text) // 4)
+
+
+class FakeLLMClient:
+    """
+    Drop-in replacement for the Groq client (client.chat.completions.create) that
+    returns schema-valid quiz and lesson-plan JSON for the prompts used in this repo.
+    Latency is log-normal around latency_ms, output is paced at tokens_per_second,
+    and 429s / malformed JSON are injected at the configured rates. model_speed maps
+    model names to a speed factor (latency and generation time are divided by it), so
+    model routing can be exercised offline. Replies depend only on the seed, the
+    prompt and how many times that prompt was asked before.
+    """
+
+    def __init__(self, latency_ms=None, latency_sigma=None, tokens_per_second=None,
+                 rate_limit_rate=None, malformed_rate=None, seed=None, model_speed=None):
+        env = os.getenv
+        self.latency_ms = float(latency_ms if latency_ms is not None else env("EDUCHAIN_FAKE_LATENCY_MS", "300"))
+        self.latency_sigma = float(latency_sigma if latency_sigma is not None else env("EDUCHAIN_FAKE_LATENCY_SIGMA", "0.5"))
+        self.tokens_per_second = float(tokens_per_second if tokens_per_second is not None
+                                       else env("EDUCHAIN_FAKE_TOKENS_PER_SEC", "0"))
+        self.rate_limit_rate = float(rate_limit_rate if rate_limit_rate is not None else env("EDUCHAIN_FAKE_429_RATE", "0"))
+        self.malformed_rate = float(malformed_rate if malformed_rate is not None else env("EDUCHAIN_FAKE_MALFORMED_RATE", "0"))
+        self.seed = int(seed if seed is not None else env("EDUCHAIN_FAKE_SEED", "0"))
+        if model_speed is None:
+            # "llama-3.1-8b-instant=2,llama-3.3-70b-versatile=1"
+            pairs = (item.partition("=") for item in env("EDUCHAIN_FAKE_MODEL_SPEED", "").split(",") if "=" in item)
+            model_speed = {name.strip(): float(speed) for name, _, speed in pairs}
+        self.model_speed = model_speed
+
+        # Same call shape as groq.Groq: client.chat.completions.create(...)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+        self._lock = threading.Lock()
+        self._prompt_counts = {}  # Times each prompt was asked, so fresh variants differ
+        self._counters = {"requests": 0, "rate_limited": 0, "malformed": 0, "output_tokens": 0}
+
+    # ------------------------------------------------------------------
+    # Planning a reply (no sleeping, shared by the client and the HTTP server)
+    # ------------------------------------------------------------------
+
+    def plan(self, messages, max_tokens=None, model=None):
+        """Return a dict with the reply content (or rate_limited=True) and how long to wait"""
+        prompt = "\n".join(m.get("content", "") for m in messages if isinstance(m, dict))
+        with self._lock:
+            count = self._prompt_counts.get(prompt, 0)
+            self._prompt_counts[prompt] = count + 1
+            self._counters["requests"] += 1
+        rng = random.Random(f"{self.seed}:{count}:{prompt}")
+
+        speed = self.model_speed.get(model, 1.0)
+        latency = self.latency_ms / 1000.0 * rng.lognormvariate(0, self.latency_sigma) / speed if self.latency_ms else 0.0
+        if rng.random() < self.rate_limit_rate:
+            with self._lock:
+                self._counters["rate_limited"] += 1
+            return {"rate_limited": True, "latency": min(latency, 0.05), "retry_after": 1.0}
+
+        content = json.dumps(self._reply(prompt, rng), ensure_ascii=False)
+        if rng.random() < self.malformed_rate:
+            # Cut the document short, like a reply that hit the token limit
+            content = content[:rng.randint(len(content) // 3, len(content) - 2)]
+            with self._lock:
+                self._counters["malformed"] += 1
+        tokens, finish_reason = _estimate_tokens(content), "stop"
+        if max_tokens and tokens > max_tokens:
+            # Like a real model, stop mid-document once the max_tokens budget is spent
+            content, tokens, finish_reason = content[:max_tokens * 4], max_tokens, "length"
+        with self._lock:
+            self._counters["output_tokens"] += tokens
+        generation = tokens / (self.tokens_per_second * speed) if self.tokens_per_second else 0.0
+        return {"rate_limited": False, "content": content, "latency": latency, "generation": generation,
+                "finish_reason": finish_reason, "prompt_tokens": _estimate_tokens(prompt), "completion_tokens": tokens}
+
+    def _reply(self, prompt, rng):
+        topic_match = re.search(r"\babout (.+?)(?: for \w+ learners)?(?:\.|\n| \(|$)", prompt)
+        topic = topic_match.group(1).strip() if topic_match else "the topic"
+        if prompt.startswith("Complete a lesson plan"):
+            return self._lesson_plan_patch(prompt, topic, rng)
+        if prompt.startswith("Write one section"):
+            title = re.search(r"Section \d+ of \d+: (.+?) \([^()]*\)\. Lesson objectives", prompt)
+            return self._section(topic, rng, title.group(1) if title else None)
+        if prompt.startswith("Outline"):
+            duration = re.search(r"(?:Create an? |a )(\d+ ?\w+) lesson plan", prompt)
+            plan = self._lesson_plan(topic, duration.group(1) if duration else "60 minutes", rng)
+            plan["sections"] = [{"title": section["title"], "duration": section["duration"]}
+                                for section in plan["sections"]]
+            return plan
+        if "lesson plan" in prompt:
+            duration = re.search(r"(?:Create an? |a )(\d+ ?\w+) lesson plan", prompt)
+            return self._lesson_plan(topic, duration.group(1) if duration else "60 minutes", rng)
+        count = re.search(r"Generate (\d+)", prompt)
+        quiz = self._quiz(topic, int(count.group(1)) if count else 5, rng)
+        level = re.search(r"Every question must be (easy|medium|hard)", prompt)
+        for question in quiz["questions"] if level else []:
+            question["difficulty"] = level.group(1)  # Like a model that follows the requested level
+        return quiz
+
+    @staticmethod
+    def _question(topic, rng):
+        a, b = rng.sample(_FAKE_TERMS, 2)
+        options = [f"{term.capitalize()} are handled {how}" for term, how in zip(
+            rng.sample(_FAKE_TERMS, 4), ["implicitly", "explicitly", "lazily", "at import time"])]
+        return {
+            "question": rng.choice(_FAKE_TEMPLATES).format(topic=topic, a=a, b=b) + f" ({rng.randint(1, 10 ** 6)})",
+            "options": options,
+            "correct_answer": rng.choice(options),
+            "explanation": f"In {topic}, {a} and {b} follow the rule described by the correct option.",
+            "difficulty": rng.choice(["easy", "medium", "hard"]),
+        }
+
+    def _quiz(self, topic, count, rng):
+        return {"topic": topic, "questions": [self._question(topic, rng) for _ in range(count)]}
+
+    @staticmethod
+    def _section(topic, rng, title=None):
+        term = rng.choice(_FAKE_TERMS)
+        return {
+            "title": title or f"{term.capitalize()} in {topic}",
+            "content": f"Key ideas about {term} in {topic}, with worked examples.",
+            "duration": f"{rng.choice([5, 10, 15, 20])} minutes",
+            "activities": [f"Pair exercise on {term}", f"Short quiz on {rng.choice(_FAKE_TERMS)}"],
+        }
+
+    def _lesson_plan(self, topic, duration, rng):
+        return {
+            "topic": topic,
+            "duration": duration,
+            "objectives": [f"Explain {term} in {topic}" for term in rng.sample(_FAKE_TERMS, 3)],
+            "sections": [self._section(topic, rng) for _ in range(rng.randint(3, 5))],
+            "assessment": f"Ten-question quiz on {topic}",
+            "resources": [f"{topic} reference guide"],
+        }
+
+    def _lesson_plan_patch(self, prompt, topic, rng):
+        # Answer schema.lesson_plan_patch_prompt with exactly the requested fields
+        spec_match = re.search(r"these fields: (\{.*\})", prompt)
+        spec = json.loads(spec_match.group(1)) if spec_match else {}
+        full = self._lesson_plan(topic, "60 minutes", rng)
+        patch = {field: full[field] for field in spec if field in full and field != "sections"}
+        if "sections" in spec:
+            count = re.search(r"exactly (\d+) section", prompt)
+            titles = re.search(r"with these titles: (.+?)(?:\. The plan|\.$)", prompt)
+            names = titles.group(1).split(", ") if titles else []
+            patch["sections"] = [self._section(topic, rng, names[i] if i < len(names) else None)
+                                 for i in range(int(count.group(1)) if count else 1)]
+        return patch
+
+    # ------------------------------------------------------------------
+    # Groq-compatible client interface
+    # ------------------------------------------------------------------
+
+    def create(self, messages, model=None, temperature=None, response_format=None, stream=False, **kwargs):
+        """Same arguments and response shape as client.chat.completions.create"""
+        reply = self.plan(messages, kwargs.get("max_tokens"), model)
+        time.sleep(reply["latency"])
+        if reply["rate_limited"]:
+            raise FakeRateLimitError(reply["retry_after"])
+        if stream:
+            return self._stream(reply, model)
+        time.sleep(reply["generation"])
+        return SimpleNamespace(
+            id=f"fake-{uuid.uuid4().hex}",
+            model=model,
+            choices=[SimpleNamespace(index=0, finish_reason=reply["finish_reason"],
+                                     message=SimpleNamespace(role="assistant", content=reply["content"]))],
+            usage=SimpleNamespace(prompt_tokens=reply["prompt_tokens"], completion_tokens=reply["completion_tokens"],
+                                  total_tokens=reply["prompt_tokens"] + reply["completion_tokens"]),
+        )
+
+    @staticmethod
+    def _chunks(reply, size=16):
+        # About four tokens per chunk, with the pause that keeps output at tokens_per_second
+        content = reply["content"]
+        pause = reply["generation"] * size / max(1, len(content))
+        for start in range(0, len(content), size):
+            yield content[start:start + size], pause
+
+    def _stream(self, reply, model):
+        for text, pause in self._chunks(reply):
+            time.sleep(pause)
+            yield SimpleNamespace(model=model, choices=[SimpleNamespace(index=0, delta=SimpleNamespace(content=text))])
+        # Like Groq, the final chunk is empty and carries the token usage under x_groq
+        usage = SimpleNamespace(prompt_tokens=reply["prompt_tokens"], completion_tokens=reply["completion_tokens"],
+                                total_tokens=reply["prompt_tokens"] + reply["completion_tokens"])
+        yield SimpleNamespace(model=model, x_groq=SimpleNamespace(usage=usage),
+                              choices=[SimpleNamespace(index=0, finish_reason=reply["finish_reason"],
+                                                       delta=SimpleNamespace(content=None))])
+
+    def stats(self):
+        """Return request, 429, malformed-reply and output-token counters"""
+        with self._lock:
+            return dict(self._counters)
+
+
+def create_client(api_key=None, backend=None, resilient=True, routed=True, **kwargs):
+    """
+    Build the LLM client used by every entry point.
+    backend (or EDUCHAIN_BACKEND) is "groq" or "fake"; extra keyword arguments go to
+    FakeLLMClient. The Groq client honours GROQ_BASE_URL, so it can also be pointed
+    at a FakeLLMServer to test the real SDK and network path. Unless resilient=False
+    the client is wrapped in resilience.ResilientClient (deadlines, retries, breaker);
+    with routed=True (the default) that is one ResilientClient per model behind a
+    model_router.ModelRouter, which picks the model for requests made with model="auto".
+    The router is skipped when the fast and the strong model are the same; entry points
+    then ask for that model directly (model_router.DEFAULT_MODEL).
+    """
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend == "fake":
+        client = FakeLLMClient(**kwargs)
+    elif backend == "groq":
+        from groq import Groq  # Imported lazily so the fake backend works without the SDK
+        # The resilience layer owns retries, so the SDK's own retries are turned off under it
+        client = Groq(api_key=api_key or os.getenv("GROQ_API_KEY"), **({"max_retries": 0} if resilient else {}))
+    else:
+        raise ValueError(f"Unknown LLM backend '{backend}' (expected 'groq' or 'fake')")
+    if not resilient:
+        return client
+    if routed:
+        from model_router import ModelRouter, DEFAULT_FAST_MODEL, DEFAULT_STRONG_MODEL
+        if DEFAULT_FAST_MODEL != DEFAULT_STRONG_MODEL:
+            return ModelRouter(client)
+        print(f"Model routing disabled: EDUCHAIN_FAST_MODEL and EDUCHAIN_STRONG_MODEL are both {DEFAULT_FAST_MODEL}")
+    from resilience import ResilientClient
+    return ResilientClient(client)
+
+
+class FakeLLMServer:
+    """OpenAI/Groq-compatible HTTP endpoint (/openai/v1/chat/completions) backed by FakeLLMClient"""
+
+    def __init__(self, client=None):
+        self.client = client or FakeLLMClient()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", "0") or 0)
+                body = await reader.readexactly(length) if length else b""
+
+                if method != "POST" or not path.rstrip("/").endswith("/chat/completions"):
+                    await self._write(writer, 404, {"error": {"message": f"no route for {method} {path}"}})
+                    continue
+                try:
+                    request = json.loads(body)
+                except ValueError:
+                    await self._write(writer, 400, {"error": {"message": "invalid JSON"}})
+                    continue
+                if not await self._complete(writer, request):
+                    break  # Streamed responses close the connection
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _complete(self, writer, request):
+        # Returns False when the connection must be closed afterwards
+        reply = self.client.plan(request.get("messages") or [], request.get("max_tokens"), request.get("model"))
+        await asyncio.sleep(reply["latency"])
+        if reply["rate_limited"]:
+            await self._write(writer, 429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit_exceeded"}},
+                              extra_headers={"retry-after": str(reply["retry_after"])})
+            return True
+
+        model = request.get("model", "fake")
+        created = int(time.time())
+        completion_id = f"chatcmpl-fake-{uuid.uuid4().hex}"
+        if not request.get("stream"):
+            await asyncio.sleep(reply["generation"])
+            await self._write(writer, 200, {
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": reply["finish_reason"],
+                             "message": {"role": "assistant", "content": reply["content"]}}],
+                "usage": {"prompt_tokens": reply["prompt_tokens"], "completion_tokens": reply["completion_tokens"],
+                          "total_tokens": reply["prompt_tokens"] + reply["completion_tokens"]},
+            })
+            return True
+
+        # Server-sent events, one chunk per ~4 tokens
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nConnection: close\r\n\r\n")
+        for text, pause in FakeLLMClient._chunks(reply):
+            await asyncio.sleep(pause)
+            chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": text}, "finish_reason": None}]}
+            writer.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await writer.drain()
+        writer.write(b"data: [DONE]\n\n")
+        await writer.drain()
+        return False
+
+    @staticmethod
+    async def _write(writer, status, payload, extra_headers=None):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 429: "Too Many Requests"}
+        body = json.dumps(payload).encode("utf-8")
+        head = f"HTTP/1.1 {status} {reasons.get(status, '')}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+        for key, value in (extra_headers or {}).items():
+            head += f"{key}: {value}\r\n"
+        writer.write((head + "\r\n").encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host="127.0.0.1", port=8900, stop_event=None):
+        """Serve until stop_event is set (or forever)"""
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        print(f"🧪 Fake LLM server on http://{host}:{port} (set GROQ_BASE_URL to use it)")
+        async with server:
+            await (stop_event or asyncio.Event()).wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic fake Groq-compatible LLM server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=None, help="Median time to first token")
+    parser.add_argument("--latency-sigma", type=float, default=None, help="Log-normal spread of the latency")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Output pacing (0 = instant)")
+    parser.add_argument("--rate-limit-rate", type=float, default=None, help="Fraction of requests answered with 429")
+    parser.add_argument("--malformed-rate", type=float, default=None, help="Fraction of replies with truncated JSON")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    client = FakeLLMClient(latency_ms=args.latency_ms, latency_sigma=args.latency_sigma,
+                           tokens_per_second=args.tokens_per_second, rate_limit_rate=args.rate_limit_rate,
+                           malformed_rate=args.malformed_rate, seed=args.seed)
+    try:
+        asyncio.run(FakeLLMServer(client).serve(args.host, args.port))
+    except KeyboardInterrupt:
+        print("\nFake LLM server stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+# llm_cache.py — Two-tier response cache shared by every Groq completion call
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+from metrics import record_llm_call, record_usage, stream_usage
+from prompts import record_call
+from model_router import ROUTED_MODEL
+
+# Default location and limits, overridable through the .env file
+DEFAULT_DB_PATH = os.getenv("EDUCHAIN_CACHE_DB", "educhain_cache.sqlite3")
+DEFAULT_MAX_ENTRIES = int(os.getenv("EDUCHAIN_CACHE_SIZE", "512"))
+DEFAULT_TTL = float(os.getenv("EDUCHAIN_CACHE_TTL", "3600"))  # In-memory tier (seconds)
+DEFAULT_DISK_TTL = float(os.getenv("EDUCHAIN_CACHE_DISK_TTL", str(7 * 24 * 3600)))  # On-disk tier (seconds)
+
+
+class Completion(str):
+    """Completion text, plus the model that answered it (None for a routed request served from the cache)"""
+
+    model = None
+
+    def __new__(cls, text, model=None):
+        completion = super().__new__(cls, text)
+        completion.model = model
+        return completion
+
+
+def served_model(response, requested):
+    """The model named in an upstream reply or stream chunk, else the requested one unless it was routed"""
+    model = getattr(response, "model", None)
+    if isinstance(model, str) and model:
+        return model
+    return requested if requested != ROUTED_MODEL else None
+
+
+class ResponseCache:
+    """
+    In-process LRU (size + TTL eviction) backed by a persistent SQLite tier.
+    Values are the raw completion strings returned by the model.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL,
+                 db_path=DEFAULT_DB_PATH, disk_ttl=DEFAULT_DISK_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_ttl = disk_ttl
+        self.db_path = db_path
+
+        # Memory tier: key -> (expires_at, value), ordered from least to most recently used
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Hit/miss counters reported by stats()
+        self._counters = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+
+        # Disk tier is optional: pass db_path=None to keep the cache in memory only
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, temperature: float, response_format: Optional[Dict[str, Any]] = None) -> str:
+        """Build a stable cache key from the request parameters"""
+        # Collapse whitespace so re-indented prompt templates still hit the same entry
+        normalized_prompt = " ".join(prompt.split())
+        payload = json.dumps(
+            [model, normalized_prompt, round(float(temperature), 3), response_format or {}],
+            sort_keys=True, ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, checking memory first and then disk"""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)  # Mark as most recently used
+                    self._counters["memory_hits"] += 1
+                    return value
+                del self._memory[key]  # Expired
+
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, expires_at = row
+                    if expires_at > now:
+                        # Promote to the memory tier for subsequent lookups
+                        self._remember(key, value, now)
+                        self._counters["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self._counters["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str):
+        """Store value in both tiers"""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, value, now + self.disk_ttl)
+                )
+                self._db.commit()
+            self._counters["stores"] += 1
+
+    def _remember(self, key, value, now):
+        # Caller holds the lock; insert and evict least recently used entries over the limit
+        self._memory[key] = (now + self.ttl, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def record_bypass(self):
+        """Count a request that skipped the lookup on purpose"""
+        with self._lock:
+            self._counters["bypassed"] += 1
+
+    def clear(self):
+        """Drop every entry from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM responses")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and the current memory tier size"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache() -> ResponseCache:
+    """Return the process-wide cache, creating it on first use"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
+
+
+def cached_completion(client, prompt: str, model: str, temperature: float,
+                      response_format: Optional[Dict[str, Any]] = None,
+                      cache: Optional[ResponseCache] = None, bypass: bool = False) -> str:
+    """
+    Return the completion text for prompt, serving repeats from the cache.
+    Set bypass=True to force a fresh variant; the new result still refreshes the cache.
+    The text is a Completion whose .model is the model that answered, so metrics and the
+    question bank record that instead of "auto".
+    """
+    cache = cache or get_default_cache()
+    key = cache.make_key(model, prompt, temperature, response_format)
+
+    if bypass:
+        cache.record_bypass()
+    else:
+        cached = cache.get(key)
+        if cached is not None:
+            return Completion(cached, served_model(None, model))
+
+    # Cache miss (or bypass): make the real upstream call
+    request = {
+        "messages": [{"role": "user", "content": prompt}],
+        "model": model,
+        "temperature": temperature,
+    }
+    if response_format:
+        request["response_format"] = response_format
+    if getattr(prompt, "max_tokens", None):
+        request["max_tokens"] = prompt.max_tokens  # Registry prompts carry a budget sized to the request
+    started = time.perf_counter()
+    try:
+        response = client.chat.completions.create(**request)
+        seconds = time.perf_counter() - started
+        served = served_model(response, model)
+        record_llm_call(served or model, seconds)
+        record_usage(served or model, getattr(response, "usage", None))
+        record_call(prompt, seconds, getattr(response, "usage", None),
+                    truncated=getattr(response.choices[0], "finish_reason", None) == "length")
+    except Exception:
+        # A fresh variant was asked for, but a cached answer beats none while upstream is failing
+        cached = cache.get(key) if bypass else None
+        if cached is None:
+            raise
+        return Completion(cached, served_model(None, model))
+    content = Completion(response.choices[0].message.content, served)
+
+    # Only keep responses that will parse, so a malformed reply is not served again
+    if response_format and response_format.get("type") == "json_object":
+        try:
+            json.loads(content)
+        except (TypeError, ValueError):
+            return content
+    cache.set(key, content)
+    return content
+
+
+def cached_completion_stream(client, prompt: str, model: str, temperature: float,
+                             cache: Optional[ResponseCache] = None, bypass: bool = False):
+    """
+    Streaming counterpart of cached_completion: yields the completion text in chunks.
+    A cache hit is yielded as a single chunk. JSON mode is not requested while
+    streaming, so the JSON object is cut out of the finished text before it is
+    stored under the same key as a json_object request. Chunks are Completions
+    carrying the model that answered, like cached_completion's result.
+    """
+    cache = cache or get_default_cache()
+    response_format = {"type": "json_object"}
+    key = cache.make_key(model, prompt, temperature, response_format)
+
+    if bypass:
+        cache.record_bypass()
+    else:
+        cached = cache.get(key)
+        if cached is not None:
+            yield Completion(cached, served_model(None, model))
+            return
+
+    request = {
+        "messages": [{"role": "user", "content": prompt}],
+        "model": model,
+        "temperature": temperature,
+        "stream": True,
+    }
+    if getattr(prompt, "max_tokens", None):
+        request["max_tokens"] = prompt.max_tokens
+    started = time.perf_counter()
+    try:
+        stream = client.chat.completions.create(**request)
+    except Exception:
+        # Same fallback as cached_completion: serve the cached answer if upstream is failing
+        cached = cache.get(key) if bypass else None
+        if cached is None:
+            raise
+        yield Completion(cached, served_model(None, model))
+        return
+    parts, ttft, usage, finish_reason = [], None, None, None
+    served = served_model(None, model)
+    for chunk in stream:
+        served = served_model(chunk, served)
+        usage = stream_usage(chunk) or usage  # Only the last chunk carries usage
+        if chunk.choices:
+            finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+        delta = chunk.choices[0].delta.content if chunk.choices else None
+        if delta:
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(delta)
+            yield Completion(delta, served)
+    seconds = time.perf_counter() - started
+    record_llm_call(served or model, seconds, ttft=ttft, stream=True)
+    record_usage(served or model, usage)
+    record_call(prompt, seconds, usage, truncated=finish_reason == "length")
+
+    # Keep the result for non-streaming callers if it holds a valid JSON object
+    content = "".join(parts)
+    start, end = content.find("{"), content.rfind("}")
+    if start != -1 and end > start:
+        try:
+            json.loads(content[start:end + 1])
+        except ValueError:
+            return
+        cache.set(key, content[start:end + 1])
@@ -1,6 +1,90 @@
-# mcp.py — Mock implementation for McpServer, Tool, and Resource
+# mcp.py — Lightweight McpServer, Tool and Resource implementation with an asyncio HTTP/JSON-RPC transport
+
+import json
+import time
+import signal
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps  # Imported for decorators, but not used in this file
+
+from metrics import metrics, handler_scope, handle_request as handle_metrics_request
+
+# JSON-RPC 2.0 error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+REQUEST_TIMEOUT = -32000
+SHUTTING_DOWN = -32001
+SERVER_BUSY = -32002
+
+# Python types accepted for each parameter "type" in a tool/resource spec
+_PARAM_TYPES = {
+    "string": (str,),
+    "integer": (int,),
+    "number": (int, float),
+    "boolean": (bool,),
+    "array": (list,),
+    "object": (dict,),
+}
+
+# Upper bound on a request body, to keep one client from exhausting memory
+MAX_BODY_BYTES = 1024 * 1024
+
+
+class ParameterError(ValueError):
+    """Raised when call arguments do not match a registered parameter spec"""
+
+
+class RpcError(Exception):
+    """Error that is returned to the client as a JSON-RPC error object"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def validate_params(spec, arguments):
+    """
+    Check arguments against a parameter spec (type, min, max, enum, default).
+    Returns a new dict with defaults filled in; raises ParameterError on the first problem.
+    """
+    if not isinstance(arguments, dict):
+        raise ParameterError("arguments must be an object")
+
+    unknown = set(arguments) - set(spec)
+    if unknown:
+        raise ParameterError(f"unknown parameter(s): {', '.join(sorted(unknown))}")
+
+    validated = {}
+    for name, rules in spec.items():
+        if name not in arguments:
+            if "default" in rules:
+                validated[name] = rules["default"]
+                continue
+            raise ParameterError(f"missing required parameter '{name}'")
+
+        value = arguments[name]
+        if value is None and "default" in rules and rules["default"] is None:
+            # An explicit null for an optional parameter means "not given"
+            validated[name] = None
+            continue
+        expected = _PARAM_TYPES.get(rules.get("type"))
+        if expected is not None:
+            # bool is a subclass of int, so reject it explicitly for numeric parameters
+            if not isinstance(value, expected) or (isinstance(value, bool) and bool not in expected):
+                raise ParameterError(f"parameter '{name}' must be of type {rules['type']}")
+        if "enum" in rules and value not in rules["enum"]:
+            raise ParameterError(f"parameter '{name}' must be one of {rules['enum']}")
+        if "min" in rules and value < rules["min"]:
+            raise ParameterError(f"parameter '{name}' must be >= {rules['min']}")
+        if "max" in rules and value > rules["max"]:
+            raise ParameterError(f"parameter '{name}' must be <= {rules['max']}")
+        validated[name] = value
+    return validated
 
-from functools import wraps  # Imported for decorators, but not used in this mock file
 
 class McpServer:
     def __init__(self, name="", version="", description=""):
@@ -13,6 +97,16 @@ class McpServer:
         self.tools = {}
         self.resources = {}
 
+        # Transport state, set up by serve()
+        self._executor = None
+        self._max_workers = 0
+        self._request_timeout = None
+        self._stuck = 0  # Timed-out calls whose worker thread is still running (threads cannot be killed)
+        self._idle_connections = set()  # Writers of keep-alive connections waiting for their next request
+        self._in_flight = 0
+        self._idle = None  # asyncio.Event set whenever no request is in flight
+        self._draining = False
+
     def tool(self, name="", description="", parameters=None):
         """
         Decorator to register a tool function.
@@ -43,11 +137,229 @@ class McpServer:
             return func  # Return the original function
         return decorator
 
-    def run(self, host="0.0.0.0", port=5000):
+    # ------------------------------------------------------------------
+    # JSON-RPC dispatch
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _describe(registry):
+        # Public listing of a registry (everything except the function itself)
+        return [
+            {"name": name, "description": entry["description"], "parameters": entry["parameters"]}
+            for name, entry in registry.items()
+        ]
+
+    async def _invoke(self, registry, kind, params):
+        # Validate and run one tool/resource call on the bounded executor
+        if not isinstance(params, dict) or not isinstance(params.get("name"), str):
+            raise RpcError(INVALID_PARAMS, "params must include a 'name' string")
+        entry = registry.get(params["name"])
+        if entry is None:
+            raise RpcError(METHOD_NOT_FOUND, f"unknown {kind} '{params['name']}'")
+        try:
+            arguments = validate_params(entry["parameters"], params.get("arguments", {}))
+        except ParameterError as e:
+            raise RpcError(INVALID_PARAMS, str(e))
+
+        if self._stuck >= self._max_workers:
+            # Every worker is still busy with a call that already timed out; queueing would only time out too
+            raise RpcError(SERVER_BUSY, f"all {self._max_workers} workers are busy with timed-out calls; retry later")
+
+        loop = asyncio.get_running_loop()
+        submitted = time.perf_counter()
+
+        def run():
+            # Time spent waiting for a free worker, then the call itself under the tool's name
+            with handler_scope(f"mcp.{params['name']}"):
+                metrics.observe("educhain_span_seconds", time.perf_counter() - submitted,
+                                span="queue", handler=f"mcp.{params['name']}", model="")
+                return entry["function"](**arguments)
+
+        future = loop.run_in_executor(self._executor, run)
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self._request_timeout)
+        except asyncio.TimeoutError:
+            # The client gets its error now, but the thread keeps its worker slot until the call returns
+            if not future.done():
+                self._stuck += 1
+                future.add_done_callback(self._release_stuck)
+            raise RpcError(REQUEST_TIMEOUT, f"{kind} '{params['name']}' timed out after {self._request_timeout}s")
+
+    def _release_stuck(self, future):
+        self._stuck -= 1
+        if not future.cancelled() and future.exception() is not None:
+            print(f"Timed-out call failed later: {future.exception()}")
+
+    async def dispatch(self, method, params=None):
+        """Run a single JSON-RPC method and return its result (raises RpcError)"""
+        if method == "tools/list":
+            return self._describe(self.tools)
+        if method == "resources/list":
+            return self._describe(self.resources)
+        if method == "tools/call":
+            return await self._invoke(self.tools, "tool", params)
+        if method == "resources/read":
+            return await self._invoke(self.resources, "resource", params)
+        raise RpcError(METHOD_NOT_FOUND, f"unknown method '{method}'")
+
+    async def handle_message(self, message):
+        """Handle one decoded JSON-RPC request (or batch); returns the response or None"""
+        if isinstance(message, list):
+            if not message:
+                return self._error(None, INVALID_REQUEST, "empty batch")
+            responses = await asyncio.gather(*(self.handle_message(item) for item in message))
+            return [response for response in responses if response is not None] or None
+
+        if not isinstance(message, dict) or message.get("jsonrpc") != "2.0" or not isinstance(message.get("method"), str):
+            return self._error(None, INVALID_REQUEST, "invalid JSON-RPC 2.0 request")
+
+        request_id = message.get("id")
+        try:
+            result = await self.dispatch(message["method"], message.get("params"))
+            response = {"jsonrpc": "2.0", "id": request_id, "result": result}
+        except RpcError as e:
+            response = self._error(request_id, e.code, e.message)
+        except Exception as e:
+            response = self._error(request_id, INTERNAL_ERROR, str(e))
+
+        # Requests without an id are notifications and get no response
+        return response if "id" in message else None
+
+    @staticmethod
+    def _error(request_id, code, message):
+        return {"jsonrpc": "2.0", "id": request_id, "error": {"code": code, "message": message}}
+
+    # ------------------------------------------------------------------
+    # HTTP transport
+    # ------------------------------------------------------------------
+
+    async def _handle_connection(self, reader, writer):
+        # Serve HTTP/1.1 requests on one keep-alive connection until the client closes it
+        try:
+            while not self._draining:
+                # Idle connections are closed by serve() when it starts draining
+                self._idle_connections.add(writer)
+                try:
+                    request_line = await reader.readline()
+                finally:
+                    self._idle_connections.discard(writer)
+                if not request_line or self._draining:
+                    break
+                try:
+                    method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                except ValueError:
+                    await self._write_response(writer, 400, {"error": "bad request line"}, keep_alive=False)
+                    break
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    key, _, value = line.decode("latin-1").partition(":")
+                    headers[key.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", "0") or 0)
+                    if length < 0:
+                        raise ValueError(length)
+                except ValueError:
+                    await self._write_response(writer, 400, {"error": "invalid Content-Length"}, keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._write_response(writer, 413, {"error": "request body too large"}, keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get("connection", "").lower() != "close"
+
+                peer = writer.get_extra_info("peername")
+                status, payload = await self._route(method, path, body, headers, peer[0] if peer else None)
+                await self._write_response(writer, status, payload, keep_alive=keep_alive and not self._draining)
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass  # Client went away mid-request
+        finally:
+            writer.close()
+
+    async def _route(self, method, path, body, headers=None, client_host=None):
+        # Map an HTTP request onto the JSON-RPC dispatcher; returns (status, payload)
+        if method == "GET" and path == "/health":
+            return 200, {"status": "draining" if self._draining else "ok", "in_flight": self._in_flight,
+                         "stuck": self._stuck}
+        observability = handle_metrics_request(method, path, headers, client_host)  # /metrics and /profile (plain text)
+        if observability is not None:
+            return observability
+        if path not in ("/", "/rpc"):
+            return 404, {"error": f"no route for {path}"}
+        if method != "POST":
+            return 405, {"error": "use POST for JSON-RPC requests"}
+        if self._draining:
+            return 503, self._error(None, SHUTTING_DOWN, "server is shutting down")
+
+        try:
+            message = json.loads(body)
+        except (ValueError, UnicodeDecodeError):
+            return 200, self._error(None, PARSE_ERROR, "invalid JSON")
+
+        # Track in-flight requests so shutdown can wait for them
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            response = await self.handle_message(message)
+        finally:
+            self._in_flight -= 1
+            if self._in_flight == 0:
+                self._idle.set()
+        return (200, response) if response is not None else (204, None)
+
+    @staticmethod
+    async def _write_response(writer, status, payload, keep_alive=True):
+        reasons = {200: "OK", 204: "No Content", 400: "Bad Request", 403: "Forbidden", 404: "Not Found",
+                   405: "Method Not Allowed", 413: "Payload Too Large", 503: "Service Unavailable"}
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            body = b"" if payload is None else json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+            content_type = "application/json"
+        head = (
+            f"HTTP/1.1 {status} {reasons.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+        )
+        writer.write(head.encode("latin-1") + body)
+        await writer.drain()
+
+    async def serve(self, host="0.0.0.0", port=5000, max_workers=8, request_timeout=60.0,
+                    drain_timeout=30.0, stop_event=None):
         """
-        Mock server run method — prints the registered tools and resources.
-        Emulates server startup (does not serve actual HTTP requests).
+        Serve JSON-RPC over HTTP until stop_event is set (or SIGINT/SIGTERM arrives).
+        Blocking tool functions run on a pool of max_workers threads. A call that exceeds
+        request_timeout is answered with an error, but its thread cannot be stopped and
+        holds a worker until it returns; once every worker is held that way, new calls are
+        refused with SERVER_BUSY instead of queueing. On shutdown the server stops accepting
+        requests, closes idle keep-alive connections and waits up to drain_timeout for
+        in-flight ones.
         """
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="mcp-worker")
+        self._max_workers = max_workers
+        self._stuck = 0
+        self._request_timeout = request_timeout
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._draining = False
+        stop_event = stop_event or asyncio.Event()
+
+        # Translate termination signals into a graceful drain (not available on every platform)
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_event.set)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass
+
+        server = await asyncio.start_server(self._handle_connection, host, port)
         print(f"📡 MCP Server '{self.name}' running on {host}:{port}")
         print("🔧 Tools:")
         for name in self.tools:
@@ -55,7 +367,33 @@ class McpServer:
         print("📚 Resources:")
         for name in self.resources:
             print(f" - {name}")  # List registered resources
-        print("✅ Server Ready (Mock Mode)")  # Final status message
+        print(f"✅ Server Ready (JSON-RPC over HTTP, {max_workers} workers)")
+
+        try:
+            await stop_event.wait()
+        finally:
+            # Graceful drain: refuse new work, let in-flight requests finish, then stop
+            print("⏳ Draining in-flight requests...")
+            self._draining = True
+            server.close()
+            for writer in list(self._idle_connections):
+                writer.close()  # Keep-alive connections between requests would otherwise stay open
+            try:
+                await asyncio.wait_for(self._idle.wait(), drain_timeout)
+            except asyncio.TimeoutError:
+                print(f"⚠️ {self._in_flight} request(s) still running after {drain_timeout}s")
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                try:
+                    loop.remove_signal_handler(sig)
+                except (NotImplementedError, RuntimeError, ValueError):
+                    pass
+            print("🛑 Server stopped")
+
+    def run(self, host="0.0.0.0", port=5000, max_workers=8, request_timeout=60.0, drain_timeout=30.0):
+        """Start the HTTP/JSON-RPC server and block until it is shut down"""
+        asyncio.run(self.serve(host=host, port=port, max_workers=max_workers,
+                               request_timeout=request_timeout, drain_timeout=drain_timeout))
 
 # These aliases are provided to prevent import errors from 'from mcp import Tool, Resource'
 Tool = object
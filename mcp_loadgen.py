@@ -0,0 +1,139 @@
+# mcp_loadgen.py — Local load generator for the MCP JSON-RPC server
+#
+# Examples:
+#   python mcp_loadgen.py --port 6000 --tool generate_mcqs --args '{"topic": "Python"}'
+#   python mcp_loadgen.py --local --work-ms 50 --concurrency 64 --requests 5000
+
+import json
+import time
+import asyncio
+import argparse
+import threading
+
+from mcp import McpServer
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def _worker(host, port, payloads, latencies, errors):
+    # One keep-alive connection sending requests back to back
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while payloads:
+            body = payloads.pop()
+            request = (
+                f"POST /rpc HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n"
+                f"Content-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1") + body
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+
+            # Read the status line, headers and body of the response
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                key, _, value = line.decode("latin-1").partition(":")
+                if key.strip().lower() == "content-length":
+                    length = int(value.strip())
+            response = await reader.readexactly(length) if length else b""
+            latencies.append(time.perf_counter() - started)
+
+            if b" 200 " not in status_line or b'"error"' in response:
+                errors.append(response[:200])
+    finally:
+        writer.close()
+
+
+async def run_load(host, port, method, params, total_requests, concurrency):
+    """Send total_requests JSON-RPC calls over `concurrency` connections; returns a stats dict"""
+    payloads = [
+        json.dumps({"jsonrpc": "2.0", "id": i, "method": method, "params": params}).encode("utf-8")
+        for i in range(total_requests)
+    ]
+    latencies, errors = [], []
+    started = time.perf_counter()
+    await asyncio.gather(*(_worker(host, port, payloads, latencies, errors) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "requests_per_sec": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "first_error": errors[0].decode("utf-8", "replace") if errors else None,
+    }
+
+
+def _start_local_server(port, work_ms, workers):
+    # In-process server with a single tool that simulates `work_ms` of blocking work
+    server = McpServer(name="Load Test Server", version="1.0")
+
+    @server.tool(name="sleep", parameters={"ms": {"type": "integer", "default": work_ms, "min": 0}})
+    def sleep_tool(ms):
+        time.sleep(ms / 1000)
+        return {"slept_ms": ms}
+
+    loop = asyncio.new_event_loop()
+    stop_event = asyncio.Event()
+    thread = threading.Thread(
+        target=loop.run_until_complete,
+        args=(server.serve(host="127.0.0.1", port=port, max_workers=workers, stop_event=stop_event),),
+        daemon=True,
+    )
+    thread.start()
+    time.sleep(0.5)  # Give the listener time to bind
+    return loop, stop_event, thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load generator for the MCP JSON-RPC server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6000)
+    parser.add_argument("--requests", type=int, default=1000, help="Total number of requests")
+    parser.add_argument("--concurrency", type=int, default=16, help="Number of parallel connections")
+    parser.add_argument("--method", default="tools/call", help="JSON-RPC method to call")
+    parser.add_argument("--tool", default="generate_mcqs", help="Tool/resource name for call/read methods")
+    parser.add_argument("--args", default="{}", help="JSON object of tool arguments")
+    parser.add_argument("--local", action="store_true", help="Start an in-process server with a 'sleep' tool")
+    parser.add_argument("--work-ms", type=int, default=20, help="Simulated work per call in --local mode")
+    parser.add_argument("--workers", type=int, default=8, help="Executor size in --local mode")
+    args = parser.parse_args()
+
+    local = None
+    if args.local:
+        local = _start_local_server(args.port, args.work_ms, args.workers)
+        args.tool = "sleep"
+
+    params = {"name": args.tool, "arguments": json.loads(args.args)}
+    if args.method in ("tools/list", "resources/list"):
+        params = None
+    stats = asyncio.run(run_load(args.host, args.port, args.method, params, args.requests, args.concurrency))
+
+    print(f"Requests:     {stats['requests']} ({stats['errors']} errors) in {stats['seconds']:.2f}s")
+    print(f"Throughput:   {stats['requests_per_sec']:.1f} req/s")
+    print(f"Latency p50:  {stats['p50_ms']:.1f} ms")
+    print(f"Latency p99:  {stats['p99_ms']:.1f} ms")
+    if stats["first_error"]:
+        print(f"First error:  {stats['first_error']}")
+
+    if local is not None:
+        loop, stop_event, thread = local
+        loop.call_soon_threadsafe(stop_event.set)
+        thread.join(timeout=5)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,55 @@
 # Import necessary libraries
 import os
 import json
-from mcp import McpServer, Tool, Resource  # Custom module with server and decorators
-from groq import Groq  # Groq API client
 from dotenv import load_dotenv  # For loading environment variables
-from typing import Dict, Any  # For type hinting
 
-# Load environment variables from .env file
+# Load environment variables from .env file before the project imports read their EDUCHAIN_* defaults
 load_dotenv()
 
+from mcp import McpServer, Tool, Resource  # Custom module with server and decorators
+from llm_backend import create_client  # Groq API client (or the offline fake backend)
+from llm_cache import cached_completion, get_default_cache  # Shared response cache
+from sharding import DEFAULT_SHARD_SIZE, generate_sharded, iter_sharded_questions, shard_guidance  # Large quizzes
+from near_dup import get_default_index, remove_near_duplicates  # Near-duplicate question detection
+from question_bank import get_default_bank, serve_from_bank, fallback_quiz  # Persistent question bank
+from schema import extract_json, repair_mcqs, complete_lesson_plan  # Validation and partial repair
+from lesson_plans import DEFAULT_OUTLINE_FIRST, regenerate_section  # Outline-first lesson plans
+from lesson_plans import generate_lesson_plan as outlined_lesson_plan
+from semantic_topics import get_default_topic_index, lesson_plan_scope, semantic_topic  # Similar-topic cache hits
+from prompts import mcq_prompt, lesson_plan_prompt, ab_report  # Prompt template registry
+from model_router import DEFAULT_MODEL  # Latency-adaptive model routing
+from metrics import metrics, span  # Hot-path timings, token counts and the /metrics endpoint
+from typing import Dict, Any  # For type hinting
+
 class EduChainMcpServer:
-    def __init__(self):
-        # Initialize Groq client with API key from environment
-        self.client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+    def __init__(self, backend: str = None):
+        # Initialize the LLM client with API key from environment (backend/EDUCHAIN_BACKEND=fake runs offline)
+        self.client = create_client(backend=backend)
         
-        # Set the model to be used with Groq API
-        self.model = "llama3-70b-8192"
+        # "auto" lets the model router pick the fast or the strong model per request (EDUCHAIN_MODEL pins one);
+        # questions are banked under the model that actually answered
+        self.model = DEFAULT_MODEL
+
+        # Shared response cache so repeated requests skip the LLM round trip
+        self.cache = get_default_cache()
+
+        # Near-duplicate index over every generated question, so repeated topics get new questions
+        self.dedup_index = get_default_index()
+
+        # Persistent bank of every generated question, used by from_bank=true
+        self.bank = get_default_bank()
         
+        # Differently worded topics ("Intro to Python", "Python basics") map onto one already generated
+        self.topic_index = get_default_topic_index()
+
+        # Cache, bank and upstream counters are exported on /metrics next to the request timings
+        metrics.register_stats("cache", self.cache.stats)
+        metrics.register_stats("bank", self.bank.stats)
+        metrics.register_stats("semantic_topics", self.topic_index.stats)
+        metrics.register_stats("prompts", ab_report)  # Per-template input tokens, latency and A/B savings
+        if hasattr(self.client, "stats"):
+            metrics.register_stats("upstream", self.client.stats)
+
         # Initialize the MCP server with metadata
         self.server = McpServer(
             name="EduChain Server",
@@ -28,27 +61,39 @@ class EduChainMcpServer:
         self._register_tools()
         self._register_resources()
 
-    def _call_groq_api(self, prompt: str) -> Dict[str, Any]:
+    def _call_groq_api(self, prompt: str, fresh: bool = False) -> Dict[str, Any]:
         """
         Calls the Groq API with the provided prompt and returns parsed JSON.
+        Repeated prompts are served from the cache unless fresh=True.
         Handles JSON decoding errors and other exceptions gracefully.
         """
+        return self._call_served(prompt, fresh=fresh)[0]
+
+    def _call_served(self, prompt: str, fresh: bool = False):
+        """Like _call_groq_api, but returns (result, model that answered or None)"""
         try:
-            # Make a chat completion request to Groq API
-            response = self.client.chat.completions.create(
-                messages=[{"role": "user", "content": prompt}],
+            # Make a (cached) chat completion request to Groq API
+            content = cached_completion(
+                self.client,
+                prompt,
                 model=self.model,
                 temperature=0.7,
-                response_format={"type": "json_object"}  # Expecting JSON-formatted response
+                response_format={"type": "json_object"},  # Expecting JSON-formatted response
+                cache=self.cache,
+                bypass=fresh
             )
             # Parse and return JSON content from the response
-            return json.loads(response.choices[0].message.content)
+            with span("parse"):
+                return json.loads(content), content.model
         except json.JSONDecodeError:
-            # Handle invalid JSON responses
-            return {"error": "Invalid JSON response from API", "status": 500}
+            # Salvage a JSON object wrapped in prose before reporting an invalid response
+            salvaged = extract_json(content)
+            if isinstance(salvaged, dict):
+                return salvaged, content.model
+            return {"error": "Invalid JSON response from API", "status": 500}, None
         except Exception as e:
             # Handle any other exception
-            return {"error": str(e), "status": 500}
+            return {"error": str(e), "status": 500}, None
 
     def _register_tools(self):
         """Defines and registers tools that users can invoke on the server"""
@@ -60,37 +105,163 @@ class EduChainMcpServer:
                 "topic": {"type": "string", "description": "Topic for questions"},
                 "num_questions": {
                     "type": "integer", 
-                    "description": "Number of questions (1-10)",
+                    "description": "Number of questions (1-100)",
                     "default": 5,
                     "min": 1,
-                    "max": 10
+                    "max": 100
+                },
+                "fresh": {
+                    "type": "boolean",
+                    "description": "Skip the response cache and generate a new variant",
+                    "default": False
+                },
+                "from_bank": {
+                    "type": "boolean",
+                    "description": "Build the quiz from stored questions, generating only the shortfall",
+                    "default": False
+                },
+                "difficulty": {
+                    "type": "string",
+                    "description": "Only serve stored questions of this difficulty (with from_bank)",
+                    "enum": ["easy", "medium", "hard"],
+                    "default": None
                 }
             }
         )
-        def generate_mcqs(topic: str, num_questions: int = 5) -> Dict[str, Any]:
-            # Compose prompt to generate MCQs based on the topic and number of questions
-            prompt = f"""Generate {num_questions} high-quality multiple-choice questions about {topic}.
-            Requirements:
-            - Questions should test different cognitive levels
-            - Include 4 options per question
-            - Mark the correct answer
-            - Provide explanations
-            
-            Return JSON with this structure:
-            {{
-                "topic": "string",
-                "questions": [
-                    {{
-                        "question": "string",
-                        "options": ["A", "B", "C", "D"],
-                        "correct_answer": "string",
-                        "explanation": "string",
-                        "difficulty": "easy|medium|hard"
-                    }}
-                ]
-            }}"""
-            # Send prompt to Groq API and return response
-            return self._call_groq_api(prompt)
+        def generate_mcqs(topic: str, num_questions: int = 5, fresh: bool = False, from_bank: bool = False,
+                          difficulty: str = None) -> Dict[str, Any]:
+            topic = semantic_topic(self.topic_index, topic, "mcq:bank" if from_bank else f"mcq:{num_questions}", fresh)
+            if from_bank:
+                try:
+                    return serve_from_bank(self.bank, topic, num_questions, self._mcq_shard_generator(topic, fresh),
+                                           difficulty=difficulty)
+                except Exception as e:
+                    return {"error": str(e), "status": 500}
+            mcqs = self._generate_mcqs(topic, num_questions, fresh=fresh)
+            if "error" in mcqs:
+                # Upstream failed (or its circuit breaker is open): serve stored questions if there are any
+                return fallback_quiz(self.bank, topic, num_questions, difficulty=difficulty) or mcqs
+            return mcqs
+
+        @self.server.tool(
+            name="regenerate_lesson_section",
+            description="Regenerate one section of a lesson plan, keeping the other sections as they are",
+            parameters={
+                "plan": {"type": "object", "description": "Lesson plan as returned by the lesson_plans resource"},
+                "section": {
+                    "type": "integer",
+                    "description": "Section to regenerate, numbered from 1",
+                    "default": 1,
+                    "min": 1
+                },
+                "guidance": {
+                    "type": "string",
+                    "description": "Optional instructions for the new version (e.g. 'more hands-on')",
+                    "default": None
+                },
+                "level": {
+                    "type": "string",
+                    "description": "Target audience level",
+                    "enum": ["beginner", "intermediate", "advanced"],
+                    "default": "beginner"
+                }
+            }
+        )
+        def regenerate_lesson_section(plan: Dict[str, Any], section: int = 1, guidance: str = None,
+                                      level: str = "beginner") -> Dict[str, Any]:
+            # Repair the plan that came back from the client before rewriting one of its sections
+            plan = complete_lesson_plan(plan, plan.get("topic"), request_json=None, max_rounds=0)
+            try:
+                return regenerate_section(plan, section - 1, lambda prompt: self._request_json(prompt, fresh=True),
+                                          level=level, guidance=guidance)
+            except IndexError as e:
+                return {"error": str(e), "status": 400}
+            except Exception as e:
+                return {"error": str(e), "status": 500}
+
+        @self.server.tool(
+            name="routing_decisions",
+            description="Admin view of model routing: per-model latency, error rate and throughput, and recent decisions",
+            parameters={
+                "limit": {
+                    "type": "integer",
+                    "description": "Number of recent routing decisions to return",
+                    "default": 20,
+                    "min": 0
+                }
+            }
+        )
+        def routing_decisions(limit: int = 20) -> Dict[str, Any]:
+            if not hasattr(self.client, "decisions"):
+                return {"error": "Model routing is off (the client was created with routed=False)", "status": 404}
+            stats = self.client.stats()
+            return {"models": stats["models"], "routing": stats["routing"], "decisions": self.client.decisions(limit)}
+
+    def _generate_mcqs(self, topic: str, num_questions: int, fresh: bool = False) -> Dict[str, Any]:
+        """Generates a quiz with the LLM, replacing near-duplicates of earlier questions, and banks it"""
+        # Large quizzes are split into shards that are generated concurrently and merged
+        if num_questions > DEFAULT_SHARD_SIZE:
+            return self._generate_mcqs_sharded(topic, num_questions, fresh=fresh)
+        # Send prompt to Groq API, repair the reply locally and drop near-duplicates of earlier quizzes
+        prompt = self._mcq_prompt(topic, num_questions)
+        result, served = self._call_served(prompt, fresh=fresh)
+        if "error" in result:
+            return result
+        mcqs, _ = repair_mcqs(result, topic)
+        mcqs, duplicates = self._remove_duplicates(mcqs, prompt, fresh)
+        # Keep every generated question, with its source so the dedup index can be rebuilt after a restart
+        self.bank.add_quiz(mcqs, model=served, topic=topic, source=self._dedup_source(prompt))
+        shortfall = num_questions - len(mcqs["questions"])
+        if shortfall > 0:
+            # Regenerate only the missing questions, telling the model which ones to avoid
+            avoid = [q["question"] for q in mcqs["questions"] + duplicates
+                     if isinstance(q, dict) and isinstance(q.get("question"), str)]
+            mcqs["questions"] += list(iter_sharded_questions(self._mcq_shard_generator(topic, fresh),
+                                                             shortfall, avoid=avoid))
+        if not mcqs["questions"]:
+            return {"error": "No valid questions in API response", "status": 500}
+        return mcqs
+
+    def _mcq_prompt(self, topic: str, num_questions: int, guidance: str = None) -> str:
+        """Builds the MCQ prompt; shards pass extra guidance to make their questions distinct"""
+        return mcq_prompt(topic, num_questions, guidance)
+
+    def _generate_mcqs_sharded(self, topic: str, num_questions: int, fresh: bool = False) -> Dict[str, Any]:
+        """
+        Generates a large quiz as concurrent shards and merges them into one document.
+        Duplicate questions are dropped and failed shards are topped up.
+        """
+        try:
+            return generate_sharded(self._mcq_shard_generator(topic, fresh), topic, num_questions)
+        except Exception as e:
+            return {"error": str(e), "status": 500}
+
+    def _mcq_shard_generator(self, topic: str, fresh: bool = False):
+        """
+        Returns the shard callback for sharding.py; invalid and near-duplicate questions are dropped so they get topped up.
+        Each shard banks its own questions, since only it knows which model answered.
+        """
+        def generate_shard(shard, avoid):
+            prompt = self._mcq_prompt(topic, shard["count"], shard_guidance(shard, avoid))
+            result, served = self._call_served(prompt, fresh=fresh)
+            if "error" in result:
+                raise RuntimeError(result["error"])
+            mcqs, _ = repair_mcqs(result, topic)
+            mcqs = self._remove_duplicates(mcqs, prompt, fresh)[0]
+            self.bank.add_quiz(mcqs, model=served, topic=topic, source=self._dedup_source(prompt))
+            return mcqs
+        return generate_shard
+
+    def _remove_duplicates(self, mcqs: Dict[str, Any], prompt: str, fresh: bool = False):
+        """
+        Drops questions that near-duplicate ones from earlier quizzes.
+        Questions are tagged with the prompt's cache key, so a cached quiz is not rejected against itself.
+        """
+        return remove_near_duplicates(mcqs, self.dedup_index, self._dedup_source(prompt), fresh=fresh)
+
+    def _dedup_source(self, prompt: str) -> str:
+        """Near-duplicate source of a prompt's questions: its response cache key"""
+        return self.cache.make_key(self.model, prompt, 0.7, {"type": "json_object"})
 
     def _register_resources(self):
         """Defines and registers reusable content generation resources"""
@@ -110,40 +281,52 @@ class EduChainMcpServer:
                     "description": "Target audience level",
                     "enum": ["beginner", "intermediate", "advanced"],
                     "default": "beginner"
+                },
+                "fresh": {
+                    "type": "boolean",
+                    "description": "Skip the response cache and generate a new variant",
+                    "default": False
+                },
+                "outline_first": {
+                    "type": "boolean",
+                    "description": "Generate a short outline, then all sections concurrently",
+                    "default": DEFAULT_OUTLINE_FIRST
                 }
             }
         )
-        def generate_lesson_plan(topic: str, duration: str = "60 minutes", level: str = "beginner") -> Dict[str, Any]:
+        def generate_lesson_plan(topic: str, duration: str = "60 minutes", level: str = "beginner",
+                                 fresh: bool = False, outline_first: bool = DEFAULT_OUTLINE_FIRST) -> Dict[str, Any]:
+            topic = semantic_topic(self.topic_index, topic, lesson_plan_scope(duration, level, outline_first), fresh)
+            if outline_first:
+                # Each section is its own (cached) request, so one weak section can be regenerated alone
+                try:
+                    return outlined_lesson_plan(lambda prompt: self._request_json(prompt, fresh), topic, duration, level)
+                except Exception as e:
+                    return {"error": str(e), "status": 500}
             # Compose prompt for lesson plan generation
-            prompt = f"""Create a {duration} lesson plan about {topic} for {level} learners.
-            Required structure:
-            {{
-                "topic": "string",
-                "duration": "string",
-                "level": "string",
-                "learning_objectives": ["string"],
-                "sections": [
-                    {{
-                        "title": "string",
-                        "duration": "string",
-                        "content": "string",
-                        "activities": ["string"],
-                        "materials": ["string"]
-                    }}
-                ],
-                "assessment": {{
-                    "type": "string",
-                    "description": "string"
-                }}
-            }}"""
-            # Call the API and return the structured response
-            return self._call_groq_api(prompt)
+            prompt = lesson_plan_prompt(topic, duration, level)
+            # Call the API, then repair the response and re-request only missing fields or broken sections
+            result = self._call_groq_api(prompt, fresh=fresh)
+            if "error" in result:
+                return result
+            return complete_lesson_plan(result, topic, lambda patch_prompt: self._request_json(patch_prompt, fresh))
+
+    def _request_json(self, prompt: str, fresh: bool = False) -> Dict[str, Any]:
+        """Like _call_groq_api, but raises instead of returning an error dict"""
+        result = self._call_groq_api(prompt, fresh=fresh)
+        if "error" in result:
+            raise RuntimeError(result["error"])
+        return result
 
-    def run(self, host: str = "0.0.0.0", port: int = 6000):
+    def run(self, host: str = "0.0.0.0", port: int = 6000, max_workers: int = None,
+            request_timeout: float = None):
         """Starts the MCP server and listens for incoming requests"""
+        # Worker pool size and per-request timeout default to the .env settings
+        max_workers = max_workers or int(os.getenv("MCP_MAX_WORKERS", "8"))
+        request_timeout = request_timeout or float(os.getenv("MCP_REQUEST_TIMEOUT", "60"))
         print(f"Starting EduChain MCP server on {host}:{port}")
         try:
-            self.server.run(host=host, port=port)
+            self.server.run(host=host, port=port, max_workers=max_workers, request_timeout=request_timeout)
         except Exception as e:
             print(f"Server failed: {str(e)}")
             raise
@@ -0,0 +1,461 @@
+# metrics.py — Hot-path timing spans, token accounting, a Prometheus text endpoint and a runtime-toggled profiler
+
+import io
+import os
+import re
+import sys
+import time
+import pstats
+import cProfile
+import threading
+import contextvars
+import functools
+import ipaddress
+import hmac
+import inspect
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from typing import Dict, Any
+
+# Defaults, overridable through the .env file
+METRICS_ENABLED = os.getenv("EDUCHAIN_METRICS", "1").lower() not in ("0", "false", "no")
+DEFAULT_METRICS_PORT = int(os.getenv("EDUCHAIN_METRICS_PORT", "9464"))
+DEFAULT_PROFILE_MODE = os.getenv("EDUCHAIN_PROFILE", "")  # "", "sample" or "cprofile"
+DEFAULT_METRICS_HOST = os.getenv("EDUCHAIN_METRICS_HOST", "127.0.0.1")  # Side port; "0.0.0.0" exposes it
+PROFILE_TOKEN = os.getenv("EDUCHAIN_PROFILE_TOKEN", "")  # Required for /profile from other hosts
+
+# Histogram bucket upper bounds in seconds (Prometheus "le" labels)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Name of the tool or handler the current call belongs to (copied into shard worker threads)
+_handler = contextvars.ContextVar("educhain_handler", default="")
+
+
+class Metrics:
+    """Thread-safe counters and histograms, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self._help = {}
+        self._collectors = {}  # prefix -> stats function, rendered as gauges
+
+    def inc(self, name, value=1, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if help or name not in self._help:
+                self._help[name] = ("counter", help)
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, help="", **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            if help or name not in self._help:
+                self._help[name] = ("histogram", help)
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(BUCKETS) + 1) + [0.0]
+            for i, bound in enumerate(BUCKETS):
+                if value <= bound:
+                    histogram[i] += 1
+                    break
+            else:
+                histogram[len(BUCKETS)] += 1
+            histogram[-1] += value
+
+    def register_stats(self, prefix, stats):
+        """Expose the numeric values of stats() (a possibly nested dict) as educhain_<prefix>_* gauges"""
+        with self._lock:
+            self._collectors[prefix] = stats  # Re-registering a prefix replaces the old source
+
+    def render(self) -> str:
+        """Return every metric in the Prometheus text exposition format"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: list(value) for key, value in self._histograms.items()}
+            described = dict(self._help)
+            collectors = list(self._collectors.items())
+
+        lines, seen = [], set()
+
+        def header(name):
+            if name not in seen:
+                seen.add(name)
+                kind, text = described.get(name, ("gauge", ""))
+                if text:
+                    lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, labels), value in sorted(counters.items()):
+            header(name)
+            lines.append(f"{name}{_labels(labels)} {value}")
+        for (name, labels), histogram in sorted(histograms.items()):
+            header(name)
+            cumulative = 0
+            for bound, count in zip(BUCKETS + ("+Inf",), histogram):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', str(bound)),))} {cumulative}")
+            lines.append(f"{name}_sum{_labels(labels)} {histogram[-1]:.6f}")
+            lines.append(f"{name}_count{_labels(labels)} {cumulative}")
+        for prefix, stats in collectors:
+            try:
+                values = stats()
+            except Exception as e:
+                lines.append(f"# {prefix} stats unavailable: {e}")
+                continue
+            for name, value in _flatten(f"educhain_{prefix}", values):
+                header(name)
+                lines.append(f"{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+def _flatten(prefix, values):
+    # Nested stats dicts become underscore-joined gauge names; non-numeric values are skipped
+    for key, value in values.items():
+        name = f"{prefix}_{re.sub(r'[^a-zA-Z0-9_]', '_', str(key))}"  # Model names contain "-" and "."
+        if isinstance(value, dict):
+            yield from _flatten(name, value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield name, value
+
+
+metrics = Metrics()
+
+
+# ----------------------------------------------------------------------
+# Instrumentation helpers used on the hot path
+# ----------------------------------------------------------------------
+
+@contextmanager
+def span(name, model=""):
+    """Time a block as educhain_span_seconds{span=name} under the current handler"""
+    if not METRICS_ENABLED:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.observe("educhain_span_seconds", time.perf_counter() - started,
+                        help="Time spent in each stage of a request",
+                        span=name, handler=_handler.get(), model=model or "")
+
+
+def timed(name):
+    """Decorator form of span() for prompt builders and formatters"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def _attributed(name):
+    # Label everything in this block with handler `name`, and profile it if cprofile mode is on
+    token = _handler.set(name)
+    try:
+        with get_default_profiler().profile_call():
+            yield
+    finally:
+        _handler.reset(token)
+
+
+@contextmanager
+def _request(name):
+    # Count one tool/handler call and time it end to end
+    started = time.perf_counter()
+    status = "error"
+    try:
+        yield
+        status = "ok"
+    finally:
+        if METRICS_ENABLED:
+            metrics.observe("educhain_request_seconds", time.perf_counter() - started,
+                            help="End-to-end time per tool or handler call", handler=name)
+            metrics.inc("educhain_requests_total", help="Tool or handler calls", handler=name, status=status)
+
+
+@contextmanager
+def handler_scope(name):
+    """Attribute spans, tokens and profiles in this block (and shards it starts) to handler `name`"""
+    with _request(name), _attributed(name):
+        yield
+
+
+def handler(name):
+    """
+    Decorator form of handler_scope(). Generator functions (streaming Gradio handlers)
+    are labelled around each step, since the framework may resume them on other threads.
+    """
+    def decorator(func):
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                steps = func(*args, **kwargs)
+                with _request(name):
+                    while True:
+                        with _attributed(name):
+                            try:
+                                item = next(steps)
+                            except StopIteration:
+                                return
+                        yield item
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with handler_scope(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_usage(model, usage):
+    """Count prompt/completion tokens from a response.usage object (or dict); missing usage is ignored"""
+    if not METRICS_ENABLED or usage is None:
+        return
+    for kind in ("prompt", "completion"):
+        value = usage.get(f"{kind}_tokens") if isinstance(usage, dict) else getattr(usage, f"{kind}_tokens", None)
+        if isinstance(value, int):
+            metrics.inc("educhain_tokens_total", value, help="Tokens reported by the LLM provider",
+                        kind=kind, handler=_handler.get(), model=model or "")
+
+
+def record_llm_call(model, seconds, ttft=None, stream=False):
+    """Record one upstream completion: total time and, for streams, time to first token"""
+    if not METRICS_ENABLED:
+        return
+    labels = {"handler": _handler.get(), "model": model or ""}
+    metrics.inc("educhain_llm_calls_total", help="Upstream completion calls",
+                stream="true" if stream else "false", **labels)
+    metrics.observe("educhain_span_seconds", seconds, span="upstream", **labels)
+    if ttft is not None:
+        metrics.observe("educhain_ttft_seconds", ttft, help="Time to first streamed token", **labels)
+
+
+def stream_usage(chunk):
+    """Usage attached to a streamed chunk (OpenAI puts it on the chunk, Groq under x_groq), or None"""
+    usage = getattr(chunk, "usage", None)
+    if usage is None:
+        usage = getattr(getattr(chunk, "x_groq", None), "usage", None)
+    return usage
+
+
+# ----------------------------------------------------------------------
+# Profiler
+# ----------------------------------------------------------------------
+
+class Profiler:
+    """
+    Runtime-toggled profiler.
+    "sample" mode polls every thread's stack every `interval` seconds and counts
+    collapsed stacks (cheap enough for production). "cprofile" mode runs cProfile
+    around each handler call on its own thread and merges the results.
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.mode = ""
+        self.started_at = None
+        self._lock = threading.Lock()
+        self._samples = Counter()
+        self._stats = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._local = threading.local()
+
+    def start(self, mode="sample"):
+        """Start (or restart) profiling; previous results are discarded"""
+        if mode not in ("sample", "cprofile"):
+            raise ValueError(f"Unknown profile mode '{mode}' (expected 'sample' or 'cprofile')")
+        self.stop()
+        with self._lock:
+            self.mode, self.started_at = mode, time.time()
+            self._samples, self._stats = Counter(), None
+        if mode == "sample":
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_loop, name="educhain-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> str:
+        """Stop profiling and return the report (empty if the profiler was not running)"""
+        if not self.mode:
+            return ""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        report = self.report()
+        with self._lock:
+            self.mode = ""
+        return report
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode or None, "started_at": self.started_at,
+                    "samples": sum(self._samples.values())}
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            stacks = []
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                self._samples.update(stacks)
+
+    @contextmanager
+    def profile_call(self):
+        # cProfile only sees its own thread, so each handler call gets a profiler; nested calls reuse it
+        if self.mode != "cprofile" or getattr(self._local, "active", False):
+            yield
+            return
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:  # Another profiler already owns this thread
+            yield
+            return
+        self._local.active = True
+        try:
+            yield
+        finally:
+            profile.disable()
+            self._local.active = False
+            with self._lock:
+                if self.mode == "cprofile":
+                    if self._stats is None:
+                        self._stats = pstats.Stats(profile)
+                    else:
+                        self._stats.add(profile)
+
+    def report(self, limit=40) -> str:
+        """Top functions (cprofile) or the most frequent collapsed stacks (sample, flamegraph-compatible)"""
+        with self._lock:
+            if self.mode == "cprofile":
+                if self._stats is None:
+                    return "No handler calls were profiled yet\n"
+                out = io.StringIO()
+                self._stats.stream = out
+                self._stats.sort_stats("cumulative").print_stats(limit)
+                return out.getvalue()
+            samples = self._samples.most_common(limit)
+        return "".join(f"{stack} {count}\n" for stack, count in samples)
+
+
+_default_profiler = None
+_default_profiler_lock = threading.Lock()
+
+
+def get_default_profiler() -> Profiler:
+    """Return the process-wide profiler, creating (and starting, if EDUCHAIN_PROFILE is set) it on first use"""
+    global _default_profiler
+    with _default_profiler_lock:
+        if _default_profiler is None:
+            _default_profiler = Profiler()
+            if DEFAULT_PROFILE_MODE:
+                _default_profiler.start(DEFAULT_PROFILE_MODE)
+        return _default_profiler
+
+
+# ----------------------------------------------------------------------
+# HTTP endpoints (shared by mcp.McpServer and the standalone metrics server)
+# ----------------------------------------------------------------------
+
+def profile_allowed(headers=None, client_host=None):
+    """
+    The profiler routes need "Authorization: Bearer <EDUCHAIN_PROFILE_TOKEN>" when a token is
+    configured; without one they are only served to clients on the loopback interface.
+    """
+    if PROFILE_TOKEN:
+        supplied = (headers or {}).get("authorization", "")
+        return hmac.compare_digest(supplied.encode("utf-8"), f"Bearer {PROFILE_TOKEN}".encode("utf-8"))
+    try:
+        address = ipaddress.ip_address((client_host or "").split("%")[0])
+    except ValueError:
+        return False
+    mapped = getattr(address, "ipv4_mapped", None)
+    return (mapped or address).is_loopback
+
+
+def handle_request(method, path, headers=None, client_host=None):
+    """
+    Serve /metrics and /profile requests; returns (status, text) or None for other paths.
+    GET /profile shows the profiler status and report, POST /profile/start?mode=sample|cprofile
+    starts it and POST /profile/stop stops it and returns the report. headers (lowercase
+    names) and client_host decide whether the caller may use /profile (see profile_allowed).
+    """
+    url = urlsplit(path)
+    if url.path == "/metrics" and method == "GET":
+        return 200, metrics.render()
+    if not url.path.startswith("/profile"):
+        return None
+    if not profile_allowed(headers, client_host):
+        return 403, "the profiler needs EDUCHAIN_PROFILE_TOKEN (Authorization: Bearer ...) or a local client\n"
+    profiler = get_default_profiler()
+    if url.path == "/profile" and method == "GET":
+        status = profiler.status()
+        return 200, f"mode: {status['mode']}\nsamples: {status['samples']}\n\n" + profiler.report()
+    if method != "POST":
+        return 405, "use POST to start or stop the profiler\n"
+    if url.path == "/profile/start":
+        mode = parse_qs(url.query).get("mode", ["sample"])[0]
+        try:
+            profiler.start(mode)
+        except ValueError as e:
+            return 400, f"{e}\n"
+        return 200, f"profiling started ({mode})\n"
+    if url.path == "/profile/stop":
+        return 200, profiler.stop() or "profiler was not running\n"
+    return 404, f"no route for {url.path}\n"
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def _respond(self):
+        headers = {key.lower(): value for key, value in self.headers.items()}
+        result = (handle_request(self.command, self.path, headers, self.client_address[0])
+                  or (404, f"no route for {self.path}\n"))
+        body = result[1].encode("utf-8")
+        self.send_response(result[0])
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_POST = _respond
+
+    def log_message(self, format, *args):
+        pass  # Scrapes every few seconds would flood the console
+
+
+def start_metrics_server(port=DEFAULT_METRICS_PORT, host=DEFAULT_METRICS_HOST):
+    """Serve /metrics and /profile on a daemon thread (for apps without their own HTTP routes)"""
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    threading.Thread(target=server.serve_forever, name="educhain-metrics", daemon=True).start()
+    print(f"📈 Metrics on http://{host}:{port}/metrics")
+    return server
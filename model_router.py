@@ -0,0 +1,291 @@
+# model_router.py — Latency-adaptive routing between a fast and a strong model, with per-model failover
+#
+# Every request names model="auto" (the default MODEL of each entry point); the router picks the
+# concrete model from the request's max_tokens budget and a latency SLO. Small quizzes and lesson
+# sections go to the fast model, whole lesson plans to the strong one, unless rolling stats show
+# the preferred model would miss the SLO or is degraded, in which case the other one is used.
+
+import os
+import re
+import time
+import threading
+from collections import deque
+from types import SimpleNamespace
+from typing import Dict, Any, List
+
+from resilience import ResilientClient, CircuitOpenError, DeadlineExceeded, DEFAULT_DEADLINE, retry_delay
+
+ROUTED_MODEL = "auto"
+
+# Defaults, overridable through the .env file
+DEFAULT_FAST_MODEL = os.getenv("EDUCHAIN_FAST_MODEL", "llama-3.1-8b-instant")
+DEFAULT_STRONG_MODEL = os.getenv("EDUCHAIN_STRONG_MODEL", "llama-3.3-70b-versatile")
+# "auto" routes; a model name pins every request to it. With only one model configured there is
+# nothing to route between, so "auto" means that model
+DEFAULT_MODEL = os.getenv("EDUCHAIN_MODEL", ROUTED_MODEL)
+if DEFAULT_MODEL == ROUTED_MODEL and DEFAULT_FAST_MODEL == DEFAULT_STRONG_MODEL:
+    DEFAULT_MODEL = DEFAULT_FAST_MODEL
+DEFAULT_LATENCY_SLO = float(os.getenv("EDUCHAIN_LATENCY_SLO", "20"))  # Seconds a reply should take at most
+DEFAULT_LONG_OUTPUT_TOKENS = int(os.getenv("EDUCHAIN_LONG_OUTPUT_TOKENS", "1200"))  # Budgets above go to the strong model
+DEFAULT_MAX_ERROR_RATE = float(os.getenv("EDUCHAIN_MAX_ERROR_RATE", "0.5"))  # Recent error rate that marks a model degraded
+
+ERROR_MIN_SAMPLES = 4  # Calls in the window before the error rate can mark a model degraded
+ERROR_WINDOW_SECONDS = 120.0  # Only recent errors count, so a degraded model is tried again later
+THROUGHPUT_MIN_SAMPLES = 5  # Successful calls before latency predictions are trusted
+
+
+# Error codes and message fragments providers use for a model that was renamed or retired (Groq sends a 400)
+_UNAVAILABLE_MODEL_CODES = {"model_not_found", "model_decommissioned", "model_not_active"}
+_UNAVAILABLE_MODEL_MESSAGE = re.compile(r"decommissioned|no longer supported|model .*(not found|does not exist)", re.I)
+
+
+def model_unavailable(error):
+    """True for a 400/404 saying the requested model does not exist (any more)"""
+    if getattr(error, "status_code", None) not in (400, 404):
+        return False
+    body = getattr(error, "body", None)
+    details = body.get("error", body) if isinstance(body, dict) else {}
+    code = details.get("code") if isinstance(details, dict) else None
+    return code in _UNAVAILABLE_MODEL_CODES or bool(_UNAVAILABLE_MODEL_MESSAGE.search(str(error)))
+
+
+def model_failure(error):
+    """True for errors that say the model is unhealthy rather than that the request or API key is bad"""
+    return (isinstance(error, (CircuitOpenError, DeadlineExceeded)) or retry_delay(error, 0) is not None
+            or model_unavailable(error))
+
+
+class ModelStats:
+    """Rolling window of one model's recent calls: latency, errors and output tokens per second"""
+
+    def __init__(self, window=100):
+        self._calls = deque(maxlen=window)  # (seconds or None for streams, completion tokens, ok)
+        self._times = deque(maxlen=window)  # Monotonic time of each call, for the error window
+        self._lock = threading.Lock()
+
+    def record(self, ok, seconds=None, tokens=0):
+        with self._lock:
+            self._calls.append((seconds, tokens, ok))
+            self._times.append(time.monotonic())
+
+    def error_rate(self):
+        """Fraction of calls in the last ERROR_WINDOW_SECONDS that failed, or None with too few calls"""
+        since = time.monotonic() - ERROR_WINDOW_SECONDS
+        with self._lock:
+            outcomes = [ok for (_, _, ok), at in zip(self._calls, self._times) if at >= since]
+        return None if len(outcomes) < ERROR_MIN_SAMPLES else outcomes.count(False) / len(outcomes)
+
+    def throughput(self):
+        """Completion tokens per second of wall time over recent successful calls, or None"""
+        with self._lock:
+            timed = [(seconds, tokens) for seconds, tokens, ok in self._calls if ok and seconds and tokens]
+        if len(timed) < THROUGHPUT_MIN_SAMPLES:
+            return None
+        return sum(tokens for _, tokens in timed) / sum(seconds for seconds, _ in timed)
+
+    def predict(self, output_tokens):
+        """Expected seconds for a reply of output_tokens tokens, or None without enough history"""
+        throughput = self.throughput()
+        return output_tokens / throughput if throughput else None
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            calls = list(self._calls)
+        latencies = sorted(seconds for seconds, _, ok in calls if ok and seconds is not None)
+        error_rate, throughput = self.error_rate(), self.throughput()
+        return {
+            "calls": len(calls),
+            "errors": sum(1 for _, _, ok in calls if not ok),
+            "error_rate": error_rate if error_rate is not None else 0.0,
+            "p50_ms": latencies[len(latencies) // 2] * 1000 if latencies else None,
+            "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000 if latencies else None,
+            "tokens_per_second": throughput,
+        }
+
+
+class ModelRouter:
+    """
+    Wraps an LLM client with the same client.chat.completions.create interface and one
+    ResilientClient (own retries, latency tracker and circuit breaker) per model.
+    Requests for model="auto" are routed: a max_tokens budget above long_output_tokens
+    prefers the strong model, smaller ones the fast model. A model whose breaker is open
+    or whose recent error rate reaches max_error_rate is skipped, and so is a model whose
+    rolling tokens/second predict a reply slower than the latency SLO when another model
+    would meet it. A request that fails on its model is retried on the next one within
+    the same deadline. Other model names are pinned and only tracked, and so is every
+    request when fast_model and strong_model are the same model.
+    """
+
+    def __init__(self, client, fast_model=DEFAULT_FAST_MODEL, strong_model=DEFAULT_STRONG_MODEL,
+                 latency_slo=DEFAULT_LATENCY_SLO, long_output_tokens=DEFAULT_LONG_OUTPUT_TOKENS,
+                 max_error_rate=DEFAULT_MAX_ERROR_RATE, deadline=DEFAULT_DEADLINE, history=200, **resilience):
+        self.inner = client
+        self.fast_model = fast_model
+        self.strong_model = strong_model
+        self.latency_slo = latency_slo
+        self.long_output_tokens = long_output_tokens
+        self.max_error_rate = max_error_rate
+        self.deadline = deadline
+        self._resilience = dict(resilience, deadline=deadline)
+
+        # Same call shape as groq.Groq: client.chat.completions.create(...)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+        self._lock = threading.Lock()
+        self._clients = {}  # model -> ResilientClient
+        self._stats = {}  # model -> ModelStats
+        self._decisions = deque(maxlen=history)
+        self._counters = {"routed": 0, "pinned": 0, "failovers": 0, "slo_reroutes": 0, "degraded_skips": 0}
+        for model in dict.fromkeys((fast_model, strong_model)):
+            self._model(model)
+
+    def _model(self, model):
+        # Returns (ResilientClient, ModelStats), creating them the first time a model is used
+        with self._lock:
+            if model not in self._clients:
+                self._clients[model] = ResilientClient(self.inner, **self._resilience)
+                self._stats[model] = ModelStats()
+            return self._clients[model], self._stats[model]
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    # ------------------------------------------------------------------
+    # Routing
+    # ------------------------------------------------------------------
+
+    def degraded(self, model):
+        """Return True if the model's breaker is failing fast or its recent error rate is too high"""
+        client, stats = self._model(model)
+        error_rate = stats.error_rate()
+        return client.breaker.is_open() or (error_rate is not None and error_rate >= self.max_error_rate)
+
+    def route(self, output_tokens=None, latency_slo=None) -> Dict[str, Any]:
+        """
+        Choose a model for a reply of up to output_tokens tokens (unknown counts as long).
+        Returns the decision: the model, the order to fail over in, the reason and the
+        predicted seconds (None until the model has enough history).
+        """
+        long = not output_tokens or output_tokens > self.long_output_tokens
+        output_tokens = output_tokens or self.long_output_tokens
+        slo = latency_slo or self.latency_slo
+        preferred = [self.strong_model, self.fast_model] if long else [self.fast_model, self.strong_model]
+        preferred = list(dict.fromkeys(preferred))
+        healthy = [model for model in preferred if not self.degraded(model)]
+        predicted = {model: self._model(model)[1].predict(output_tokens) for model in preferred}
+
+        if not healthy:
+            model, reason = preferred[0], "all_degraded"  # Its breaker lets a trial request through when due
+        else:
+            within = [model for model in healthy if predicted[model] is None or predicted[model] <= slo]
+            if within:
+                model = within[0]
+                reason = "long_output" if long else "short_output"
+                if model != healthy[0]:
+                    reason = "slo"
+            else:
+                model, reason = min(healthy, key=lambda m: predicted[m]), "fastest_over_slo"
+            if model != preferred[0] and preferred[0] not in healthy:
+                reason = "degraded_failover"
+        if reason == "slo":
+            self._count("slo_reroutes")
+        elif reason == "degraded_failover":
+            self._count("degraded_skips")
+        order = [model] + [other for other in healthy if other != model]
+        order += [other for other in preferred if other not in order]
+        return {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "output_tokens": output_tokens, "model": model, "reason": reason,
+                "predicted_seconds": predicted[model], "order": order}
+
+    # ------------------------------------------------------------------
+    # Groq-compatible client interface
+    # ------------------------------------------------------------------
+
+    def create(self, model=ROUTED_MODEL, deadline=None, **request):
+        """Same arguments as client.chat.completions.create; model="auto" (or None) is routed"""
+        if self.fast_model == self.strong_model:
+            model = model if model and model != ROUTED_MODEL else self.fast_model  # Nothing to choose between
+        if model and model != ROUTED_MODEL:
+            self._count("pinned")
+            return self._call(model, deadline or self.deadline, request)[0]
+
+        self._count("routed")
+        decision = self.route(request.get("max_tokens"))
+        expires = time.monotonic() + (deadline or self.deadline)
+        order, failed_over, error = decision["order"], [], None
+        try:
+            for attempt, candidate in enumerate(order):
+                remaining = expires - time.monotonic()
+                if attempt and remaining <= 0:
+                    break
+                try:
+                    result, seconds = self._call(candidate, max(remaining, 0.001), request)
+                except Exception as e:
+                    if not model_failure(e):
+                        raise  # Bad keys and bad requests fail the same way on every model
+                    error = e
+                    if attempt + 1 < len(order):
+                        self._count("failovers")
+                        failed_over.append(candidate)
+                        print(f"Model {candidate} failed ({e}); failing over to {order[attempt + 1]}")
+                    continue
+                decision.update(served_by=candidate, seconds=seconds)
+                return result
+            decision["served_by"] = None
+            raise error
+        finally:
+            # Published only once complete, so decisions() never copies a dict that is still changing
+            decision.setdefault("served_by", None)
+            if failed_over:
+                decision["failover_from"] = failed_over
+            with self._lock:
+                self._decisions.append(decision)
+
+    def _call(self, model, deadline, request):
+        # Returns (result, seconds; None for streams) and records the outcome in the model's stats
+        client, stats = self._model(model)
+        started = time.monotonic()
+        try:
+            result = client.create(model=model, deadline=deadline, **request)
+        except Exception as e:
+            if model_failure(e):
+                stats.record(False)
+            raise
+        if request.get("stream"):
+            stats.record(True)  # Token throughput is only known once a stream is drained
+            return result, None
+        seconds = time.monotonic() - started
+        usage = getattr(result, "usage", None)
+        stats.record(True, seconds, getattr(usage, "completion_tokens", 0) or 0)
+        return result, round(seconds, 3)
+
+    # ------------------------------------------------------------------
+    # Admin view
+    # ------------------------------------------------------------------
+
+    def decisions(self, limit=20) -> List[Dict[str, Any]]:
+        """Most recent routing decisions, newest first"""
+        with self._lock:
+            recent = list(self._decisions)[-limit:] if limit else []
+        return [dict(decision, order=list(decision["order"])) for decision in reversed(recent)]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return retry, hedging and breaker counters summed over models (as ResilientClient
+        reports them), routing counters, per-model rolling stats and recent decisions
+        """
+        with self._lock:
+            models = list(self._clients)
+            routing = dict(self._counters)
+        stats, per_model = {}, {}
+        for model in models:
+            client, model_stats = self._model(model)
+            upstream = client.stats()
+            for name, value in upstream.items():
+                if isinstance(value, int) and not isinstance(value, bool):
+                    stats[name] = stats.get(name, 0) + value
+            per_model[model] = dict(model_stats.snapshot(), breaker_state=upstream["breaker_state"],
+                                    degraded=self.degraded(model))
+        stats.update(routing=routing, models=per_model, decisions=self.decisions(),
+                     slo_seconds=self.latency_slo, long_output_tokens=self.long_output_tokens)
+        return stats
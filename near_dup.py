@@ -0,0 +1,226 @@
+# near_dup.py — MinHash/LSH index that spots near-duplicate questions across generated quizzes
+
+import os
+import re
+import zlib
+import random
+import operator
+import threading
+from array import array
+from typing import Dict, Any
+
+from question_bank import get_default_bank
+
+# Estimated Jaccard similarity (of character shingles) above which two questions count as duplicates
+DEFAULT_THRESHOLD = float(os.getenv("EDUCHAIN_DEDUP_THRESHOLD", "0.85"))
+
+# 64 MinHash values split into 8 LSH bands of 8 rows: pairs above ~0.85 similarity
+# almost always share a band, pairs below ~0.5 rarely do
+DEFAULT_NUM_PERM = 64
+DEFAULT_BANDS = 8
+SHINGLE_SIZE = 5
+SHINGLE_CACHE_SIZE = 50000  # Distinct shingles whose permuted hashes are kept (~320 bytes each)
+
+# Words, numbers (with their decimals) and single symbols; quotes and literals are kept,
+# so print(type("10")) and print(type(10.5)) do not collapse onto print(type(10))
+_TOKEN = re.compile(r"\d+(?:\.\d+)*|\w+|[^\w\s]")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+
+def normalize_question(text):
+    """Lowercase the question and split it into words, numbers and symbols, separated by single spaces"""
+    return " ".join(_TOKEN.findall(text.lower()))
+
+
+def shingles(text, size=SHINGLE_SIZE):
+    """Hashed character n-grams of the normalized text"""
+    text = normalize_question(text)
+    if len(text) <= size:
+        return {zlib.crc32(text.encode("utf-8"))}
+    return {zlib.crc32(text[i:i + size].encode("utf-8")) for i in range(len(text) - size + 1)}
+
+
+class NearDuplicateIndex:
+    """
+    In-memory MinHash/LSH index of question texts.
+    Lookups only compare against entries that share an LSH band, so they stay
+    fast with hundreds of thousands of stored questions. Each entry remembers a
+    `source` (e.g. the cache key of the prompt that produced it) so a quiz
+    served again from the response cache is not flagged against itself.
+    load() fills it from stored (text, source) pairs, e.g. the question bank.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, num_perm=DEFAULT_NUM_PERM, bands=DEFAULT_BANDS, seed=1):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+
+        # Fixed hash permutations so signatures are comparable across runs
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+        self._permuted = {}  # Shingle hash -> its num_perm permuted values; shingles recur across questions
+
+        # Entry id -> compact signature and source; one bucket table per band
+        self._signatures = []
+        self._sources = []
+        self._buckets = [{} for _ in range(bands)]
+        self._lock = threading.Lock()
+        self._counters = {"checked": 0, "duplicates": 0}
+
+    def _permute(self, h):
+        values = self._permuted.get(h)
+        if values is None:
+            if len(self._permuted) >= SHINGLE_CACHE_SIZE:
+                self._permuted.clear()
+            values = array("I", [((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for a, b in self._perms])
+            self._permuted[h] = values
+        return values
+
+    def signature(self, text):
+        """MinHash signature of the question text"""
+        # One row of permuted values per shingle (mostly cached); zip/min take the column minimums in C
+        return array("I", map(min, zip(*map(self._permute, shingles(text)))))
+
+    def _band_keys(self, signature):
+        rows = self.rows
+        return [hash(tuple(signature[i * rows:(i + 1) * rows])) for i in range(self.bands)]
+
+    def _similarity(self, signature, entry_id):
+        return sum(map(operator.eq, signature, self._signatures[entry_id])) / self.num_perm
+
+    def _matches(self, signature, band_keys):
+        # Caller holds the lock; yields (entry_id, similarity) for candidates above the threshold
+        candidates = set()
+        for bucket, key in zip(self._buckets, band_keys):
+            ids = bucket.get(key)
+            if ids is None:
+                continue
+            if isinstance(ids, int):
+                candidates.add(ids)
+            else:
+                candidates.update(ids)
+        for entry_id in candidates:
+            similarity = self._similarity(signature, entry_id)
+            if similarity >= self.threshold:
+                yield entry_id, similarity
+
+    def _insert(self, signature, band_keys, source):
+        # Caller holds the lock; most buckets hold one id, so store a bare int until they collide
+        entry_id = len(self._signatures)
+        self._signatures.append(signature)
+        self._sources.append(source)
+        for bucket, key in zip(self._buckets, band_keys):
+            ids = bucket.get(key)
+            if ids is None:
+                bucket[key] = entry_id
+            elif isinstance(ids, int):
+                bucket[key] = [ids, entry_id]
+            else:
+                ids.append(entry_id)
+        return entry_id
+
+    def find(self, text, exclude_source=None):
+        """Return (entry_id, similarity) of the closest stored near-duplicate, or None"""
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            matches = [(entry_id, similarity) for entry_id, similarity in self._matches(signature, band_keys)
+                       if exclude_source is None or self._sources[entry_id] != exclude_source]
+        return max(matches, key=lambda match: match[1]) if matches else None
+
+    def add(self, text, source=None):
+        """Store the question unconditionally and return its entry id"""
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            return self._insert(signature, band_keys, source)
+
+    def load(self, entries):
+        """Store (text, source) pairs unconditionally, e.g. from QuestionBank.iter_texts(); returns how many"""
+        count = 0
+        for text, source in entries:
+            signature = self.signature(text)
+            band_keys = self._band_keys(signature)
+            with self._lock:
+                self._insert(signature, band_keys, source)
+            count += 1
+        return count
+
+    def check_and_add(self, text, source=None, exclude_source=None):
+        """
+        Atomically test the question and store it if it is new.
+        Returns True when the question is new (matches from exclude_source are ignored).
+        """
+        signature = self.signature(text)
+        band_keys = self._band_keys(signature)
+        with self._lock:
+            self._counters["checked"] += 1
+            matches = list(self._matches(signature, band_keys))
+            if any(exclude_source is None or self._sources[entry_id] != exclude_source
+                   for entry_id, _ in matches):
+                self._counters["duplicates"] += 1
+                return False
+            # Only ignored matches (e.g. a cache hit of the same prompt): already stored
+            if not matches:
+                self._insert(signature, band_keys, source)
+            return True
+
+    def filter_questions(self, questions, source=None, exclude_source=None):
+        """Split question dicts into (new, duplicates), storing the new ones"""
+        new, duplicates = [], []
+        for question in questions:
+            text = question.get("question") if isinstance(question, dict) else None
+            if not isinstance(text, str) or self.check_and_add(text, source, exclude_source):
+                new.append(question)
+            else:
+                duplicates.append(question)
+        return new, duplicates
+
+    def __len__(self):
+        with self._lock:
+            return len(self._signatures)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return how many questions are stored and how many were rejected as duplicates"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["entries"] = len(self._signatures)
+        stats["duplicate_rate"] = stats["duplicates"] / stats["checked"] if stats["checked"] else 0.0
+        return stats
+
+
+def remove_near_duplicates(quiz, index, source, fresh=False):
+    """
+    Drop questions from a {"topic", "questions"} dict that near-duplicate earlier ones.
+    Questions are stored under `source`; unless fresh=True, matches from the same
+    source are ignored so a cached quiz is not rejected against itself.
+    Returns (quiz, removed_questions); anything that is not a quiz is returned unchanged.
+    """
+    if not isinstance(quiz, dict) or not isinstance(quiz.get("questions"), list):
+        return quiz, []
+    new, duplicates = index.filter_questions(quiz["questions"], source=source,
+                                             exclude_source=None if fresh else source)
+    if not duplicates:
+        return quiz, []
+    return dict(quiz, questions=new), duplicates
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def get_default_index() -> NearDuplicateIndex:
+    """Return the process-wide near-duplicate index, filled from the question bank on first use"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = NearDuplicateIndex()
+            # Questions generated before a restart are still duplicates after it
+            _default_index.load(get_default_bank().iter_texts())
+        return _default_index
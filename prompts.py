@@ -0,0 +1,348 @@
+# prompts.py — Central registry of compact prompt templates with output-token budgets and A/B reporting
+#
+# Every module builds its prompts here, so the wording and the JSON shape asked for are the
+# same everywhere. Templates are minified and compiled once at import; rendering is a single
+# str.format call. Each rendered prompt is a str that also carries its template id and a
+# max_tokens budget scaled to the requested size, which cached_completion sends upstream.
+#
+#   python prompts.py   # Compare the input tokens of every template version
+
+import os
+import re
+import json
+import zlib
+import threading
+from typing import Dict, Any
+
+from metrics import metrics, METRICS_ENABLED
+
+# Defaults, overridable through the .env file
+# Versions to serve per task, e.g. "mcq=v2,lesson_plan=v2" (the newest version otherwise)
+PROMPT_VERSIONS = os.getenv("EDUCHAIN_PROMPT_VERSIONS", "")
+# A/B split: share of topics served a challenger version, e.g. "mcq=v1:0.1" sends 10% of topics to mcq/v1
+PROMPT_AB = os.getenv("EDUCHAIN_PROMPT_AB", "")
+MAX_OUTPUT_TOKENS = int(os.getenv("EDUCHAIN_MAX_OUTPUT_TOKENS", "8192"))  # Ceiling for any max_tokens budget
+
+# JSON shapes shown to the model, written once and embedded minified
+MCQ_SHAPE = {"topic": "string", "questions": [{"question": "string", "options": ["string"], "correct_answer": "string",
+                                               "explanation": "string", "difficulty": "easy|medium|hard"}]}
+SECTION_SHAPE = {"title": "string", "content": "string", "duration": "string", "activities": ["string"]}
+LESSON_PLAN_SHAPE = {"topic": "string", "duration": "string", "objectives": ["string"], "sections": [SECTION_SHAPE],
+                     "assessment": "string", "resources": ["string"]}
+OUTLINE_SHAPE = dict(LESSON_PLAN_SHAPE, sections=[{"title": "string", "duration": "string"}])
+
+# Pieces a Llama 3 (tiktoken-style) BPE pre-tokenizer splits text into: words, punctuation runs
+# and whitespace runs (a single space is merged into the following word)
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]+|\s*\n\s*|\s{2,}")
+
+
+def count_tokens(text):
+    """
+    Approximate token count for Llama-style BPE vocabularies: a token per word (plus one
+    per further 8 characters), per two punctuation marks and per whitespace run such as
+    indentation. Close enough to budget max_tokens and compare templates without a
+    tokenizer dependency.
+    """
+    tokens = 0
+    for piece in _TOKEN_PIECES.findall(text):
+        if piece[0].isspace():
+            tokens += 1
+        elif piece[0].isalnum() or piece[0] == "_":
+            tokens += 1 + (len(piece) - 1) // 8
+        else:
+            tokens += (len(piece) + 1) // 2
+    return tokens
+
+
+def minify_json(value):
+    """JSON without the whitespace the model does not need to see"""
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False)
+
+
+class Prompt(str):
+    """A rendered prompt: the text itself, plus the template it came from and its max_tokens budget"""
+
+    template = None
+    max_tokens = None
+
+    def __new__(cls, text, template=None, max_tokens=None):
+        prompt = super().__new__(cls, text)
+        prompt.template = template
+        prompt.max_tokens = max_tokens
+        return prompt
+
+
+class PromptTemplate:
+    """
+    One version of the prompt for a task. `text` may use {schema} for the task's JSON
+    shape; other {fields} are filled at render time. Unless minify=False the text is
+    collapsed onto as few lines as possible at compile time. The max_tokens budget is
+    output_base + output_per_item tokens for every item (questions, sections) requested.
+    """
+
+    def __init__(self, task, version, text, shape=None, output_base=200, output_per_item=0, minify=True,
+                 description=""):
+        self.task = task
+        self.version = version
+        self.id = f"{task}/{version}"
+        self.output_base = output_base
+        self.output_per_item = output_per_item
+        self.description = description
+        if minify:
+            text = " ".join(text.split())
+        if shape is not None:
+            schema = minify_json(shape) if minify else json.dumps(shape, indent=4)
+            text = text.replace("{schema}", schema.replace("{", "{{").replace("}", "}}"))
+        self.text = text
+        self._format = text.format  # Bound once, so rendering is a single call
+
+    def max_tokens(self, items=1):
+        """Output budget for a reply with `items` questions or sections"""
+        return min(MAX_OUTPUT_TOKENS, self.output_base + self.output_per_item * max(0, int(items)))
+
+    def render(self, items=1, **fields) -> Prompt:
+        return Prompt(self._format(**fields), template=self.id, max_tokens=self.max_tokens(items))
+
+
+# ----------------------------------------------------------------------
+# Registry
+# ----------------------------------------------------------------------
+
+TEMPLATES: Dict[str, Dict[str, PromptTemplate]] = {}
+
+
+def register(template):
+    """Add a template to the registry (replacing the same task/version)"""
+    TEMPLATES.setdefault(template.task, {})[template.version] = template
+    return template
+
+
+# v1 keeps the original verbose, pretty-printed wording as the A/B baseline
+register(PromptTemplate("mcq", "v1", """Generate {n} high-quality multiple-choice questions about {topic}.
+        Return as JSON with this exact structure:
+        {schema}
+        Include questions that test different levels of understanding.
+        {guidance}""", shape=MCQ_SHAPE, output_base=40, output_per_item=150, minify=False,
+                        description="Original verbose prompt with a pretty-printed schema"))
+register(PromptTemplate("mcq", "v2", """Generate {n} multiple-choice questions about {topic}.
+        4 options each, correct_answer is the right option's text, 1-sentence explanation, mixed difficulty.
+        JSON only: {schema}{guidance}""",
+                        shape=MCQ_SHAPE, output_base=40, output_per_item=150,
+                        description="Compact prompt with a minified schema"))
+
+register(PromptTemplate("lesson_plan", "v1", """Create a {duration} lesson plan about {topic}{audience}.
+        Include:
+        - 3-5 learning objectives
+        - 3-5 sections with titles/durations
+        - Key content points for each section
+        - Suggested activities
+        - Assessment method
+        Return as JSON with this exact structure:
+        {schema}
+        Include hands-on activities where appropriate.""", shape=LESSON_PLAN_SHAPE, output_base=300,
+                        output_per_item=300, minify=False,
+                        description="Original verbose prompt with a pretty-printed schema"))
+register(PromptTemplate("lesson_plan", "v2", """Create a {duration} lesson plan about {topic}{audience}.
+        3-5 objectives, 3-5 sections with key content and hands-on activities, an assessment method.
+        JSON only: {schema}""",
+                        shape=LESSON_PLAN_SHAPE, output_base=300, output_per_item=300,
+                        description="Compact prompt with a minified schema"))
+
+# Patches name their own fields, so the template only frames them; items are the sections asked for
+register(PromptTemplate("lesson_plan_patch", "v1", """Complete a lesson plan about {topic} ({duration}).
+        Return JSON with only these fields: {spec}{sections}""", output_base=200, output_per_item=300,
+                        description="Missing fields and invalid sections of a lesson plan"))
+
+# Outline-first lesson plans (lesson_plans.py): a short outline, then one request per section
+register(PromptTemplate("lesson_outline", "v1", """Outline a {duration} lesson plan about {topic}{audience}.
+        3-5 objectives, 3-5 sections with titles and durations only, an assessment method, resources.
+        JSON only: {schema}""", shape=OUTLINE_SHAPE, output_base=350,
+                        description="Lesson plan outline without section content"))
+register(PromptTemplate("lesson_section", "v1", """Write one section of a {duration} lesson plan about {topic}{audience}.
+        Section {number} of {count}: {title} ({section_duration}). Lesson objectives: {objectives}.
+        Other sections: {others}. Key content and 2-4 hands-on activities. JSON only: {schema}{guidance}""",
+                        shape=SECTION_SHAPE, output_base=450,
+                        description="One lesson plan section, written from the outline"))
+
+LESSON_PLAN_SECTIONS = 5  # Sections budgeted for a full lesson plan
+
+
+def _parse_map(value):
+    # "task=a,task2=b" -> {"task": "a", "task2": "b"}
+    pairs = (item.split("=", 1) for item in value.split(",") if "=" in item)
+    return {task.strip(): setting.strip() for task, setting in pairs}
+
+
+_versions = _parse_map(PROMPT_VERSIONS)
+_ab_splits = {}
+for _task, _setting in _parse_map(PROMPT_AB).items():
+    _version, _, _share = _setting.partition(":")
+    try:
+        _ab_splits[_task] = (_version, float(_share or "0.5"))
+    except ValueError:
+        print(f"Ignoring invalid EDUCHAIN_PROMPT_AB entry for {_task}: {_setting}")
+
+
+def select_version(task, key=""):
+    """
+    Version to serve for task. A topic (key) always gets the same version, so A/B
+    traffic stays cache friendly and a user sees consistent prompts for a topic.
+    """
+    versions = TEMPLATES[task]
+    version = _versions.get(task)
+    if version not in versions:
+        version = max(versions, key=lambda v: (len(v), v))  # Newest: v10 after v9
+    challenger = _ab_splits.get(task)
+    if challenger and challenger[0] in versions:
+        bucket = zlib.crc32(f"{task}:{' '.join(key.lower().split())}".encode("utf-8")) % 10000
+        if bucket < challenger[1] * 10000:
+            version = challenger[0]
+    return versions[version]
+
+
+def render(task, items=1, version=None, key="", **fields) -> Prompt:
+    """Render task's selected (or the given) template version"""
+    template = TEMPLATES[task][version] if version else select_version(task, key)
+    return template.render(items=items, **fields)
+
+
+# ----------------------------------------------------------------------
+# Task prompts used by the generators and servers
+# ----------------------------------------------------------------------
+
+def mcq_prompt(topic, num_questions, guidance=None, version=None) -> Prompt:
+    """MCQ prompt; shards pass extra guidance to make their questions distinct"""
+    return render("mcq", items=num_questions, version=version, key=topic, topic=topic, n=num_questions,
+                  guidance=f"\n{guidance}" if guidance else "")
+
+
+def lesson_plan_prompt(topic, duration="60 minutes", level=None, version=None) -> Prompt:
+    """Lesson plan prompt; level adds "for <level> learners" to the request"""
+    return render("lesson_plan", items=LESSON_PLAN_SECTIONS, version=version, key=topic, topic=topic,
+                  duration=duration, audience=f" for {level} learners" if level else "")
+
+
+def request_tokens(prompt):
+    """Tokens a request can consume: the counted prompt plus its max_tokens budget (for rate limiters)"""
+    return count_tokens(prompt) + (getattr(prompt, "max_tokens", None) or 0)
+
+
+def lesson_outline_prompt(topic, duration="60 minutes", level=None, version=None) -> Prompt:
+    """Prompt for the outline of an outline-first lesson plan: objectives and section titles/durations"""
+    return render("lesson_outline", version=version, key=topic, topic=topic, duration=duration,
+                  audience=f" for {level} learners" if level else "")
+
+
+def lesson_section_prompt(outline, index, level=None, guidance=None, version=None) -> Prompt:
+    """Prompt for section `index` of an outline; guidance steers a regenerated section"""
+    sections = outline["sections"]
+    return render("lesson_section", version=version, key=outline["topic"], topic=outline["topic"],
+                  duration=outline.get("duration") or "60 minutes", audience=f" for {level} learners" if level else "",
+                  number=index + 1, count=len(sections), title=sections[index]["title"],
+                  section_duration=sections[index].get("duration") or "any length",
+                  objectives="; ".join(outline.get("objectives") or []) or "none given",
+                  others="; ".join(section["title"] for i, section in enumerate(sections) if i != index) or "none",
+                  guidance=f"\n{guidance}" if guidance else "")
+
+
+# ----------------------------------------------------------------------
+# A/B reporting
+# ----------------------------------------------------------------------
+
+_stats_lock = threading.Lock()
+_stats: Dict[str, Dict[str, float]] = {}
+
+
+def record_call(prompt, seconds, usage=None, truncated=False):
+    """
+    Record one upstream call made with a registry prompt: input tokens (as reported
+    by the provider, else counted locally), output tokens and latency. Replies cut
+    off at max_tokens are counted, since they mean a budget is too tight.
+    """
+    template = getattr(prompt, "template", None)
+    if template is None:
+        return
+    tokens = {}
+    for kind in ("prompt", "completion"):
+        value = usage.get(f"{kind}_tokens") if isinstance(usage, dict) else getattr(usage, f"{kind}_tokens", None)
+        tokens[kind] = value if isinstance(value, int) else None
+    if tokens["prompt"] is None:
+        tokens["prompt"] = count_tokens(prompt)
+    with _stats_lock:
+        stats = _stats.setdefault(template, {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0,
+                                             "seconds": 0.0, "truncated": 0})
+        stats["calls"] += 1
+        stats["prompt_tokens"] += tokens["prompt"]
+        stats["completion_tokens"] += tokens["completion"] or 0
+        stats["seconds"] += seconds
+        stats["truncated"] += bool(truncated)
+    if METRICS_ENABLED:
+        metrics.inc("educhain_prompt_tokens_total", tokens["prompt"],
+                    help="Input tokens sent per prompt template", template=template)
+        metrics.observe("educhain_prompt_latency_seconds", seconds,
+                        help="Upstream latency per prompt template", template=template)
+        if truncated:
+            metrics.inc("educhain_prompt_truncated_total", help="Replies cut off at the max_tokens budget",
+                        template=template)
+
+
+def ab_report() -> Dict[str, Any]:
+    """
+    Per task: average input tokens, output tokens and latency of each template
+    version that served traffic, and each version's savings against the oldest
+    one (the baseline) as fractions, e.g. 0.4 = 40% fewer input tokens.
+    """
+    with _stats_lock:
+        snapshot = {template: dict(stats) for template, stats in _stats.items()}
+    report = {}
+    for task, versions in TEMPLATES.items():
+        rows = {}
+        for version, template in versions.items():
+            stats = snapshot.get(template.id)
+            if not stats or not stats["calls"]:
+                continue
+            calls = stats["calls"]
+            rows[version] = {"calls": calls, "truncated": stats["truncated"],
+                             "avg_prompt_tokens": round(stats["prompt_tokens"] / calls, 1),
+                             "avg_completion_tokens": round(stats["completion_tokens"] / calls, 1),
+                             "avg_seconds": round(stats["seconds"] / calls, 4)}
+        if not rows:
+            continue
+        baseline = min(rows, key=lambda v: (len(v), v))
+        base = rows[baseline]
+        for version, row in rows.items():
+            if version != baseline:
+                row["prompt_token_savings"] = _savings(base["avg_prompt_tokens"], row["avg_prompt_tokens"])
+                row["latency_savings"] = _savings(base["avg_seconds"], row["avg_seconds"])
+        report[task] = {"baseline": baseline, "serving": select_version(task).version, "versions": rows}
+    return report
+
+
+def _savings(before, after):
+    return round(1 - after / before, 3) if before else 0.0
+
+
+def compare_templates(topic="photosynthesis", num_questions=10):
+    """Input tokens and max_tokens of every template version for a sample request"""
+    samples = {"mcq": dict(items=num_questions, topic=topic, n=num_questions, guidance=""),
+               "lesson_plan": dict(items=LESSON_PLAN_SECTIONS, topic=topic, duration="60 minutes", audience=""),
+               "lesson_outline": dict(topic=topic, duration="60 minutes", audience=""),
+               "lesson_section": dict(topic=topic, duration="60 minutes", audience="", number=1, count=4,
+                                      title="Introduction", section_duration="10 minutes",
+                                      objectives="Explain the light reactions", others="Practice; Review",
+                                      guidance=""),
+               "lesson_plan_patch": dict(items=1, topic=topic, duration="60 minutes", spec=minify_json(
+                   {"assessment": "string"}), sections="")}
+    rows = []
+    for task, versions in TEMPLATES.items():
+        for version, template in sorted(versions.items()):
+            prompt = template.render(**samples.get(task, {}))
+            rows.append({"template": template.id, "input_tokens": count_tokens(prompt), "characters": len(prompt),
+                         "max_tokens": prompt.max_tokens, "description": template.description})
+    return rows
+
+
+if __name__ == "__main__":
+    for row in compare_templates():
+        print(f"{row['template']:<22} {row['input_tokens']:>5} input tokens {row['characters']:>6} chars "
+              f"max_tokens {row['max_tokens']:>5}  {row['description']}")
@@ -0,0 +1,235 @@
+# question_bank.py — Append-only SQLite bank of every generated question, indexed by topic and difficulty
+
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from typing import Dict, Any
+
+from sharding import iter_sharded_questions, question_key
+
+DEFAULT_BANK_PATH = os.getenv("EDUCHAIN_BANK_DB", "educhain_bank.sqlite3")
+
+
+def normalize_topic(topic):
+    """
+    Lowercase the topic and keep only its words, so 'Python  basics' and 'python basics!' match.
+    A trailing "+" or "#" stays part of the word, so 'C++' and 'C#' are not banked as 'C'.
+    """
+    return " ".join(re.findall(r"\w+[+#]*", str(topic).lower()))
+
+
+class QuestionBank:
+    """
+    Stores generated questions with their topic, difficulty, model and timestamp, and
+    the near-duplicate source (cache key of the prompt) they came from. Rows are only
+    ever appended; an exact repeat of a stored question for the same topic is ignored.
+    Reads go through the (topic, difficulty) index.
+    """
+
+    def __init__(self, db_path=DEFAULT_BANK_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS questions ("
+            " id INTEGER PRIMARY KEY,"
+            " topic_key TEXT NOT NULL,"
+            " topic TEXT NOT NULL,"
+            " difficulty TEXT,"
+            " model TEXT,"
+            " created_at REAL NOT NULL,"
+            " question_key TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " UNIQUE (topic_key, question_key));"
+            "CREATE INDEX IF NOT EXISTS questions_topic_difficulty ON questions (topic_key, difficulty);"
+            # (topic_key, rowid) order, so iter_questions pages through topics without sorting
+            "CREATE INDEX IF NOT EXISTS questions_topic ON questions (topic_key);"
+        )
+        # Banks created before sources were stored get the column added
+        if "source" not in [row[1] for row in self._db.execute("PRAGMA table_info(questions)")]:
+            self._db.execute("ALTER TABLE questions ADD COLUMN source TEXT")
+        self._db.commit()
+
+    def add_questions(self, topic, questions, model=None, difficulty=None, source=None):
+        """
+        Append question dicts for topic; returns how many were new.
+        Each question's own "difficulty" field wins over the difficulty argument.
+        """
+        now = time.time()
+        rows = []
+        for question in questions or []:
+            key = question_key(question)
+            if key is None:
+                continue
+            level = question.get("difficulty") or difficulty
+            rows.append((normalize_topic(topic), topic, level.lower() if isinstance(level, str) else None,
+                         model, now, key, json.dumps(question, ensure_ascii=False), source))
+        if not rows:
+            return 0
+        with self._lock:
+            before = self._db.total_changes
+            self._db.executemany(
+                "INSERT OR IGNORE INTO questions"
+                " (topic_key, topic, difficulty, model, created_at, question_key, data, source)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self._db.commit()
+            return self._db.total_changes - before
+
+    def add_quiz(self, quiz, model=None, topic=None, source=None):
+        """Store every question of a {"topic", "questions"} dict; anything else is ignored"""
+        if not isinstance(quiz, dict) or not isinstance(quiz.get("questions"), list):
+            return 0
+        return self.add_questions(topic or quiz.get("topic") or "", quiz["questions"], model=model, source=source)
+
+    def sample(self, topic, count, difficulty=None):
+        """Return up to count stored questions for topic (optionally one difficulty) in random order"""
+        query = "SELECT data FROM questions WHERE topic_key = ?"
+        params = [normalize_topic(topic)]
+        if difficulty:
+            query += " AND difficulty = ?"
+            params.append(difficulty.lower())
+        query += " ORDER BY RANDOM() LIMIT ?"
+        params.append(int(count))
+        with self._lock:
+            rows = self._db.execute(query, params).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def iter_questions(self, topic=None, difficulty=None, page_size=500):
+        """
+        Yield every stored question (optionally one topic/difficulty) grouped by topic, in
+        insertion order within a topic. Each question dict gets its "topic" if it has none.
+        Reads one page at a time, so memory stays flat however large the bank is.
+        """
+        query = "SELECT id, topic_key, topic, data FROM questions WHERE (topic_key, id) > (?, ?)"
+        params = []
+        if topic is not None:
+            query += " AND topic_key = ?"
+            params.append(normalize_topic(topic))
+        if difficulty:
+            query += " AND difficulty = ?"
+            params.append(difficulty.lower())
+        query += " ORDER BY topic_key, id LIMIT ?"
+        after = ("", 0)
+        while True:
+            with self._lock:
+                rows = self._db.execute(query, [*after, *params, int(page_size)]).fetchall()
+            for _, _, stored_topic, data in rows:
+                question = json.loads(data)
+                question.setdefault("topic", stored_topic)
+                yield question
+            if len(rows) < page_size:
+                return
+            after = (rows[-1][1], rows[-1][0])
+
+    def iter_texts(self, page_size=1000):
+        """Yield (question text, source) for every stored question, one page at a time"""
+        after = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT id, json_extract(data, '$.question'), source FROM questions WHERE id > ? ORDER BY id LIMIT ?",
+                    (after, int(page_size))
+                ).fetchall()
+            for _, text, source in rows:
+                if isinstance(text, str):
+                    yield text, source
+            if len(rows) < page_size:
+                return
+            after = rows[-1][0]
+
+    def count(self, topic=None, difficulty=None):
+        """Number of stored questions, overall or for one topic/difficulty"""
+        query, params = "SELECT COUNT(*) FROM questions", []
+        if topic is not None:
+            query += " WHERE topic_key = ?"
+            params.append(normalize_topic(topic))
+            if difficulty:
+                query += " AND difficulty = ?"
+                params.append(difficulty.lower())
+        with self._lock:
+            return self._db.execute(query, params).fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Return the number of stored questions and topics"""
+        with self._lock:
+            questions, topics = self._db.execute(
+                "SELECT COUNT(*), COUNT(DISTINCT topic_key) FROM questions"
+            ).fetchone()
+        return {"questions": questions, "topics": topics}
+
+
+def iter_bank_questions(bank, topic, num_questions, generate_shard, model=None, difficulty=None, **kwargs):
+    """
+    Yield num_questions questions for topic: stored ones first, then newly generated
+    ones for the shortfall only (generate_shard as in sharding.iter_sharded_questions).
+    Generated questions are added to the bank as they arrive. With a difficulty, the
+    shards are asked for that level and only questions reporting it are yielded; the
+    others are banked under their own level and the shortfall is topped up.
+    """
+    stored = bank.sample(topic, num_questions, difficulty=difficulty)
+    yield from stored
+
+    shortfall = num_questions - len(stored)
+    if shortfall <= 0:
+        return
+    avoid = [question["question"] for question in stored if isinstance(question.get("question"), str)]
+    if difficulty:
+        generate_shard = _difficulty_shards(bank, topic, generate_shard, difficulty.lower(), model)
+    for question in iter_sharded_questions(generate_shard, shortfall, avoid=avoid, **kwargs):
+        bank.add_questions(topic, [question], model=model)
+        yield question
+
+
+def _difficulty_shards(bank, topic, generate_shard, difficulty, model=None):
+    # Adds the level to every shard's hint (quoted by shard_guidance) and filters the replies
+    def generate(shard, avoid):
+        hint = f"{shard['hint']} Every question must be {difficulty} (\"difficulty\": \"{difficulty}\")."
+        result = generate_shard(dict(shard, hint=hint), avoid)
+        if not isinstance(result, dict):
+            return result
+        questions = result.get("questions")
+        matching, other = [], []
+        for question in questions or []:
+            level = question.get("difficulty") if isinstance(question, dict) else None
+            (matching if isinstance(level, str) and level.lower() == difficulty else other).append(question)
+        bank.add_questions(topic, other, model=model)  # Kept for other levels, not served for this one
+        return dict(result, questions=matching)
+    return generate
+
+
+def serve_from_bank(bank, topic, num_questions, generate_shard, model=None, difficulty=None, **kwargs):
+    """Build a {"topic", "questions"} quiz from the bank, calling the LLM only for the shortfall"""
+    questions = list(iter_bank_questions(bank, topic, num_questions, generate_shard,
+                                         model=model, difficulty=difficulty, **kwargs))
+    if not questions:
+        raise RuntimeError(f"No stored or generated questions for topic '{topic}'")
+    return {"topic": topic, "questions": questions}
+
+
+def fallback_quiz(bank, topic, num_questions, difficulty=None):
+    """
+    Stored questions for topic as a {"topic", "questions"} quiz, or None if there are none.
+    Used when the LLM upstream is failing, so callers degrade to banked content.
+    """
+    questions = bank.sample(topic, num_questions, difficulty=difficulty)
+    if not questions:
+        return None
+    return {"topic": topic, "questions": questions, "from_bank_fallback": True}
+
+
+_default_bank = None
+_default_bank_lock = threading.Lock()
+
+
+def get_default_bank() -> QuestionBank:
+    """Return the process-wide question bank, creating it on first use"""
+    global _default_bank
+    with _default_bank_lock:
+        if _default_bank is None:
+            _default_bank = QuestionBank()
+        return _default_bank
@@ -0,0 +1,247 @@
+# resilience.py — Deadline-aware retries, hedged requests and a circuit breaker around LLM completion calls
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED, TimeoutError as FutureTimeout
+from types import SimpleNamespace
+from typing import Dict, Any
+
+from batching import rate_limit_delay
+
+# Defaults, overridable through the .env file
+DEFAULT_DEADLINE = float(os.getenv("EDUCHAIN_DEADLINE", "45"))  # Seconds per request, retries included
+DEFAULT_MAX_RETRIES = int(os.getenv("EDUCHAIN_MAX_RETRIES", "3"))
+DEFAULT_HEDGE = os.getenv("EDUCHAIN_HEDGE", "0").lower() in ("1", "true", "yes")
+DEFAULT_BREAKER_FAILURES = int(os.getenv("EDUCHAIN_BREAKER_FAILURES", "5"))
+DEFAULT_BREAKER_RESET = float(os.getenv("EDUCHAIN_BREAKER_RESET", "30"))
+
+# Exception class names the Groq SDK uses for network problems (it is imported lazily elsewhere)
+_TRANSIENT_ERRORS = {"APIConnectionError", "APITimeoutError", "InternalServerError"}
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling upstream while the circuit breaker is open"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """Raised when a request (including its retries) runs out of its time budget"""
+
+
+def retry_delay(error, attempt, base_delay=0.5, max_delay=20.0):
+    """
+    How long to wait before retrying after `error`, or None if it should not be retried.
+    429s honour Retry-After; 5xx and network errors use jittered exponential backoff.
+    """
+    delay = rate_limit_delay(error, attempt, base_delay=base_delay, max_delay=max_delay)
+    if delay is not None:
+        return delay
+    status = getattr(error, "status_code", None)
+    transient = (
+        (isinstance(status, int) and status >= 500)
+        or isinstance(error, (TimeoutError, ConnectionError))
+        or type(error).__name__ in _TRANSIENT_ERRORS
+    )
+    if not transient or isinstance(error, (CircuitOpenError, DeadlineExceeded)):
+        return None
+    return min(max_delay, base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive upstream failures and fails fast for
+    `reset_timeout` seconds; then lets a single trial request through (half-open)
+    and closes again if it succeeds.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_BREAKER_FAILURES, reset_timeout=DEFAULT_BREAKER_RESET):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a request may go upstream now"""
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def is_open(self):
+        """Return True while failing fast, i.e. open and not yet due for a trial request"""
+        with self._lock:
+            return self.state == "open" and time.monotonic() - self._opened_at < self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def release(self):
+        """Free the trial slot without a verdict, after errors that say nothing about upstream health"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                self.state = "open"
+                self._opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Sliding window of recent successful call latencies, used to time hedged requests"""
+
+    def __init__(self, window=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct):
+        """Latency at the given percentile, or None until enough samples were seen"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ResilientClient:
+    """
+    Wraps an LLM client with the same client.chat.completions.create interface.
+    Each request gets a deadline budget shared by its retries; transient failures are
+    retried with jittered backoff (honouring Retry-After); non-streaming requests can
+    be hedged with a duplicate after the recent p95 latency; and a circuit breaker
+    fails fast with CircuitOpenError while upstream keeps failing.
+    """
+
+    def __init__(self, client, deadline=DEFAULT_DEADLINE, max_retries=DEFAULT_MAX_RETRIES, hedge=DEFAULT_HEDGE,
+                 hedge_percentile=95, breaker=None, max_workers=16):
+        self.inner = client
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge") if hedge else None
+
+        # Same call shape as groq.Groq: client.chat.completions.create(...)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "hedged": 0, "hedge_wins": 0,
+                          "failures": 0, "short_circuited": 0, "deadline_exceeded": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def create(self, deadline=None, **request):
+        """Same arguments as client.chat.completions.create, plus an optional deadline in seconds"""
+        self._count("requests")
+        expires = time.monotonic() + (deadline or self.deadline)
+        for attempt in range(self.max_retries + 1):
+            # Deadline first: allow() may hand out the half-open trial slot, which must then be used
+            remaining = expires - time.monotonic()
+            if remaining <= 0:
+                self._count("deadline_exceeded")
+                raise DeadlineExceeded("LLM request deadline exceeded")
+            if not self.breaker.allow():
+                self._count("short_circuited")
+                raise CircuitOpenError("LLM upstream is unhealthy; failing fast")
+            try:
+                if self.hedge and not request.get("stream"):
+                    result = self._hedged(request, remaining)
+                else:
+                    result = self._attempt(request, remaining)
+                self.breaker.record_success()
+                return result
+            except DeadlineExceeded:
+                self.breaker.record_failure()
+                self._count("deadline_exceeded")
+                raise
+            except BaseException as e:
+                if not isinstance(e, Exception):
+                    self.breaker.release()  # Interrupted (e.g. Ctrl+C) before a verdict
+                    raise
+                delay = retry_delay(e, attempt)
+                if delay is None or rate_limit_delay(e, attempt) is not None:
+                    # Client-side errors (bad request, auth) and 429s ("slow down") are not upstream
+                    # health problems: they neither open the breaker nor keep a half-open trial slot
+                    self.breaker.release()
+                    if delay is None:
+                        raise
+                else:
+                    self.breaker.record_failure()
+                if attempt == self.max_retries or time.monotonic() + delay >= expires:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+
+    def _attempt(self, request, timeout):
+        # One upstream call; the remaining budget becomes the SDK's own timeout
+        started = time.monotonic()
+        result = self.inner.chat.completions.create(timeout=timeout, **request)
+        if not request.get("stream"):
+            self.latency.record(time.monotonic() - started)
+        return result
+
+    def _hedged(self, request, timeout):
+        # Send a duplicate if the first call is slower than the recent p95, and keep whichever finishes first
+        started = time.monotonic()
+        primary = self._pool.submit(self._attempt, request, timeout)
+        delay = self.latency.percentile(self.hedge_percentile)
+        if delay is None or delay >= timeout:
+            try:
+                return primary.result(timeout=timeout)
+            except FutureTimeout:
+                raise DeadlineExceeded("LLM request deadline exceeded")
+
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        self._count("hedged")
+        backup = self._pool.submit(self._attempt, request, timeout - delay)
+        pending, error = {primary, backup}, None
+        while pending:
+            done, pending = wait(pending, timeout=timeout - (time.monotonic() - started), return_when=FIRST_COMPLETED)
+            if not done:
+                raise DeadlineExceeded("LLM request deadline exceeded")
+            for future in done:
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                if future is backup:
+                    self._count("hedge_wins")
+                return result
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        """Return retry, hedging and circuit breaker counters"""
+        with self._lock:
+            stats = dict(self._counters)
+        stats["breaker_state"] = self.breaker.state
+        p95 = self.latency.percentile(95)
+        stats["p95_ms"] = p95 * 1000 if p95 is not None else None
+        return stats
@@ -0,0 +1,377 @@
+# schema.py — Compiled validators for the quiz and lesson-plan shapes, with local repair of common model mistakes
+
+import re
+import json
+
+from metrics import span
+from prompts import render, minify_json
+
+# Field specs use the same vocabulary as tool parameters in mcp.py ("type", "default"), plus
+# "aliases" (other keys the model uses for the field), "items" (array element rule),
+# "fields" (nested object spec) and "min_items"
+QUESTION_SCHEMA = {
+    "question": {"type": "string", "aliases": ["text", "prompt", "q"]},
+    "options": {"type": "array", "items": {"type": "string"}, "min_items": 2,
+                "aliases": ["choices", "answers", "answer_options"]},
+    "correct_answer": {"type": "string", "aliases": ["answer", "correct", "correct_option", "correctAnswer"]},
+    "explanation": {"type": "string", "default": "", "aliases": ["rationale", "reason", "explanations"]},
+}
+
+MCQ_SCHEMA = {
+    "topic": {"type": "string", "default": ""},
+    "questions": {"type": "array", "items": {"type": "object", "fields": QUESTION_SCHEMA},
+                  "aliases": ["mcqs", "items", "quiz"]},
+}
+
+SECTION_SCHEMA = {
+    "title": {"type": "string", "aliases": ["name", "heading", "section"]},
+    "content": {"type": "string", "aliases": ["description", "summary", "key_points"]},
+    "duration": {"type": "string", "default": "", "aliases": ["time", "length"]},
+    "activities": {"type": "array", "items": {"type": "string"}, "default": [], "aliases": ["activity"]},
+}
+
+LESSON_PLAN_SCHEMA = {
+    "topic": {"type": "string", "default": ""},
+    "duration": {"type": "string", "default": "", "aliases": ["total_duration"]},
+    "objectives": {"type": "array", "items": {"type": "string"}, "min_items": 1,
+                   "aliases": ["learning_objectives", "goals", "learning_goals"]},
+    "sections": {"type": "array", "items": {"type": "object", "fields": SECTION_SCHEMA}, "min_items": 1,
+                 "aliases": ["lesson_sections", "structure", "lesson_structure"]},
+    "assessment": {"type": "string", "aliases": ["assessment_method", "evaluation", "assessments"]},
+    "resources": {"type": "array", "items": {"type": "string"}, "default": []},
+}
+
+# Option labels the model uses instead of the option text ("B", "b)", "Option B", "(B)")
+_OPTION_LETTER = re.compile(r"^\(?(?:option\s+)?([a-h])[\).:]?$", re.IGNORECASE)
+_OPTION_PREFIX = re.compile(r"^\(?[a-h][\).:]\s+", re.IGNORECASE)
+
+
+def _compile(rule):
+    """Turn one field rule into (check, normalize) closures, compiled once per schema"""
+    kind = rule.get("type")
+
+    if kind == "object":
+        return _compile_object(rule.get("fields", {}))
+
+    if kind == "array":
+        check_item, normalize_item = _compile(rule.get("items", {}))
+        min_items = rule.get("min_items", 0)
+
+        def check(value, path):
+            if not isinstance(value, list):
+                return [f"{path} must be an array"]
+            errors = [] if len(value) >= min_items else [f"{path} needs at least {min_items} item(s)"]
+            for i, item in enumerate(value):
+                errors.extend(check_item(item, f"{path}[{i}]"))
+            return errors
+
+        def normalize(value):
+            # Accept {"A": ..., "B": ...} maps and single values where a list is expected
+            if isinstance(value, dict) and rule.get("items", {}).get("type") != "object":
+                value = list(value.values())
+            elif not isinstance(value, list):
+                value = [value]
+            return [normalize_item(item) for item in value if item not in (None, "")]
+
+        return check, normalize
+
+    if kind == "string":
+        def check(value, path):
+            if not isinstance(value, str) or not value.strip():
+                return [f"{path} must be a non-empty string"]
+            return []
+
+        def normalize(value):
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                return str(value)
+            if isinstance(value, dict):
+                # e.g. {"type": "Quiz", "description": "..."} -> "Quiz: ..."
+                return ": ".join(str(v) for v in value.values() if v not in (None, ""))
+            if isinstance(value, list):
+                return "; ".join(str(v) for v in value if v not in (None, ""))
+            return value.strip() if isinstance(value, str) else value
+
+        return check, normalize
+
+    return (lambda value, path: []), (lambda value: value)
+
+
+def _compile_object(fields, compiled=None):
+    compiled = compiled if compiled is not None else {}
+    compiled.update({name: (rule, *_compile(rule)) for name, rule in fields.items()})
+    # Lowercased alias -> canonical field name, so the lookup is a single dict access per key
+    aliases = {}
+    for name, rule in fields.items():
+        for alias in [name] + rule.get("aliases", []):
+            aliases[alias.lower()] = name
+
+    def check(value, path):
+        if not isinstance(value, dict):
+            return [f"{path or 'document'} must be an object"]
+        errors = []
+        for name, (rule, check_field, _) in compiled.items():
+            field_path = f"{path}.{name}" if path else name
+            if name not in value:
+                if "default" not in rule:
+                    errors.append(f"missing {field_path}")
+                continue
+            # Optional fields may keep their (possibly empty) default
+            if "default" in rule and value[name] == rule["default"]:
+                continue
+            errors.extend(check_field(value[name], field_path))
+        return errors
+
+    def normalize(value):
+        if not isinstance(value, dict):
+            return value
+        result = {}
+        for key, item in value.items():
+            name = aliases.get(str(key).lower(), key)
+            # The canonical key wins over an alias when the model sent both
+            if name in result and name != key:
+                continue
+            result[name] = item
+        for name, (rule, _, normalize_field) in compiled.items():
+            if name in result and result[name] is not None:
+                result[name] = normalize_field(result[name])
+            elif "default" in rule:
+                result[name] = json.loads(json.dumps(rule["default"]))  # Fresh copy of mutable defaults
+        return result
+
+    return check, normalize
+
+
+class Schema:
+    """A compiled field spec: errors() validates, normalize() applies aliases, coercions and defaults"""
+
+    def __init__(self, fields):
+        self.fields = fields
+        self._fields = {}  # name -> (rule, check, normalize), filled in by _compile_object
+        self._check, self._normalize = _compile_object(fields, self._fields)
+
+    def errors(self, value):
+        """Return a list of human-readable problems (empty when the value is valid)"""
+        return self._check(value, "")
+
+    def invalid_fields(self, value):
+        """Names of top-level fields that are missing (without a default) or invalid"""
+        value = value if isinstance(value, dict) else {}
+        return [name for name, (rule, check, _) in self._fields.items()
+                if (name not in value and "default" not in rule)
+                or (name in value and value[name] != rule.get("default") and check(value[name], name))]
+
+    def field_is_valid(self, name, value):
+        return not self._fields[name][1](value, name)
+
+    def is_valid(self, value):
+        return not self._check(value, "")
+
+    def normalize(self, value):
+        return self._normalize(value)
+
+
+QUESTION = Schema(QUESTION_SCHEMA)
+MCQS = Schema(MCQ_SCHEMA)
+SECTION = Schema(SECTION_SCHEMA)
+LESSON_PLAN = Schema(LESSON_PLAN_SCHEMA)
+
+
+def extract_json(content):
+    """Parse the JSON object in a raw reply (e.g. wrapped in prose or a ``` fence); None if there is none"""
+    if isinstance(content, dict):
+        return content
+    if not isinstance(content, str):
+        return None
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        return json.loads(content[start:end + 1])
+    except ValueError:
+        return None
+
+
+def _unwrap(data):
+    # {"content": raw} is what callers return when the reply was not valid JSON
+    if isinstance(data, dict) and set(data) == {"content"}:
+        return extract_json(data["content"])
+    return extract_json(data)
+
+
+def _resolve_correct_answer(question):
+    # Map an option letter (or a differently prefixed/cased copy of an option) onto the option text
+    options, answer = question.get("options"), question.get("correct_answer")
+    if not isinstance(options, list) or not isinstance(answer, str) or answer in options:
+        return
+    letter = _OPTION_LETTER.match(answer.strip())
+    if letter:
+        index = ord(letter.group(1).lower()) - ord("a")
+        if index < len(options):
+            question["correct_answer"] = options[index]
+            return
+    wanted = _OPTION_PREFIX.sub("", answer).strip().lower()
+    for option in options:
+        if isinstance(option, str) and _OPTION_PREFIX.sub("", option).strip().lower() == wanted:
+            question["correct_answer"] = option
+            return
+
+
+def repair_question(question):
+    """Return the repaired question dict, or None if it cannot be fixed locally"""
+    question = QUESTION.normalize(question)
+    if not isinstance(question, dict):
+        return None
+    _resolve_correct_answer(question)
+    if QUESTION.errors(question) or question["correct_answer"] not in question["options"]:
+        return None
+    return question
+
+
+def repair_mcqs(data, topic=None):
+    """
+    Repair a quiz locally. Returns (quiz, invalid) where quiz is a {"topic", "questions"}
+    dict holding only valid questions and invalid is how many had to be dropped;
+    callers re-request just that many (plus any the model left out).
+    """
+    with span("parse"):
+        data = _unwrap(data)
+    with span("validate"):
+        if isinstance(data, list):
+            data = {"questions": data}
+        quiz = MCQS.normalize(data) if isinstance(data, dict) else {}
+        questions = quiz.get("questions") if isinstance(quiz.get("questions"), list) else []
+        repaired = [repair_question(question) for question in questions]
+        valid = [question for question in repaired if question is not None]
+        quiz = dict(quiz, topic=quiz.get("topic") or topic or "", questions=valid)
+    return quiz, len(repaired) - len(valid)
+
+
+def repair_lesson_plan(data, topic=None):
+    """
+    Repair a lesson plan locally. Returns (plan, missing) where missing lists the
+    top-level fields still absent or invalid and the indices of invalid sections.
+    """
+    with span("parse"):
+        data = _unwrap(data)
+    with span("validate"):
+        plan = LESSON_PLAN.normalize(data) if isinstance(data, dict) else {}
+        plan["topic"] = plan.get("topic") or topic or ""
+
+        sections = plan.get("sections") if isinstance(plan.get("sections"), list) else []
+        plan["sections"] = sections
+        bad_sections = [i for i, section in enumerate(sections) if not SECTION.is_valid(section)]
+        # Invalid sections are re-requested one by one, so "sections" only counts as missing when empty
+        bad_fields = [name for name in LESSON_PLAN.invalid_fields(plan) if name != "sections" or not sections]
+    return plan, {"fields": bad_fields, "sections": bad_sections}
+
+
+def repair_outline(data, topic=None, duration=None):
+    """
+    Repair a lesson plan outline (sections with a title and duration but no content yet).
+    Sections without a title are dropped; returns the outline with the same keys as a plan.
+    """
+    with span("parse"):
+        data = _unwrap(data)
+    with span("validate"):
+        outline = LESSON_PLAN.normalize(data) if isinstance(data, dict) else {}
+        outline["topic"] = outline.get("topic") or topic or ""
+        outline["duration"] = outline.get("duration") or duration or ""
+        sections = outline.get("sections") if isinstance(outline.get("sections"), list) else []
+        outline["sections"] = [
+            {"title": section["title"].strip(),
+             "duration": section["duration"] if isinstance(section.get("duration"), str) else ""}
+            for section in sections
+            if isinstance(section, dict) and isinstance(section.get("title"), str) and section["title"].strip()
+        ]
+    return outline
+
+
+def repair_section(data, title=None, duration=None):
+    """
+    Repair a single section reply, also when it is wrapped as {"section": {...}}.
+    The outline's title and duration take precedence so the plan stays consistent.
+    Returns None if the section cannot be fixed locally.
+    """
+    with span("parse"):
+        data = _unwrap(data)
+    with span("validate"):
+        if isinstance(data, dict) and len(data) == 1 and isinstance(next(iter(data.values())), dict):
+            data = next(iter(data.values()))
+        section = SECTION.normalize(data) if isinstance(data, dict) else None
+        if not isinstance(section, dict):
+            return None
+        if title:
+            section["title"] = title
+        if duration:
+            section["duration"] = duration
+        return section if SECTION.is_valid(section) else None
+
+
+def lesson_plan_patch_prompt(plan, missing):
+    """Prompt that asks the model for only the missing fields and the invalid sections"""
+    spec = {}
+    for field in missing["fields"]:
+        if field == "sections":
+            continue
+        spec[field] = ["string"] if LESSON_PLAN_SCHEMA[field]["type"] == "array" else "string"
+    titles = [plan["sections"][i].get("title") if isinstance(plan["sections"][i], dict) else None
+              for i in missing["sections"]]
+    count = len(titles) or (3 if "sections" in missing["fields"] else 0)
+    if count:
+        spec["sections"] = [{"title": "string", "content": "string", "duration": "string", "activities": ["string"]}]
+    existing = [section["title"] for i, section in enumerate(plan["sections"])
+                if i not in missing["sections"] and isinstance(section, dict) and isinstance(section.get("title"), str)]
+
+    sections = ""
+    if count:
+        sections = f" Write exactly {count} section(s)"
+        named = [title for title in titles if title]
+        if named:
+            sections += f" with these titles: {', '.join(named)}"
+        if existing:
+            sections += f". The plan already has these sections: {', '.join(existing)}"
+        sections += "."
+    return render("lesson_plan_patch", items=count, key=plan["topic"], topic=plan["topic"],
+                  duration=plan.get("duration") or "any duration", spec=minify_json(spec), sections=sections)
+
+
+def merge_lesson_plan_patch(plan, missing, patch):
+    """Fill the missing fields and replace the invalid sections of plan from a patch reply"""
+    patch = LESSON_PLAN.normalize(_unwrap(patch) or {})
+    for field in missing["fields"]:
+        if field != "sections" and field in patch and LESSON_PLAN.field_is_valid(field, patch[field]):
+            plan[field] = patch[field]
+    new_sections = [section for section in patch.get("sections", []) if SECTION.is_valid(section)]
+    sections = list(plan["sections"])
+    for i in missing["sections"]:
+        if new_sections:
+            sections[i] = new_sections.pop(0)
+    if "sections" in missing["fields"]:
+        sections.extend(new_sections)
+    # Sections that could not be replaced are dropped rather than shown broken
+    plan["sections"] = [section for section in sections if SECTION.is_valid(section)]
+    return plan
+
+
+def complete_lesson_plan(data, topic, request_json, max_rounds=1):
+    """
+    Repair a lesson plan, re-requesting only what is still missing or invalid.
+    request_json(prompt) returns the parsed reply (or raises). Whatever is still
+    missing afterwards is filled with empty values so formatters never fail.
+    """
+    plan, missing = repair_lesson_plan(data, topic)
+    for _ in range(max_rounds):
+        if not missing["fields"] and not missing["sections"]:
+            break
+        try:
+            patch = request_json(lesson_plan_patch_prompt(plan, missing))
+        except Exception as e:
+            print(f"Lesson plan repair failed: {e}")
+            break
+        plan = merge_lesson_plan_patch(plan, missing, patch)
+        plan, missing = repair_lesson_plan(plan, topic)
+
+    for field in missing["fields"]:
+        plan[field] = [] if LESSON_PLAN_SCHEMA[field]["type"] == "array" else ""
+    plan["sections"] = [section for section in plan["sections"] if SECTION.is_valid(section)]
+    return plan
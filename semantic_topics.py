@@ -0,0 +1,206 @@
+# semantic_topics.py — Maps differently worded topics onto one already generated, so the response cache is hit
+#
+# "Python basics", "python programming basics" and "Intro to Python" produce different prompts and
+# therefore different cache keys. Each topic is turned into a hashed, L2-normalized vector of its
+# content words and their character trigrams; an inverted index over the hashed features finds the
+# most similar earlier topic (exact cosine similarity) without comparing against every entry.
+
+import os
+import re
+import math
+import zlib
+import sqlite3
+import threading
+from typing import Dict, Any, Optional, Tuple
+
+# Defaults, overridable through the .env file
+DEFAULT_SEMANTIC_THRESHOLD = float(os.getenv("EDUCHAIN_SEMANTIC_THRESHOLD", "0.85"))  # Cosine similarity for a match
+SEMANTIC_ENABLED = os.getenv("EDUCHAIN_SEMANTIC_CACHE", "1").lower() in ("1", "true", "yes")
+DEFAULT_TOPICS_DB = os.getenv("EDUCHAIN_CACHE_DB", "educhain_cache.sqlite3")  # Shares the response cache's file
+
+# Words that say how a topic is taught rather than what it is about
+FILLER_WORDS = frozenset("""
+    a an and the of to in on for with about into from by at
+    intro introduction introductory introducing basic basics fundamental fundamentals essential essentials
+    beginner beginners beginning overview guide course class lesson lessons tutorial primer crash
+    principle principles concept concepts getting started learn understanding 101
+    programming language
+""".split())
+
+# Words keep trailing "+" and "#", so "C++" and "C#" stay different topics from "C"
+WORD = re.compile(r"\w+[+#]*")
+
+DIMENSIONS = 1 << 20  # Hashed feature space; collisions are rare for topic-sized texts
+TRIGRAM_WEIGHT = 0.5  # Trigrams catch typos and word forms ("thermodynamic" ~ "thermodynamics")
+
+
+def topic_words(topic):
+    """Content words of a topic, lowercased and crudely singularized; all words if every one is filler"""
+    words = [word[:-1] if len(word) > 4 and word.endswith("s") and not word.endswith("ss") else word
+             for word in WORD.findall(str(topic).lower())]
+    content = [word for word in words if word not in FILLER_WORDS]
+    return content or words
+
+
+def topic_vector(topic) -> Dict[int, float]:
+    """Sparse L2-normalized vector {feature: weight} of the topic's words and character trigrams"""
+    vector = {}
+    for word in topic_words(topic):
+        features = [(word, 1.0)]
+        padded = f" {word} "
+        features.extend((padded[i:i + 3], TRIGRAM_WEIGHT) for i in range(len(padded) - 2))
+        for feature, weight in features:
+            key = zlib.crc32(feature.encode("utf-8")) % DIMENSIONS
+            vector[key] = vector.get(key, 0.0) + weight
+    norm = math.sqrt(sum(weight * weight for weight in vector.values()))
+    return {key: weight / norm for key, weight in vector.items()} if norm else {}
+
+
+class SemanticTopicIndex:
+    """
+    Topics that content was generated for, per scope (e.g. "mcq:5" or "lesson_plan:60 minutes").
+    resolve() returns the stored topic most similar to an incoming one when the cosine
+    similarity reaches the threshold, and otherwise stores the new topic. Topics are kept
+    in SQLite next to the response cache, so matches survive a restart like cached replies do.
+    """
+
+    def __init__(self, threshold=DEFAULT_SEMANTIC_THRESHOLD, db_path=DEFAULT_TOPICS_DB):
+        self.threshold = threshold
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._topics = []  # entry id -> (scope, topic)
+        self._vectors = []  # entry id -> sparse vector
+        self._exact = {}  # (scope, normalized topic) -> entry id
+        self._postings = {}  # (scope, feature) -> list of entry ids
+        self._counters = {"lookups": 0, "exact_hits": 0, "similar_hits": 0, "misses": 0}
+        self._similarity_sum = 0.0
+
+        # Persistence is optional: pass db_path=None to keep the index in memory only
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS semantic_topics ("
+                             " scope TEXT NOT NULL, topic TEXT NOT NULL, PRIMARY KEY (scope, topic))")
+            self._db.commit()
+            for scope, topic in self._db.execute("SELECT scope, topic FROM semantic_topics ORDER BY rowid"):
+                self._insert(scope, topic)
+
+    @staticmethod
+    def _exact_key(scope, topic):
+        return scope, " ".join(WORD.findall(str(topic).lower()))
+
+    def _insert(self, scope, topic):
+        # Caller holds the lock (or is __init__)
+        exact_key = self._exact_key(scope, topic)
+        if exact_key in self._exact:
+            return self._exact[exact_key]
+        entry_id = len(self._topics)
+        vector = topic_vector(topic)
+        self._topics.append((scope, topic))
+        self._vectors.append(vector)
+        self._exact[exact_key] = entry_id
+        for feature in vector:
+            self._postings.setdefault((scope, feature), []).append(entry_id)
+        return entry_id
+
+    def _best_match(self, scope, vector):
+        # Caller holds the lock; sparse dot products over the postings of the query's features
+        scores = {}
+        for feature, weight in vector.items():
+            for entry_id in self._postings.get((scope, feature), ()):
+                scores[entry_id] = scores.get(entry_id, 0.0) + weight * self._vectors[entry_id][feature]
+        if not scores:
+            return None, 0.0
+        entry_id = max(scores, key=scores.get)
+        return entry_id, scores[entry_id]
+
+    def _lookup(self, scope, topic):
+        # Caller holds the lock; returns (entry id or None, similarity, exact)
+        entry_id = self._exact.get(self._exact_key(scope, topic))
+        if entry_id is not None:
+            return entry_id, 1.0, True
+        entry_id, similarity = self._best_match(scope, topic_vector(topic))
+        if entry_id is None or similarity < self.threshold:
+            return None, similarity, False
+        return entry_id, min(similarity, 1.0), False
+
+    def find(self, topic, scope="") -> Optional[Tuple[str, float]]:
+        """Return (stored topic, similarity) of the best match at or above the threshold, or None"""
+        with self._lock:
+            entry_id, similarity, _ = self._lookup(scope, topic)
+            return None if entry_id is None else (self._topics[entry_id][1], similarity)
+
+    def add(self, topic, scope=""):
+        """Store a topic content was generated for"""
+        with self._lock:
+            self._add(scope, topic)
+
+    def _add(self, scope, topic):
+        # Caller holds the lock
+        count = len(self._topics)
+        self._insert(scope, topic)
+        if self._db is not None and len(self._topics) > count:
+            self._db.execute("INSERT OR IGNORE INTO semantic_topics (scope, topic) VALUES (?, ?)", (scope, topic))
+            self._db.commit()
+
+    def resolve(self, topic, scope="") -> Tuple[str, float]:
+        """
+        Return (topic to generate for, similarity): a stored topic similar enough to this
+        one, or the topic itself (similarity 0.0), which is then stored for later lookups.
+        """
+        with self._lock:
+            self._counters["lookups"] += 1
+            entry_id, similarity, exact = self._lookup(scope, topic)
+            if entry_id is None:
+                self._counters["misses"] += 1
+                self._add(scope, topic)
+                return topic, 0.0
+            if exact:
+                self._counters["exact_hits"] += 1
+            else:
+                self._counters["similar_hits"] += 1
+                self._similarity_sum += similarity
+            return self._topics[entry_id][1], round(similarity, 4)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._topics)
+
+    def stats(self) -> Dict[str, Any]:
+        """Return lookup counters, the similarity-hit rate and the mean similarity of those hits"""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["topics"] = len(self._topics)
+            similarity_sum = self._similarity_sum
+        stats["similar_hit_rate"] = stats["similar_hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["hit_rate"] = (stats["similar_hits"] + stats["exact_hits"]) / stats["lookups"] if stats["lookups"] else 0.0
+        stats["avg_similarity"] = similarity_sum / stats["similar_hits"] if stats["similar_hits"] else 0.0
+        return stats
+
+
+def semantic_topic(index, topic, scope="", fresh=False):
+    """
+    Topic to generate for: the closest earlier topic in scope when semantic matching is on.
+    Fresh variants keep the user's wording, so they are never mapped onto another topic.
+    """
+    if not SEMANTIC_ENABLED or fresh or index is None:
+        return topic
+    return index.resolve(topic, scope)[0]
+
+
+def lesson_plan_scope(duration="60 minutes", level=None, outline_first=False):
+    """Scope for lesson plans: only plans asked for with the same options share a cache entry"""
+    return f"lesson_plan:{' '.join(str(duration).lower().split())}:{level or ''}:{'outline' if outline_first else 'full'}"
+
+
+_default_topic_index = None
+_default_topic_index_lock = threading.Lock()
+
+
+def get_default_topic_index() -> SemanticTopicIndex:
+    """Return the process-wide semantic topic index, creating it on first use"""
+    global _default_topic_index
+    with _default_topic_index_lock:
+        if _default_topic_index is None:
+            _default_topic_index = SemanticTopicIndex()
+        return _default_topic_index
@@ -0,0 +1,109 @@
+# sharding.py — Split large quizzes into concurrently generated shards and merge the results
+
+import os
+import re
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Questions per shard and number of shards generated at the same time
+DEFAULT_SHARD_SIZE = int(os.getenv("EDUCHAIN_SHARD_SIZE", "5"))
+DEFAULT_MAX_WORKERS = int(os.getenv("EDUCHAIN_SHARD_WORKERS", "4"))
+
+# Per-shard guidance so shards cover different difficulty / cognitive levels
+SHARD_HINTS = [
+    "Focus on recall of key facts and definitions (easy).",
+    "Focus on understanding and explaining core concepts (medium).",
+    "Focus on applying concepts to new situations (medium).",
+    "Focus on analysing and evaluating trickier cases (hard).",
+]
+
+# How many earlier questions to quote back when asking for top-up questions
+MAX_AVOID_QUESTIONS = 30
+
+
+def plan_shards(num_questions, shard_size=DEFAULT_SHARD_SIZE, round_index=0):
+    """Split num_questions into shard specs: {"count", "part", "parts", "hint"}"""
+    shard_size = max(1, int(shard_size))
+    counts = [shard_size] * (num_questions // shard_size)
+    if num_questions % shard_size:
+        counts.append(num_questions % shard_size)
+    return [
+        {
+            "count": count,
+            "part": part,
+            "parts": len(counts),
+            # Rotate hints between rounds so top-up shards ask for something different
+            "hint": SHARD_HINTS[(part - 1 + round_index) % len(SHARD_HINTS)],
+            "round": round_index,
+        }
+        for part, count in enumerate(counts, 1)
+    ]
+
+
+def shard_guidance(shard, avoid=None):
+    """Extra prompt text that makes each shard (and each top-up round) distinct"""
+    guidance = f"This is question set {shard['part']} of {shard['parts']}"
+    if shard.get("round"):
+        guidance += f" (additional round {shard['round']})"
+    guidance += f". {shard['hint']}"
+    if avoid:
+        guidance += " Do not repeat any of these existing questions: " + " | ".join(avoid[-MAX_AVOID_QUESTIONS:])
+    return guidance
+
+
+def question_key(question):
+    """Normalized question text used to detect duplicates across shards"""
+    if not isinstance(question, dict) or not isinstance(question.get("question"), str):
+        return None
+    return " ".join(re.findall(r"\w+", question["question"].lower())) or None
+
+
+def iter_sharded_questions(generate_shard, num_questions, shard_size=DEFAULT_SHARD_SIZE,
+                           max_workers=DEFAULT_MAX_WORKERS, max_top_up_rounds=2, avoid=None):
+    """
+    Yield up to num_questions unique questions as shards complete.
+    generate_shard(shard, avoid) must return a {"questions": [...]} dict (or raise).
+    A failed or short shard only loses its own questions; the shortfall is
+    requested again in up to max_top_up_rounds extra rounds. `avoid` lists
+    question texts from elsewhere (e.g. a partial quiz) that must not be repeated.
+    """
+    seen = {question_key({"question": text}) for text in avoid or []}
+    existing = list(avoid or [])
+    accepted = []  # Question texts accepted so far, quoted back to top-up shards
+
+    plan = plan_shards(num_questions, shard_size)
+    for round_index in range(max_top_up_rounds + 1):
+        round_avoid = existing + accepted
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # Each shard runs in a copy of the caller's context, so metrics stay attributed to its handler
+            futures = [pool.submit(contextvars.copy_context().run, generate_shard, shard, round_avoid)
+                       for shard in plan]
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"Shard failed: {e}")
+                    continue
+                questions = result.get("questions") if isinstance(result, dict) else None
+                for question in questions or []:
+                    if len(accepted) >= num_questions:
+                        break
+                    key = question_key(question)
+                    if key is None or key in seen:
+                        continue
+                    seen.add(key)
+                    accepted.append(question["question"])
+                    yield question
+
+        shortfall = num_questions - len(accepted)
+        if shortfall <= 0:
+            return
+        plan = plan_shards(shortfall, shard_size, round_index=round_index + 1)
+
+
+def generate_sharded(generate_shard, topic, num_questions, **kwargs):
+    """Generate a quiz shard by shard and merge it into one {"topic", "questions"} document"""
+    questions = list(iter_sharded_questions(generate_shard, num_questions, **kwargs))
+    if not questions:
+        raise RuntimeError(f"All shards failed for topic '{topic}'")
+    return {"topic": topic, "questions": questions}
@@ -0,0 +1,11 @@
+# Tests import the repo's top-level modules directly, the way the entry points do
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Offline backend and throwaway storage, set before any module reads its defaults
+os.environ.setdefault("EDUCHAIN_BACKEND", "fake")
+os.environ.setdefault("EDUCHAIN_CACHE_DB", "")
+os.environ.setdefault("EDUCHAIN_BANK_DB", ":memory:")
+os.environ.setdefault("EDUCHAIN_FAKE_LATENCY_MS", "0")
@@ -0,0 +1,27 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+from batching import RateLimiter, run_batch
+
+
+class RateLimited(Exception):
+    status_code = 429
+    response = SimpleNamespace(headers={"retry-after": "30"})
+
+
+async def collect(batch):
+    return [result async for result in batch]
+
+
+def test_no_retries_still_backs_the_limiter_off():
+    calls, limiter = [], RateLimiter(requests_per_minute=None, tokens_per_minute=None)
+
+    def rate_limited(topic):
+        calls.append(topic)
+        raise RateLimited()
+
+    [result] = asyncio.run(collect(run_batch(rate_limited, ["C"], limiter=limiter, max_retries=0)))
+    assert calls == ["C"]
+    assert isinstance(result.error, RateLimited)
+    assert limiter.blocked_until > time.monotonic() + 20
@@ -0,0 +1,84 @@
+import os
+import json
+import asyncio
+
+from bulk import BulkRun, generate_bulk, summarize_failures, MANIFEST_NAME
+
+
+class StubGenerator:
+    """Quiz generator whose replies are chosen per topic"""
+
+    def __init__(self, quizzes):
+        self.quizzes = quizzes
+        self.calls = []
+
+    def batch_retries(self):
+        return 0
+
+    def generate_mcq(self, topic, num_questions=5, raise_errors=False):
+        self.calls.append(topic)
+        if isinstance(self.quizzes.get(topic), Exception):
+            raise self.quizzes[topic]
+        return self.quizzes.get(topic, {"topic": topic, "questions": [{"question": f"About {topic}?"}]})
+
+
+def test_records_survive_a_kill_before_the_shard_is_closed(tmp_path):
+    run = BulkRun(str(tmp_path), records_per_shard=100)
+    for topic in ("Algebra", "Biology"):
+        run.add({"topic": topic})
+    # Killed here: no flush(), the manifest does not list the open shard yet
+    with open(os.path.join(tmp_path, "records-00000.jsonl"), "a", encoding="utf-8") as f:
+        f.write('{"topic": "Chem')  # Torn write
+
+    resumed = BulkRun(str(tmp_path), records_per_shard=100)
+    assert resumed.is_done("Algebra") and resumed.is_done("biology")
+    assert not resumed.is_done("Chemistry")
+    assert resumed.manifest["shards"] == [{"file": "records-00000.jsonl", "records": 2}]
+    with open(os.path.join(tmp_path, "records-00000.jsonl"), encoding="utf-8") as f:
+        assert [json.loads(line)["topic"] for line in f] == ["Algebra", "Biology"]
+
+    resumed.add({"topic": "Chemistry"})
+    resumed.flush()
+    assert resumed.manifest["shards"][-1] == {"file": "records-00001.jsonl", "records": 1}
+
+
+def test_full_shards_are_checkpointed(tmp_path):
+    run = BulkRun(str(tmp_path), records_per_shard=2)
+    for topic in ("A1", "B2", "C3"):
+        run.add({"topic": topic})
+    with open(os.path.join(tmp_path, MANIFEST_NAME), encoding="utf-8") as f:
+        manifest = json.load(f)
+    assert manifest["shards"] == [{"file": "records-00000.jsonl", "records": 2}]
+
+
+def test_fallback_and_empty_quizzes_are_failures_and_retried(tmp_path):
+    generator = StubGenerator({
+        "Physics": {"topic": "Physics", "questions": [{"question": "Old?"}], "from_bank_fallback": True},
+        "History": {"topic": "History", "questions": []},
+    })
+    topics = ["Physics", "History", "Geography"]
+    run = asyncio.run(generate_bulk(generator, topics, str(tmp_path), kinds=["mcq"], workers=2))
+    assert set(run.manifest["failed"]) == {"Physics", "History"}
+    assert list(run.manifest["done"]) == ["geography"]
+
+    generator.quizzes.clear()
+    generator.calls.clear()
+    run = asyncio.run(generate_bulk(generator, topics, str(tmp_path), kinds=["mcq"], workers=2))
+    assert sorted(generator.calls) == ["History", "Physics"]
+    assert not run.manifest["failed"]
+
+
+def test_failures_record_the_error_type_and_message(tmp_path):
+    generator = StubGenerator({
+        "Physics": TimeoutError("upstream timed out"),
+        "History": {"topic": "History", "questions": []},
+    })
+    run = asyncio.run(generate_bulk(generator, ["Physics", "History"], str(tmp_path), kinds=["mcq"]))
+    assert run.manifest["failed"] == {
+        "Physics": {"type": "TimeoutError", "error": "upstream timed out"},
+        "History": {"type": "ValueError", "error": "quiz has no questions"},
+    }
+    assert sorted(summarize_failures(run.manifest["failed"])) == [
+        "TimeoutError ×1 — Physics: upstream timed out",
+        "ValueError ×1 — History: quiz has no questions",
+    ]
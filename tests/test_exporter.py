@@ -0,0 +1,26 @@
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+from exporter import _ExportRequestHandler
+from question_bank import QuestionBank
+
+
+def test_export_server_streams_chunked_http11():
+    bank = QuestionBank(":memory:")
+    bank.add_questions("Python", [{"question": "What is a list?", "options": ["A", "B"], "correct_answer": "A"}])
+    handler = type("Handler", (_ExportRequestHandler,), {"bank": bank})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        with socket.create_connection(server.server_address, timeout=5) as sock:
+            sock.sendall(b"GET /export?format=csv HTTP/1.1\r\nHost: test\r\nConnection: close\r\n\r\n")
+            response = b""
+            while chunk := sock.recv(65536):
+                response += chunk
+    finally:
+        server.shutdown()
+    head, _, body = response.partition(b"\r\n\r\n")
+    assert head.startswith(b"HTTP/1.1 200")
+    assert b"Transfer-Encoding: chunked" in head
+    assert body.endswith(b"0\r\n\r\n") and b"What is a list?" in body
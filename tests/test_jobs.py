@@ -0,0 +1,77 @@
+import threading
+
+import pytest
+
+from jobs import JobQueue, JobCancelled, QueueFull, PRIORITY_SHORT, PRIORITY_LONG
+
+
+@pytest.fixture
+def blocked_queue():
+    """A one-worker queue whose worker is held by a running job until the test releases it"""
+    queue = JobQueue(workers=1, max_queued=10, per_user_queued=5)
+    release, started = threading.Event(), threading.Event()
+
+    def hold():
+        started.set()
+        release.wait(5)
+
+    queue.submit("holder", hold)
+    assert started.wait(5)
+    queue.release = release.set
+    yield queue
+    release.set()
+
+
+def test_fair_order_and_position(blocked_queue):
+    burst = [blocked_queue.submit("alice", lambda: "alice") for _ in range(3)]
+    bob = blocked_queue.submit("bob", lambda: "bob")
+    # Alice's first job, then Bob (he has been served least recently), then the rest of Alice's burst
+    assert [blocked_queue.position(job) for job in burst] == [0, 2, 3]
+    assert blocked_queue.position(bob) == 1
+
+
+def test_higher_priority_goes_first(blocked_queue):
+    lesson = blocked_queue.submit("alice", lambda: "lesson", priority=PRIORITY_LONG)
+    quiz = blocked_queue.submit("bob", lambda: "quiz", priority=PRIORITY_SHORT)
+    assert blocked_queue.position(quiz) == 0 and blocked_queue.position(lesson) == 1
+
+
+def test_jobs_start_in_the_order_position_predicts(blocked_queue):
+    order = []
+    submitted = [blocked_queue.submit(user, order.append, user) for user in ("alice", "alice", "alice", "bob")]
+    predicted = [job.args[0] for job in sorted(submitted, key=blocked_queue.position)]
+    blocked_queue.release()
+    for job in submitted:
+        job.wait(5)
+    assert order == predicted == ["alice", "bob", "alice", "alice"]
+
+
+def test_shedding_per_user_and_by_priority():
+    queue = JobQueue(workers=1, max_queued=4, per_user_queued=2)
+    gate, started = threading.Event(), threading.Event()
+    queue.submit("holder", lambda: started.set() or gate.wait(5))
+    assert started.wait(5)
+    try:
+        for _ in range(2):
+            queue.submit("alice", lambda: None)
+        with pytest.raises(QueueFull):
+            queue.submit("alice", lambda: None)  # Per-user limit
+        queue.submit("bob", lambda: None)
+        with pytest.raises(QueueFull) as shed:
+            queue.submit("carol", lambda: None, priority=PRIORITY_LONG)  # 3 of 4 waiting: lesson plans shed at 75%
+        assert shed.value.retry_after >= 1
+        queue.submit("carol", lambda: None, priority=PRIORITY_SHORT)
+        assert queue.stats()["shed"] == 2
+    finally:
+        gate.set()
+
+
+def test_cancel_queued_job(blocked_queue):
+    job = blocked_queue.submit("alice", lambda: "never")
+    other = blocked_queue.submit("bob", lambda: "bob")
+    assert blocked_queue.cancel(job)
+    assert job.done and job.status == "cancelled"
+    with pytest.raises(JobCancelled):
+        job.wait(0)
+    assert blocked_queue.position(other) == 0
+    assert blocked_queue.stats()["cancelled"] == 1 and blocked_queue.stats()["queued"] == 1
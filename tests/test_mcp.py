@@ -0,0 +1,106 @@
+import time
+import socket
+import asyncio
+import threading
+
+import pytest
+
+from mcp import McpServer, ParameterError, REQUEST_TIMEOUT, SERVER_BUSY, validate_params
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def start(server, **kwargs):
+    """Run server.serve() in the background; returns (task, stop_event, port)"""
+    stop_event, port = asyncio.Event(), free_port()
+    task = asyncio.create_task(server.serve(host="127.0.0.1", port=port, stop_event=stop_event, **kwargs))
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return task, stop_event, port
+        except OSError:
+            await asyncio.sleep(0.01)
+    raise RuntimeError("server did not start")
+
+
+async def post(port, body, content_length=None):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    data = body.encode()
+    length = len(data) if content_length is None else content_length
+    writer.write(f"POST /rpc HTTP/1.1\r\nHost: x\r\nContent-Length: {length}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = (await reader.readline()).split()[1]
+    await reader.read()  # Until the server closes the connection
+    writer.close()
+    return int(status)
+
+
+def test_invalid_content_length_is_rejected_and_closed():
+    async def main():
+        task, stop_event, port = await start(McpServer("test"))
+        try:
+            assert await asyncio.wait_for(post(port, "", content_length="abc"), 5) == 400
+            assert await asyncio.wait_for(post(port, "", content_length="-5"), 5) == 400
+        finally:
+            stop_event.set()
+            await task
+    asyncio.run(main())
+
+
+def test_drain_closes_idle_keep_alive_connections():
+    async def main():
+        task, stop_event, port = await start(McpServer("test"), drain_timeout=5)
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /health HTTP/1.1\r\nHost: x\r\n\r\n")
+        await writer.drain()
+        assert b"200" in await reader.readline()
+        stop_event.set()
+        started = time.monotonic()
+        await asyncio.wait_for(task, 5)
+        assert time.monotonic() - started < 2  # Not held open until the drain timeout
+        await asyncio.wait_for(reader.read(), 5)  # EOF: the idle connection was closed
+        writer.close()
+    asyncio.run(main())
+
+
+def test_timed_out_calls_that_hold_every_worker_make_the_server_busy():
+    server = McpServer("test")
+    release = threading.Event()
+
+    @server.tool(name="hang")
+    def hang():
+        release.wait(5)
+        return "done"
+
+    async def main():
+        task, stop_event, port = await start(server, max_workers=1, request_timeout=0.05)
+        try:
+            call = {"jsonrpc": "2.0", "id": 1, "method": "tools/call", "params": {"name": "hang", "arguments": {}}}
+            first = await server.handle_message(call)
+            assert first["error"]["code"] == REQUEST_TIMEOUT
+            second = await server.handle_message(call)
+            assert second["error"]["code"] == SERVER_BUSY
+            release.set()
+            for _ in range(100):
+                if not server._stuck:
+                    break
+                await asyncio.sleep(0.01)
+            assert (await server.handle_message(call))["result"]
+        finally:
+            release.set()
+            stop_event.set()
+            await task
+    asyncio.run(main())
+
+
+def test_explicit_null_is_accepted_only_when_the_default_is_null():
+    spec = {"difficulty": {"type": "string", "enum": ["easy", "medium", "hard"], "default": None},
+            "num_questions": {"type": "integer", "default": 5}}
+    assert validate_params(spec, {"difficulty": None}) == {"difficulty": None, "num_questions": 5}
+    with pytest.raises(ParameterError):
+        validate_params(spec, {"num_questions": None})
@@ -0,0 +1,22 @@
+import metrics
+
+
+def test_profiler_routes_are_local_only_without_a_token(monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_TOKEN", "")
+    assert metrics.handle_request("GET", "/profile", {}, "10.0.0.7")[0] == 403
+    assert metrics.handle_request("POST", "/profile/stop", {}, "10.0.0.7")[0] == 403
+    assert metrics.handle_request("GET", "/profile", {}, "127.0.0.1")[0] == 200
+    assert metrics.handle_request("GET", "/profile", {}, "::ffff:127.0.0.1")[0] == 200
+    assert metrics.handle_request("GET", "/metrics", {}, "10.0.0.7")[0] == 200
+
+
+def test_profiler_routes_need_the_token_when_one_is_set(monkeypatch):
+    monkeypatch.setattr(metrics, "PROFILE_TOKEN", "s3cret")
+    assert metrics.handle_request("GET", "/profile", {}, "127.0.0.1")[0] == 403
+    assert metrics.handle_request("GET", "/profile", {"authorization": "Bearer wrong"}, "10.0.0.7")[0] == 403
+    assert metrics.handle_request("GET", "/profile", {"authorization": "Bearer s3cret"}, "10.0.0.7")[0] == 200
+
+
+def test_gauge_names_are_sanitized():
+    metrics.metrics.register_stats("test_router", lambda: {"models": {"llama3-70b-8192": {"calls": 3}}})
+    assert "educhain_test_router_models_llama3_70b_8192_calls 3" in metrics.metrics.render()
@@ -0,0 +1,97 @@
+import pytest
+
+from llm_backend import FakeLLMClient
+from model_router import ModelRouter
+
+FAST, STRONG = "fast-model", "strong-model"
+MESSAGES = [{"role": "user", "content": "Generate 2 multiple-choice questions about Python."}]
+
+
+class ModelError(Exception):
+    def __init__(self, status_code, message, code=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.body = {"error": {"message": message, "type": "invalid_request_error", "code": code}}
+
+
+class BrokenModelClient(FakeLLMClient):
+    """FakeLLMClient whose calls to one model raise the given error"""
+
+    def __init__(self, broken_model, error):
+        super().__init__(latency_ms=0)
+        self.broken_model = broken_model
+        self.error = error
+        self.models = []
+
+    def create(self, messages, model=None, **kwargs):
+        self.models.append(model)
+        if model == self.broken_model:
+            raise self.error
+        return super().create(messages, model=model, **kwargs)
+
+
+def router(client, **kwargs):
+    return ModelRouter(client, fast_model=FAST, strong_model=STRONG, long_output_tokens=1000, max_retries=0, **kwargs)
+
+
+def test_routes_by_output_budget():
+    models = router(FakeLLMClient(latency_ms=0))
+    models.chat.completions.create(model="auto", messages=MESSAGES, max_tokens=500)
+    models.chat.completions.create(model="auto", messages=MESSAGES, max_tokens=3000)
+    assert [(d["model"], d["served_by"]) for d in models.decisions()] == [(STRONG, STRONG), (FAST, FAST)]
+
+
+def test_decommissioned_model_fails_over():
+    error = ModelError(400, "The model `fast-model` has been decommissioned", code="model_decommissioned")
+    client = BrokenModelClient(FAST, error)
+    models = router(client)
+    reply = models.chat.completions.create(model="auto", messages=MESSAGES, max_tokens=500)
+    assert reply.model == STRONG
+    decision = models.decisions(1)[0]
+    assert decision["failover_from"] == [FAST] and decision["served_by"] == STRONG
+    assert models.stats()["routing"]["failovers"] == 1
+
+
+def test_server_errors_fail_over_then_mark_model_degraded():
+    error = ModelError(503, "Service unavailable")
+    client = BrokenModelClient(FAST, error)
+    models = router(client)
+    for _ in range(6):
+        models.chat.completions.create(model="auto", messages=MESSAGES, max_tokens=500)
+    assert models.degraded(FAST)
+    assert models.decisions(1)[0]["reason"] == "degraded_failover"
+    assert client.models.count(FAST) < 6  # Once degraded, the fast model is skipped up front
+
+
+def test_bad_request_is_not_failed_over():
+    client = BrokenModelClient(FAST, ModelError(400, "messages must not be empty"))
+    models = router(client)
+    with pytest.raises(ModelError):
+        models.chat.completions.create(model="auto", messages=MESSAGES, max_tokens=500)
+    assert client.models == [FAST]
+    assert models.decisions(1)[0]["served_by"] is None
+
+
+def test_pinned_model_is_not_routed():
+    models = router(FakeLLMClient(latency_ms=0))
+    reply = models.chat.completions.create(model=STRONG, messages=MESSAGES, max_tokens=100)
+    assert reply.model == STRONG
+    assert models.stats()["routing"]["pinned"] == 1 and not models.decisions()
+
+
+def test_cached_completion_reports_the_model_that_answered():
+    from llm_cache import ResponseCache, cached_completion
+    from metrics import metrics
+
+    models, cache = router(FakeLLMClient(latency_ms=0)), ResponseCache(db_path=None)
+    content = cached_completion(models, MESSAGES[0]["content"], model="auto", temperature=0.7, cache=cache)
+    assert content.model == STRONG == models.decisions(1)[0]["served_by"]
+    assert f'model="{STRONG}"' in metrics.render() and 'model="auto"' not in metrics.render()
+    # A routed request served from the cache does not know its model, rather than claiming "auto"
+    assert cached_completion(models, MESSAGES[0]["content"], model="auto", temperature=0.7, cache=cache).model is None
+
+
+def test_one_configured_model_is_not_routed():
+    models = ModelRouter(FakeLLMClient(latency_ms=0), fast_model=FAST, strong_model=FAST, max_retries=0)
+    assert models.chat.completions.create(model="auto", messages=MESSAGES, max_tokens=500).model == FAST
+    assert not models.decisions() and models.stats()["routing"]["routed"] == 0
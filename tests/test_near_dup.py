@@ -0,0 +1,45 @@
+import pytest
+
+from near_dup import NearDuplicateIndex, remove_near_duplicates
+from question_bank import QuestionBank
+
+BASE = "What is the output of print(type(10))?"
+
+
+@pytest.mark.parametrize("other", [
+    'What is the output of print(type("10"))?',
+    "What is the output of print(type(10.5))?",
+    "In which year did World War I end?",
+])
+def test_different_literals_are_not_duplicates(other):
+    index = NearDuplicateIndex()
+    index.add(BASE if "print" in other else "In which year did World War II end?")
+    assert index.find(other) is None
+
+
+@pytest.mark.parametrize("other", [
+    "what is the output of print( type(10) ) ?",
+    "What is the output of print(type(10))",
+])
+def test_spacing_and_case_variants_are_duplicates(other):
+    index = NearDuplicateIndex()
+    entry_id = index.add(BASE)
+    assert index.find(other)[0] == entry_id
+
+
+def test_cached_quiz_is_not_rejected_against_itself():
+    index = NearDuplicateIndex()
+    quiz = {"topic": "Python", "questions": [{"question": BASE}]}
+    assert remove_near_duplicates(quiz, index, "prompt-a")[1] == []
+    assert remove_near_duplicates(quiz, index, "prompt-a")[1] == []
+    assert remove_near_duplicates(quiz, index, "prompt-b")[1] == [{"question": BASE}]
+
+
+def test_index_is_rebuilt_from_the_bank(tmp_path):
+    path = str(tmp_path / "bank.sqlite3")
+    QuestionBank(path).add_quiz({"topic": "Python", "questions": [{"question": BASE}]}, source="prompt-a")
+
+    index = NearDuplicateIndex()
+    assert index.load(QuestionBank(path).iter_texts()) == 1
+    assert index.find("What is the output of print(type(10))") is not None
+    assert index.find(BASE, exclude_source="prompt-a") is None  # Still the same cached quiz after a restart
@@ -0,0 +1,32 @@
+from question_bank import QuestionBank, serve_from_bank
+
+
+def test_difficulty_shortfall_is_requested_and_filtered():
+    bank = QuestionBank(":memory:")
+    bank.add_questions("Python", [{"question": "Stored hard question?", "difficulty": "hard"},
+                                  {"question": "Stored easy question?", "difficulty": "easy"}])
+    prompts = []
+
+    def generate_shard(shard, avoid):
+        prompts.append(shard["hint"])
+        part = f"{shard['round']}-{shard['part']}"
+        return {"questions": [
+            {"question": f"Generated hard {part} {i}?", "difficulty": "hard"} for i in range(shard["count"])
+        ] + [{"question": f"Generated easy {part}?", "difficulty": "easy"},
+             {"question": f"Generated unlabelled {part}?"}]}
+
+    quiz = serve_from_bank(bank, "Python", 4, generate_shard, difficulty="hard")
+    assert len(quiz["questions"]) == 4
+    assert all(question["difficulty"] == "hard" for question in quiz["questions"])
+    assert all("must be hard" in hint for hint in prompts)
+    # Off-level replies are kept under their own level, never under the requested one
+    assert bank.count("Python", difficulty="hard") == 4
+    assert bank.count("Python", difficulty="easy") == 2
+
+
+def test_symbol_topics_are_banked_apart():
+    bank = QuestionBank(":memory:")
+    bank.add_questions("C++ programming", [{"question": "What is a template?"}])
+    bank.add_questions("C# programming", [{"question": "What is LINQ?"}])
+    assert bank.count("c++  Programming!") == 1
+    assert bank.count("C programming") == 0
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from llm_backend import FakeLLMClient, FakeRateLimitError
+from resilience import CircuitBreaker, CircuitOpenError, ResilientClient
+
+MESSAGES = [{"role": "user", "content": "Generate 2 multiple-choice questions about Python."}]
+
+
+class UpstreamError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"upstream {status_code}")
+        self.status_code = status_code
+
+
+class ScriptedClient(FakeLLMClient):
+    """FakeLLMClient that raises the queued errors first, then answers normally"""
+
+    def __init__(self, errors=()):
+        super().__init__(latency_ms=0)
+        self.errors = list(errors)
+        self.calls = 0
+
+    def create(self, messages, **kwargs):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return super().create(messages, **kwargs)
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_breaker_half_open_trial_closes_on_success():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.01)
+    open_breaker(breaker)
+    assert not breaker.allow()
+    time.sleep(0.02)
+    assert breaker.allow()  # The single trial request
+    assert not breaker.allow()  # No second request while the trial is in flight
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_client_error_on_trial_frees_the_slot():
+    upstream = ScriptedClient([UpstreamError(400)])
+    client = ResilientClient(upstream, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01))
+    open_breaker(client.breaker)
+    time.sleep(0.02)
+    with pytest.raises(UpstreamError):
+        client.create(model="m", messages=MESSAGES)  # The trial gets a 400
+    assert client.create(model="m", messages=MESSAGES).choices[0].message.content
+    assert client.breaker.state == "closed"
+
+
+def test_rate_limits_do_not_open_the_breaker():
+    upstream = ScriptedClient([FakeRateLimitError(0.0) for _ in range(3)])
+    client = ResilientClient(upstream, max_retries=3, breaker=CircuitBreaker(failure_threshold=2))
+    assert client.create(model="m", messages=MESSAGES).choices[0].message.content
+    assert client.breaker.state == "closed"
+    assert client.stats()["retries"] == 3
+
+
+def test_server_errors_open_the_breaker_and_fail_fast():
+    upstream = ScriptedClient([UpstreamError(503), UpstreamError(503)])
+    client = ResilientClient(upstream, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            client.create(model="m", messages=MESSAGES)
+    with pytest.raises(CircuitOpenError):
+        client.create(model="m", messages=MESSAGES)
+    assert upstream.calls == 2
@@ -0,0 +1,41 @@
+from schema import repair_mcqs, repair_section, complete_lesson_plan
+
+
+def test_mcq_aliases_letters_and_fences_are_repaired():
+    reply = """Here is your quiz:
+```json
+{"mcqs": [
+  {"text": "2 + 2?", "choices": ["A) 3", "B) 4"], "answer": "B"},
+  {"question": "Capital of France?", "options": ["Paris", "Rome"], "correct_answer": "(a)"},
+  {"question": "Broken", "options": ["Only one"], "correct_answer": "Only one"}
+]}
+```"""
+    quiz, invalid = repair_mcqs({"content": reply}, topic="Mixed")
+    assert invalid == 1 and quiz["topic"] == "Mixed"
+    assert [q["correct_answer"] for q in quiz["questions"]] == ["B) 4", "Paris"]
+    assert quiz["questions"][0]["question"] == "2 + 2?" and quiz["questions"][0]["explanation"] == ""
+
+
+def test_unparseable_reply_yields_an_empty_quiz():
+    quiz, invalid = repair_mcqs({"content": "no json here"}, topic="Python")
+    assert quiz == {"topic": "Python", "questions": []} and invalid == 0
+
+
+def test_wrapped_section_keeps_the_outline_title():
+    section = repair_section({"section": {"name": "Intro", "description": "Warm up"}}, title="Welcome", duration="5 min")
+    assert section["title"] == "Welcome" and section["content"] == "Warm up" and section["duration"] == "5 min"
+
+
+def test_lesson_plan_re_requests_only_what_is_missing():
+    plan = {"topic": "Fractions", "learning_objectives": ["Add fractions"],
+            "sections": [{"title": "Intro", "content": "Halves"}, {"title": "Practice"}]}
+    prompts = []
+
+    def request_json(prompt):
+        prompts.append(prompt)
+        return {"assessment": "Exit ticket", "sections": [{"title": "Practice", "content": "Worksheet"}]}
+
+    repaired = complete_lesson_plan(plan, "Fractions", request_json)
+    assert len(prompts) == 1 and "objectives" not in prompts[0]
+    assert repaired["assessment"] == "Exit ticket" and repaired["objectives"] == ["Add fractions"]
+    assert [s["content"] for s in repaired["sections"]] == ["Halves", "Worksheet"]
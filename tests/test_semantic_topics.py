@@ -0,0 +1,49 @@
+import pytest
+
+from semantic_topics import SemanticTopicIndex, lesson_plan_scope
+
+
+@pytest.fixture
+def index():
+    return SemanticTopicIndex(db_path=None)
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("Python basics", "Intro to Python"),
+    ("Photosynthesis", "photosynthesis basics"),
+    ("Thermodynamics", "Thermodynamic principles"),
+])
+def test_rewordings_map_onto_the_stored_topic(index, stored, asked):
+    index.add(stored, "mcq:5")
+    assert index.resolve(asked, "mcq:5")[0] == stored
+
+
+@pytest.mark.parametrize("stored, asked", [
+    ("C programming", "C++ programming"),
+    ("C programming", "C# programming"),
+    ("C++", "C#"),
+    ("Java", "JavaScript"),
+    ("Python 2", "Python 3"),
+    ("World War I", "World War II"),
+    ("Organic chemistry", "Inorganic chemistry"),
+    ("Algebra 1", "Algebra 2"),
+    ("Mitosis", "Meiosis"),
+])
+def test_near_miss_topics_are_not_merged(index, stored, asked):
+    index.add(stored, "mcq:5")
+    assert index.resolve(asked, "mcq:5") == (asked, 0.0)
+    assert index.find(stored, "mcq:5") == (stored, 1.0)
+
+
+def test_scopes_are_kept_apart(index):
+    index.add("Python basics", lesson_plan_scope("60 minutes"))
+    assert index.find("Python basics", lesson_plan_scope("90 minutes")) is None
+    assert index.resolve("Intro to Python", "mcq:5") == ("Intro to Python", 0.0)
+
+
+def test_topics_survive_a_restart(tmp_path):
+    path = str(tmp_path / "topics.sqlite3")
+    SemanticTopicIndex(db_path=path).add("C++ programming", "mcq:5")
+    restored = SemanticTopicIndex(db_path=path)
+    assert restored.find("intro to c++", "mcq:5")[0] == "C++ programming"
+    assert restored.find("C programming", "mcq:5") is None
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def run_burst(flight, func, callers=5):
+    """Start callers concurrently while func blocks, then let it finish"""
+    release, entered = threading.Event(), threading.Event()
+
+    def blocking():
+        entered.set()
+        release.wait(5)
+        return func()
+
+    with ThreadPoolExecutor(max_workers=callers) as pool:
+        leader = pool.submit(flight.do, "key", blocking)
+        entered.wait(5)
+        followers = [pool.submit(flight.do, "key", blocking) for _ in range(callers - 1)]
+        while flight.stats()["coalesced"] < callers - 1:
+            threading.Event().wait(0.001)
+        release.set()
+        return [leader] + followers
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flight, runs = SingleFlight(), []
+    futures = run_burst(flight, lambda: runs.append(1) or {"questions": []})
+    results = [future.result() for future in futures]
+    assert len(runs) == 1 and all(result is results[0] for result in results)
+    stats = flight.stats()
+    assert (stats["executed"], stats["coalesced"], stats["in_flight"]) == (1, 4, 0)
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("upstream down")
+
+    for future in run_burst(flight, fail):
+        with pytest.raises(RuntimeError):
+            future.result()
+    assert flight.do("key", lambda: "ok") == "ok"  # A later call runs again